@@ -1,57 +1,70 @@
+import argparse
+import sys
+
+import ao3downloader.metrics as metrics
+import ao3downloader.profiling as profiling
 import ao3downloader.strings as strings
+from ao3downloader.fileio import FileOps
 
-from ao3downloader.actions import ao3download
-from ao3downloader.actions import pinboarddownload
-from ao3downloader.actions import updatefics
-from ao3downloader.actions import redownload
-from ao3downloader.actions import logvisualization
-from ao3downloader.actions import updateseries
-from ao3downloader.actions import getlinks
-from ao3downloader.actions import markedforlater
-from ao3downloader.actions import enterlinks
-from ao3downloader.actions import ignorelist
+# action modules are imported when the action is chosen, so the menu doesn't 
+# have to wait for parsers and ebook libraries that the action may not need
 
 
 def ao3_download_action():
+    from ao3downloader.actions import ao3download
     ao3download.action()
 
 
 def links_only_action():
+    from ao3downloader.actions import getlinks
     getlinks.action()
 
 
 def file_input_action():
+    from ao3downloader.actions import enterlinks
     enterlinks.action()
 
 
 def update_epubs_action():
+    from ao3downloader.actions import updatefics
     updatefics.action()
 
 
 def update_series_action():
+    from ao3downloader.actions import updateseries
     updateseries.action()
-    
+
 
 def re_download_action():
+    from ao3downloader.actions import redownload
     redownload.action()
 
 
 def marked_for_later_action():
+    from ao3downloader.actions import markedforlater
     markedforlater.action()
 
 
 def pinboard_download_action():
+    from ao3downloader.actions import pinboarddownload
     pinboarddownload.action()
 
 
 def log_visualization_action():
+    from ao3downloader.actions import logvisualization
     logvisualization.action()
 
 
 def ignorelist_action():
+    from ao3downloader.actions import ignorelist
     ignorelist.action()
 
 
+def compact_log_action():
+    from ao3downloader.actions import compactlog
+    compactlog.action()
+
+
 def display_menu():
     print(strings.PROMPT_OPTIONS)
     for key, value in actions.items():
@@ -65,14 +78,25 @@ def display_menu():
 def choose(choice):
     try:
         function = actions[choice]
+        metrics.reset()
+        if function is not display_menu: FileOps().rotate_log_if_needed()
         try:
-            function()
+            with profiling.profiled(function.__name__.removesuffix('_action')):
+                function()
         except Exception as e:
             print(str(e))
+        report_metrics()
     except KeyError as e:
         print(strings.PROMPT_INVALID_ACTION)
 
 
+def report_metrics():
+    report = metrics.summary()
+    if not report: return
+    print(report)
+    FileOps().log_metrics()
+
+
 display_menu.description = strings.ACTION_DESCRIPTION_DISPLAY_MENU
 ao3_download_action.description = strings.ACTION_DESCRIPTION_AO3
 update_epubs_action.description = strings.ACTION_DESCRIPTION_UPDATE
@@ -84,6 +108,7 @@ links_only_action.description = strings.ACTION_DESCRIPTION_LINKS_ONLY
 marked_for_later_action.description = strings.ACTION_DESCRIPTION_MARKED_FOR_LATER
 file_input_action.description = strings.ACTION_DESCRIPTION_FILE_INPUT
 ignorelist_action.description = strings.ACTION_DESCRIPTION_CONFIGURE_IGNORELIST
+compact_log_action.description = strings.ACTION_DESCRIPTION_COMPACT_LOG
 
 QUIT_ACTION = 'q'
 MENU_ACTION = 'd'
@@ -99,14 +124,51 @@ actions = {
     'm': marked_for_later_action,
     'p': pinboard_download_action,
     'v': log_visualization_action,
-    'i': ignorelist_action
+    'i': ignorelist_action,
+    'c': compact_log_action
     }
 
-display_menu()
-
-while True:
-    print('\'{}\' to display the menu again'.format(MENU_ACTION))
-    print('please enter your choice, or \'{}\' to quit:'.format(QUIT_ACTION))
-    choice = input()
-    if choice == QUIT_ACTION: break
-    choose(choice)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=strings.CLI_DESCRIPTION)
+    parser.add_argument('--job', nargs='+', metavar='FILE', help=strings.CLI_HELP_JOB)
+    parser.add_argument('--summary', metavar='FILE', help=strings.CLI_HELP_SUMMARY)
+    parser.add_argument('--daemon', nargs='?', const='', metavar='FILE', help=strings.CLI_HELP_DAEMON)
+    parser.add_argument('--submit', nargs='+', metavar='FILE', help=strings.CLI_HELP_SUBMIT)
+    parser.add_argument('--command', choices=['status', 'stop'], help=strings.CLI_HELP_COMMAND)
+    parser.add_argument('--port', type=int, default=strings.DAEMON_DEFAULT_PORT, help=strings.CLI_HELP_PORT)
+    parser.add_argument('--metrics-port', type=int, metavar='PORT', help=strings.CLI_HELP_METRICS_PORT)
+    args = parser.parse_args()
+
+    metrics_port = args.metrics_port
+    if metrics_port is None and not (args.submit or args.command):
+        metrics_port = FileOps().get_ini_value_integer(strings.INI_METRICS_PORT, 0)
+    if metrics_port:
+        from ao3downloader import exporter
+        exporter.start(metrics_port)
+        print(strings.METRICS_INFO_LISTENING.format(metrics_port))
+
+    if args.job:
+        from ao3downloader import batch
+        sys.exit(batch.run(args.job, args.summary))
+
+    if args.daemon is not None:
+        from ao3downloader import daemon
+        sys.exit(daemon.start(args.daemon, args.port))
+
+    if args.submit or args.command:
+        import json
+        from ao3downloader import batch, daemon
+        requests = [job for path in args.submit or [] for job in batch.load_jobs(path)]
+        if args.command: requests.append({'command': args.command})
+        for response in daemon.send(requests, args.port):
+            print(json.dumps(response, ensure_ascii=False))
+        sys.exit(0)
+
+    display_menu()
+
+    while True:
+        print('\'{}\' to display the menu again'.format(MENU_ACTION))
+        print('please enter your choice, or \'{}\' to quit:'.format(QUIT_ACTION))
+        choice = input()
+        if choice == QUIT_ACTION: break
+        choose(choice)
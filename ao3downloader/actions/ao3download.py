@@ -1,13 +1,11 @@
 from ao3downloader import strings
 from ao3downloader.actions import shared
 from ao3downloader.ao3 import Ao3
-from ao3downloader.fileio import FileOps
-from ao3downloader.repo import Repository
 
 
-def action():
-    fileops = FileOps()
-    with Repository(fileops) as repo:
+def action(resident: shared.Resident=None):
+    fileops = shared.fileops(resident)
+    with shared.repository(fileops, resident) as repo:
 
         filetypes = shared.download_types(fileops)
         series = shared.series()
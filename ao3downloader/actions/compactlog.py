@@ -0,0 +1,10 @@
+from ao3downloader import strings
+from ao3downloader.actions import shared
+
+
+def action(resident: shared.Resident=None):
+    fileops = shared.fileops(resident)
+    if not fileops.load_logfile():
+        print(strings.INFO_NO_LOG_FILE)
+        return
+    fileops.rotate_log()
@@ -1,20 +1,17 @@
 from ao3downloader import strings
 from ao3downloader.actions import shared
 from ao3downloader.ao3 import Ao3
-from ao3downloader.fileio import FileOps
-from ao3downloader.repo import Repository
 
 from tqdm import tqdm
 
-def action():
-    fileops = FileOps()
-    with Repository(fileops) as repo:
+def action(resident: shared.Resident=None):
+    fileops = shared.fileops(resident)
+    with shared.repository(fileops, resident) as repo:
 
         filetypes = shared.download_types(fileops)
         images = shared.images()
 
-        print(strings.AO3_PROMPT_FILE_INPUT)
-        path = input()
+        path = shared.links_file()
         with open(path) as f:
             links = f.readlines()
 
@@ -1,19 +1,17 @@
-import csv
 import datetime
 import os
 
-from ao3downloader import strings
+from ao3downloader import linkfile, strings
 from ao3downloader.actions import shared
 from ao3downloader.ao3 import Ao3
-from ao3downloader.fileio import FileOps
-from ao3downloader.repo import Repository
 
 
-def action():
-    fileops = FileOps()
-    with Repository(fileops) as repo:
+def action(resident: shared.Resident=None):
+    fileops = shared.fileops(resident)
+    with shared.repository(fileops, resident) as repo:
 
-        link = shared.link(fileops)
+        resumed = shared.get_last_start(fileops)
+        link = resumed['starting'] if resumed else shared.ask(strings.AO3_PROMPT_LINK, 'link')
         series = shared.series()
         pages = shared.pages()
         metatdata = shared.metadata()
@@ -21,29 +19,15 @@ def action():
         shared.ao3_login(repo, fileops)
 
         ao3 = Ao3(repo, fileops, None, pages, series, False)
-        links = ao3.get_work_links(link, metatdata)
-
-        if metatdata:
-            flattened = [flatten_dict(k, v) for k, v in links.items()]
-            filename = f'links_{datetime.datetime.now().strftime("%m%d%Y%H%M%S")}.csv'
-            with open(os.path.join(strings.DOWNLOAD_FOLDER_NAME, filename), 'w', newline='', encoding='utf-8') as f:
-                keys = []
-                sample = flattened[0]
-                for key in sample: keys.append(key)
-                writer = csv.DictWriter(f, fieldnames=keys)
-                writer.writeheader()
-                for item in flattened:
-                    try:
-                        writer.writerow(item)
-                    except ValueError:
-                        fileops.write_log(item)
-        else:
-            filename = f'links_{datetime.datetime.now().strftime("%m%d%Y%H%M%S")}.txt'
-            with open(os.path.join(strings.DOWNLOAD_FOLDER_NAME, filename), 'w') as f:
-                for l in links:
-                    f.write(l + '\n')
-
-
-def flatten_dict(k: str, v: dict) -> dict:
-    v['link'] = k
-    return v
+
+        # when carrying on from a page that links were being saved from, add to that links file instead of starting a new one
+        format = linkfile.get_format(fileops, metatdata)
+        path = linkfile.get_resumable(resumed.get('linksfile'), format) if resumed else None
+        seen = linkfile.resume(path, format) if path else set()
+        if not path:
+            filename = f'links_{datetime.datetime.now().strftime("%m%d%Y%H%M%S")}.{format}'
+            path = os.path.join(strings.DOWNLOAD_FOLDER_NAME, filename)
+
+        with linkfile.open_writer(path, format, bool(seen)) as writer:
+            for work, metadata in ao3.get_work_links(link, metatdata, seen, path):
+                writer.write(work, metadata)
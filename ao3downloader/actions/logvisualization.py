@@ -1,14 +1,15 @@
-'''Create an html document for the purpose of visualizing the logfile. Not the most optimized thing ever but it does the job.'''
+'''Create an html document for the purpose of visualizing the logfile. Each chunk of the logfile is rendered to its own file, in parallel, with rows written straight to disk.'''
 
 import datetime
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 import ao3downloader.strings as strings
 
 SIZE_HINT = 5000000 # 5 mb, firefox max filesize is 10 mb
 
-def action():
+def action(resident=None): # nothing to keep between jobs here
 
     logfile = os.path.join(strings.LOG_FOLDER_NAME, strings.LOG_FILE_NAME)
     visfile = os.path.join(strings.LOG_FOLDER_NAME, strings.VISUALIZATION_FILE_NAME)
@@ -16,67 +17,96 @@ def action():
     if not os.path.exists(logfile):
         print(strings.INFO_NO_LOG_FILE)
         return
-    
+
     with open(os.path.join(strings.HTML_FOLDER_NAME, strings.TEMPLATE_FILE_NAME), encoding='utf-8') as tmpl:
         template = tmpl.read()
 
-    filenumber = 0 # fallback identifier in case timestamps can't be extracted
-
-    with open(logfile, 'r', encoding='utf-8') as f:
-        while True:
-            buf = f.readlines(SIZE_HINT)
-
-            if not buf:
-                break
-
-            start = get_timestamp(buf[0], filenumber)
-            end = get_timestamp(buf[-1], filenumber)
-            filename = visfile.format(f'{start}-{end}')
-
-            if os.path.exists(filename):
-                continue # we already have this chunk
-
-            print(strings.INFO_PARSING_LOGS.format(start, end))
+    jobs = []
+    filenumber = 0 # fallback identifier in case timestamps can't be extracted. chunks that already exist aren't counted
 
-            keys = ['timestamp'] # always put timestamp first
-            data = []
+    for offset, length, first, last in get_chunks(logfile):
+        start = get_timestamp(first, filenumber)
+        end = get_timestamp(last, filenumber)
+        filename = visfile.format(f'{start}-{end}')
 
-            for line in buf:
-                js = json.loads(line)
-                if 'starting' not in js:
-                    for key in js:
-                        if key not in keys:
-                            keys.append(key)
-                    data.append(js)
+        if os.path.exists(filename):
+            continue # we already have this chunk
 
-            for item in data:
-                for key in keys:
-                    if key not in item:
-                        item[key] = ''
+        jobs.append((logfile, offset, length, filename, template, start, end))
+        filenumber += 1
 
-            thead = '<thead><tr>'
-            for key in keys:
-                thead += '<th>' + key + '</th>'
-            thead += '</tr></thead>'
+    if not jobs: return
 
-            tbody = '<tbody>'
-            for item in data:
-                tr = '<tr>'
-                for key in keys:
-                    key_item = str(item[key])
-                    tr += '<td>' + key_item + '</td>'
-                tr += '</tr>'
-                tbody += tr
-            tbody += '</tbody>'
-
-            table = thead + tbody
-
-            logvisualization = template.replace('%TABLE%', table)
-
-            with open (filename, 'w', encoding='utf-8') as vis:
-                vis.write(logvisualization)
+    if len(jobs) == 1:
+        print(strings.INFO_PARSING_LOGS.format(jobs[0][5], jobs[0][6]))
+        render_chunk(*jobs[0][:5])
+        return
 
-            filenumber += 1
+    with ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as executor:
+        futures = []
+        for job in jobs:
+            print(strings.INFO_PARSING_LOGS.format(job[5], job[6]))
+            futures.append(executor.submit(render_chunk, *job[:5]))
+        for future in futures:
+            future.result()
+
+
+def get_chunks(logfile: str):
+    '''
+    yield (byte offset, byte length, first line, last line) for each chunk of the logfile.
+    chunks break at the same lines as readlines(SIZE_HINT) would so that existing files are still recognized.
+    '''
+    with open(logfile, 'rb') as f:
+        offset = 0
+        length = 0
+        size = 0
+        first = None
+        last = None
+        for line in f:
+            if first is None: first = line
+            last = line
+            length += len(line)
+            size += len(line.rstrip(b'\r\n').decode('utf-8')) + 1 # count characters like text mode would
+            if size >= SIZE_HINT:
+                yield offset, length, first.decode('utf-8'), last.decode('utf-8')
+                offset += length
+                length = 0
+                size = 0
+                first = None
+        if first is not None:
+            yield offset, length, first.decode('utf-8'), last.decode('utf-8')
+
+
+def render_chunk(logfile: str, offset: int, length: int, filename: str, template: str) -> None:
+
+    with open(logfile, 'rb') as f:
+        f.seek(offset)
+        buf = f.read(length).decode('utf-8').split('\n')
+
+    keys = {'timestamp': None} # always put timestamp first
+    data = []
+
+    for line in buf:
+        if not line.strip(): continue
+        js = json.loads(line)
+        if 'starting' not in js:
+            keys.update(dict.fromkeys(js))
+            data.append(js)
+
+    head, tail = template.split('%TABLE%', 1)
+
+    # write to a temporary file first so an interrupted run doesn't leave behind a partial chunk that would be skipped next time
+    tempfile = filename + '.tmp'
+    with open(tempfile, 'w', encoding='utf-8') as vis:
+        vis.write(head)
+        vis.write('<thead><tr>')
+        vis.write(''.join(f'<th>{key}</th>' for key in keys))
+        vis.write('</tr></thead><tbody>')
+        for item in data:
+            vis.write('<tr>' + ''.join(f'<td>{item.get(key, "")}</td>' for key in keys) + '</tr>')
+        vis.write('</tbody>')
+        vis.write(tail)
+    os.replace(tempfile, filename)
 
 
 def get_timestamp(line: str, filenumber: int) -> str:
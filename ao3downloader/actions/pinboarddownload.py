@@ -1,14 +1,12 @@
 from ao3downloader import parse_text, parse_xml, strings
 from ao3downloader.actions import shared
 from ao3downloader.ao3 import Ao3
-from ao3downloader.fileio import FileOps
-from ao3downloader.repo import Repository
 from tqdm import tqdm
 
 
-def action():
-    fileops = FileOps()
-    with Repository(fileops) as repo:
+def action(resident: shared.Resident=None):
+    fileops = shared.fileops(resident)
+    with shared.repository(fileops, resident) as repo:
 
         filetypes = shared.download_types(fileops)
         date = shared.pinboard_date()
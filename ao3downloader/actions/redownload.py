@@ -3,14 +3,12 @@ import traceback
 from ao3downloader import parse_text, strings, update
 from ao3downloader.actions import shared
 from ao3downloader.ao3 import Ao3
-from ao3downloader.fileio import FileOps
-from ao3downloader.repo import Repository
 from tqdm import tqdm
 
 
-def action():
-    fileops = FileOps()
-    with Repository(fileops) as repo:
+def action(resident: shared.Resident=None):
+    fileops = shared.fileops(resident)
+    with shared.repository(fileops, resident) as repo:
         
         folder = shared.redownload_folder()
         oldtypes = shared.redownload_oldtypes()
@@ -19,20 +17,23 @@ def action():
 
         shared.ao3_login(repo, fileops)
 
-        fics = shared.get_files_of_type(folder, oldtypes)
+        library = shared.library(resident)
+        fics = shared.get_files_of_type(fileops, folder, oldtypes, library)
 
         print(strings.REDOWNLOAD_INFO_URLS)
 
         works = []
         for fic in tqdm(fics):
             try:
-                work = update.process_file(fic['path'], fic['filetype'], False)
+                work = update.process_file(fic['path'], fic['filetype'], False, library=library)
                 if work: 
                     works.append(work)
                     fileops.write_log({'message': strings.MESSAGE_FIC_FILE, 'path': fic['path'], 'link': work['link']})
             except Exception as e:
                 fileops.write_log({'message': strings.ERROR_REDOWNLOAD, 'path': fic['path'], 'error': str(e), 'stacktrace': traceback.format_exc()})
 
+        library.save()
+
         urls = list(set(map(lambda x: x['link'], works)))
 
         print(strings.REDOWNLOAD_INFO_DONE.format(len(urls)))
@@ -1,29 +1,96 @@
+import contextlib
 import datetime
 import os
 import traceback
+from typing import TYPE_CHECKING, Iterator, NamedTuple, Optional
 
-from ao3downloader import exceptions, parse_text, strings
+from ao3downloader import convert, exceptions, parse_text, strings
 from ao3downloader.fileio import FileOps
-from ao3downloader.repo import Repository
+from ao3downloader.library import LibraryIndex, find_files
+
+if TYPE_CHECKING: # requests and bs4 are only imported once an action actually needs a connection
+    from ao3downloader.repo import Repository
+
+# answers to the prompts below when running non-interactively. see ao3downloader/batch.py
+job = None
+
+REQUIRED = object()
+
+
+class Resident(NamedTuple):
+    """Objects the daemon keeps alive between jobs and passes to each action. see ao3downloader/daemon.py"""
+    repo: 'Repository'
+    library: LibraryIndex
+    log_cache: dict
+
+
+def ask(prompt: str, key: str, default=REQUIRED):
+    """Print the prompt and return the user's input, or take the answer from the current job."""
+
+    if job is None:
+        print(prompt)
+        return input()
+    if key in job: return job[key]
+    if default is REQUIRED: raise exceptions.JobException(strings.ERROR_JOB_MISSING_VALUE.format(key))
+    return default
+
+
+def ask_yes(prompt: str, key: str) -> bool:
+    answer = ask(prompt, key, False)
+    return answer is True or answer == strings.PROMPT_YES
+
+
+def job_types(key: str, acceptable: list[str]) -> list[str]:
+    filetypes = ask(None, key)
+    if not isinstance(filetypes, list) or not filetypes or any(x not in acceptable for x in filetypes):
+        raise exceptions.JobException(strings.ERROR_JOB_INVALID_VALUE.format(key, filetypes))
+    return list(dict.fromkeys(filetypes))
+
+
+def saved_setting(fileops: FileOps, prompt: str, setting: str, save: bool = True):
+    if job is None: return fileops.setting(prompt, setting, save)
+    value = job.get(setting) or fileops.get_setting(setting)
+    if not value: raise exceptions.JobException(strings.ERROR_JOB_MISSING_VALUE.format(setting))
+    return value
+
+
+def fileops(resident: Resident=None) -> FileOps:
+    return FileOps(resident.log_cache if resident else None)
+
+
+@contextlib.contextmanager
+def repository(fileops: FileOps, resident: Resident=None) -> Iterator['Repository']:
+    try:
+        if resident is None:
+            from ao3downloader.repo import Repository
+            with Repository(fileops) as repo:
+                yield repo
+        else:
+            yield resident.repo
+    finally:
+        from ao3downloader import parsing
+        parsing.shutdown() # listing pages are parsed in worker processes
+        convert.finish() # file types made from the downloaded one are still being converted
+        fileops.flush()
+
+
+def library(resident: Resident=None) -> LibraryIndex:
+    return resident.library if resident else LibraryIndex()
 
 
 def series() -> bool:
-    print(strings.AO3_PROMPT_SERIES)
-    series = True if input() == strings.PROMPT_YES else False
-    return series
+    return ask_yes(strings.AO3_PROMPT_SERIES, 'series')
 
 
 def link(fileops: FileOps) -> str:
     link = get_last_page_downloaded(fileops)
     if not link: 
-        print(strings.AO3_PROMPT_LINK)
-        link = input()
+        link = ask(strings.AO3_PROMPT_LINK, 'link')
     return link
 
 
 def pages() -> int:
-    print(strings.AO3_PROMPT_PAGES)
-    pages = input()
+    pages = ask(strings.AO3_PROMPT_PAGES, 'pages', 0)
 
     try:
         pages = int(pages)
@@ -36,37 +103,38 @@ def pages() -> int:
 
 
 def images() -> bool:
-    print(strings.AO3_PROMPT_IMAGES)
-    images = True if input() == strings.PROMPT_YES else False
-    return images
+    return ask_yes(strings.AO3_PROMPT_IMAGES, 'images')
 
 
 def metadata() -> bool:
-    print(strings.AO3_PROMPT_METADATA)
-    return True if input() == strings.PROMPT_YES else False
+    return ask_yes(strings.AO3_PROMPT_METADATA, 'metadata')
 
 
 def ignorelist_check_deleted() -> bool:
-    print(strings.IGNORELIST_PROMPT_CHECK_DELETED)
-    return True if input() == strings.PROMPT_YES else False
+    return ask_yes(strings.IGNORELIST_PROMPT_CHECK_DELETED, 'check_deleted')
+
 
+def links_file() -> str:
+    return ask(strings.AO3_PROMPT_FILE_INPUT, 'file')
 
-def visited(fileops: FileOps, filetypes: list[str]) -> list[str]:
-    visited = []
+
+def visited(fileops: FileOps, filetypes: list[str]) -> set[str]:
+    visited = set()
     logs = fileops.load_logfile()
     if logs:
         print(strings.AO3_INFO_VISITED)
         titles = parse_text.get_title_dict(logs)
         maximum = fileops.get_ini_value_integer(strings.INI_NAME_LENGTH, strings.INI_DEFAULT_NAME_LENGTH)
-        visited = list({x for x in titles if 
-            fileops.file_exists(x, titles, filetypes, maximum)})
-    if os.path.exists(strings.IGNORELIST_FILE_NAME):
-        with open(strings.IGNORELIST_FILE_NAME, 'r', encoding='utf-8') as f: 
-                visited.extend([x[:x.find('; ')] for x in f.readlines()])
+        visited = {x for x in titles if 
+            fileops.file_exists(x, titles, filetypes, maximum)}
+    visited.update(fileops.load_ignorelist())
     return visited
 
 
 def pinboard_date() -> datetime.datetime:
+    if job is not None:
+        inputdate = job.get('date')
+        return datetime.datetime.strptime(inputdate, '%m/%d/%Y') if inputdate else None
     print(strings.PINBOARD_PROMPT_DATE)
     getdate = True if input() == strings.PROMPT_YES else False
     if getdate:
@@ -80,18 +148,21 @@ def pinboard_date() -> datetime.datetime:
 
 
 def pinboard_exclude() -> bool:
-    print(strings.PINBOARD_PROMPT_INCLUDE_UNREAD)
-    exclude_toread = False if input() == strings.PROMPT_YES else True
-    return exclude_toread
+    return not ask_yes(strings.PINBOARD_PROMPT_INCLUDE_UNREAD, 'include_unread')
 
 
 def api_token(fileops: FileOps) -> str:
-    return fileops.setting(
+    return saved_setting(
+            fileops,
             strings.PINBOARD_PROMPT_API_TOKEN, 
             strings.SETTING_API_TOKEN)
 
 
 def redownload_folder() -> str:
+    if job is not None:
+        folder = ask(None, 'folder')
+        if not os.path.exists(folder): raise exceptions.JobException(strings.INFO_NO_FOLDER)
+        return folder
     while True:
         print(strings.REDOWNLOAD_PROMPT_FOLDER)
         folder = input()
@@ -103,6 +174,7 @@ def redownload_folder() -> str:
 
 
 def redownload_oldtypes() -> list[str]:
+    if job is not None: return job_types('oldtypes', strings.UPDATE_ACCEPTABLE_FILE_TYPES)
     oldtypes = []
     while True:
         filetype = ''
@@ -119,6 +191,7 @@ def redownload_oldtypes() -> list[str]:
 
 
 def redownload_newtypes() -> list[str]:
+    if job is not None: return job_types('newtypes', strings.AO3_ACCEPTABLE_DOWNLOAD_TYPES)
     newtypes = []
     while True:
         filetype = ''
@@ -139,21 +212,27 @@ def marked_for_later_link(fileops: FileOps) -> str:
     return f'{strings.AO3_BASE_URL}/users/{username}/readings?show=to-read'
 
 
-def ao3_login(repo: Repository, fileops: FileOps, force: bool=False) -> None:
+def ao3_login(repo: 'Repository', fileops: FileOps, force: bool=False) -> None:
 
     if force:
         login = True
+    elif job is not None:
+        login = ask_yes(None, 'login')
     else:
         print(strings.AO3_PROMPT_LOGIN)
         login = False if input() == strings.PROMPT_NO else True
 
+    if login and repo.logged_in: return
+
     if login:
         savepassword = fileops.get_ini_value_boolean(strings.INI_PASSWORD_SAVE, True)
 
-        username = fileops.setting(
+        username = saved_setting(
+            fileops,
             strings.AO3_PROMPT_USERNAME,
             strings.SETTING_USERNAME)
-        password = fileops.setting(
+        password = saved_setting(
+            fileops,
             strings.AO3_PROMPT_PASSWORD,
             strings.SETTING_PASSWORD,
             savepassword)
@@ -169,6 +248,9 @@ def ao3_login(repo: Repository, fileops: FileOps, force: bool=False) -> None:
 
 def download_types(fileops: FileOps) -> list[str]:
     filetypes = fileops.get_setting(strings.SETTING_FILETYPES)
+    if job is not None:
+        if isinstance(filetypes, list) and strings.SETTING_FILETYPES not in job: return filetypes
+        return job_types(strings.SETTING_FILETYPES, strings.AO3_ACCEPTABLE_DOWNLOAD_TYPES)
     if isinstance(filetypes, list):
         print(strings.AO3_PROMPT_USE_SAVED_DOWNLOAD_TYPES)
         if input() == strings.PROMPT_YES: return filetypes
@@ -189,6 +271,9 @@ def download_types(fileops: FileOps) -> list[str]:
 
 def update_types(fileops: FileOps) -> list[str]:
     filetypes = fileops.get_setting(strings.SETTING_UPDATE_FILETYPES)
+    if job is not None:
+        if isinstance(filetypes, list) and strings.SETTING_UPDATE_FILETYPES not in job: return filetypes
+        return job_types(strings.SETTING_UPDATE_FILETYPES, strings.UPDATE_ACCEPTABLE_FILE_TYPES)
     if isinstance(filetypes, list):
         print(strings.UPDATE_PROMPT_USE_SAVED_FILE_TYPES)
         if input() == strings.PROMPT_YES: return filetypes
@@ -209,6 +294,8 @@ def update_types(fileops: FileOps) -> list[str]:
 
 def update_folder(fileops: FileOps) -> str:
     folder = fileops.get_setting(strings.SETTING_UPDATE_FOLDER)
+    if job is not None:
+        return saved_setting(fileops, None, strings.SETTING_UPDATE_FOLDER)
     if folder:
         print(strings.UPDATE_PROMPT_USE_SAVED_FOLDER)
         if input() == strings.PROMPT_YES: 
@@ -223,33 +310,42 @@ def update_folder(fileops: FileOps) -> str:
     return folder
 
 
-def get_files_of_type(folder: str, filetypes: list[str]) -> list[dict[str, str]]:
+def get_files_of_type(fileops: FileOps, folder: str, filetypes: list[str], library: LibraryIndex=None) -> Iterator[dict[str, str]]:
+    """Files are returned as they are found, so they can be processed while the rest of the folder is still being listed."""
+
     print(strings.UPDATE_INFO_FILES)
-    results = []
-    for subdir, dirs, files in os.walk(folder):
-        for file in files:
-            filetype = os.path.splitext(file)[1].upper()[1:]
-            if filetype in filetypes:
-                path = os.path.join(subdir, file)
-                results.append({'path': path, 'filetype': filetype})
-    print(strings.UPDATE_INFO_NUM_RETURNED.format(len(results)))
-    return results
+    exclude = [x.strip() for x in fileops.get_ini_value(strings.INI_SCAN_EXCLUDE, '').split(',') if x.strip()]
+    return count_files(find_files(folder, filetypes, exclude, library))
+
+
+def count_files(files: Iterator[dict[str, str]]) -> Iterator[dict[str, str]]:
+    """Pass the files through, then say how many there were once they have all been found."""
+
+    count = 0
+    for file in files:
+        count += 1
+        yield file
+    print(strings.UPDATE_INFO_NUM_RETURNED.format(count))
 
 
 def get_last_page_downloaded(fileops: FileOps) -> str:
+    latest = get_last_start(fileops)
+    return latest['starting'] if latest else None
+
+
+def get_last_start(fileops: FileOps) -> Optional[dict]:
+    """The log entry for the last listing page that was started, if the user wants to carry on from it."""
+
     latest = None
     try:
         logs = fileops.load_logfile()
         starts = filter(lambda x: 'starting' in x, logs)
-        bydate = sorted(starts, key=lambda x: datetime.datetime.strptime(x['timestamp'], '%m/%d/%Y, %H:%M:%S'), reverse=True)
-        if bydate: latest = bydate[0]
+        # oldest first, so that of several pages started in the same second the one logged last wins
+        bydate = sorted(starts, key=lambda x: datetime.datetime.strptime(x['timestamp'], '%m/%d/%Y, %H:%M:%S'))
+        if bydate: latest = bydate[-1]
     except Exception as e:
         fileops.write_log({'error': str(e), 'message': strings.ERROR_LOG_FILE, 'stacktrace': traceback.format_exc()})
 
-    link = None
-    if latest:
-        print(strings.AO3_PROMPT_LAST_PAGE)
-        if input() == strings.PROMPT_YES:
-            link = latest['starting']
-
-    return link
+    if latest and ask_yes(strings.AO3_PROMPT_LAST_PAGE, 'resume'):
+        return latest
+    return None
@@ -4,14 +4,12 @@ import traceback
 from ao3downloader import parse_text, strings, update
 from ao3downloader.actions import shared
 from ao3downloader.ao3 import Ao3
-from ao3downloader.fileio import FileOps
-from ao3downloader.repo import Repository
 from tqdm import tqdm
 
 
-def action():
-    fileops = FileOps()
-    with Repository(fileops) as repo:
+def action(resident: shared.Resident=None):
+    fileops = shared.fileops(resident)
+    with shared.repository(fileops, resident) as repo:
 
         folder = shared.update_folder(fileops)
         update_filetypes = shared.update_types(fileops)
@@ -20,26 +18,35 @@ def action():
 
         shared.ao3_login(repo, fileops)    
 
-        fics = shared.get_files_of_type(folder, update_filetypes)
+        library = shared.library(resident)
+        fics = shared.get_files_of_type(fileops, folder, update_filetypes, library)
 
         print(strings.UPDATE_INFO_URLS)
 
         works = []
         for fic in tqdm(fics):
             try:
-                work = update.process_file(fic['path'], fic['filetype'])
+                work = update.process_file(fic['path'], fic['filetype'], library=library)
                 if work:
-                    works.append(work)
+                    works.append(dict(work, path=fic['path'], filetype=fic['filetype']))
                     fileops.write_log({'message': strings.MESSAGE_INCOMPLETE_FIC, 'path': fic['path'], 'link': work['link']})
             except Exception as e:
                 fileops.write_log({'message': strings.ERROR_INCOMPLETE_FIC, 'path': fic['path'], 'error': str(e), 'stacktrace': traceback.format_exc()})    
 
-        # remove duplicate work links. take lowest number of chapters.
+        library.save()
+
+        # archived works are listed from the chapter counts in the archive index, without opening them
+        archive = fileops.get_archive()
+        if archive: works.extend(dict(x, path=None, filetype=None) for x in archive.get_incomplete())
+
+        # remove duplicate work links. take lowest number of chapters, and keep the files with that many to patch.
         works_cleaned = []
         works_sorted = sorted(works, key=lambda x: x['link'])
         for link, group in itertools.groupby(works_sorted, lambda x: x['link']):
+            group = list(group)
             chapters = min(group, key=lambda x: x['chapters'])['chapters']
-            works_cleaned.append({'link': link, 'chapters': chapters})
+            files = {x['filetype']: x['path'] for x in group if x['chapters'] == chapters and x['path']}
+            works_cleaned.append({'link': link, 'chapters': chapters, 'files': files})
 
         print(strings.UPDATE_INFO_URLS_DONE)
 
@@ -55,4 +62,4 @@ def action():
         ao3 = Ao3(repo, fileops, download_filetypes, None, False, images)
 
         for work in tqdm(works_cleaned):
-            ao3.update(work['link'], work['chapters'])
+            ao3.update(work['link'], work['chapters'], work['files'])
@@ -3,14 +3,12 @@ import traceback
 from ao3downloader import parse_text, strings, update
 from ao3downloader.actions import shared
 from ao3downloader.ao3 import Ao3
-from ao3downloader.fileio import FileOps
-from ao3downloader.repo import Repository
 from tqdm import tqdm
 
 
-def action():
-    fileops = FileOps()
-    with Repository(fileops) as repo:
+def action(resident: shared.Resident=None):
+    fileops = shared.fileops(resident)
+    with shared.repository(fileops, resident) as repo:
 
         folder = shared.update_folder(fileops)
         update_filetypes = shared.update_types(fileops)
@@ -19,20 +17,23 @@ def action():
 
         shared.ao3_login(repo, fileops)
 
-        files = shared.get_files_of_type(folder, update_filetypes)
+        library = shared.library(resident)
+        files = shared.get_files_of_type(fileops, folder, update_filetypes, library)
 
         print(strings.SERIES_INFO_FILES)
 
         works = []
         for file in tqdm(files):
             try:
-                work = update.process_file(file['path'], file['filetype'], True, True)
+                work = update.process_file(file['path'], file['filetype'], True, True, library=library)
                 if work:
                     works.append(work)
                     fileops.write_log({'message': strings.MESSAGE_SERIES_FILE, 'path': file['path'], 'link': work['link'], 'series': work['series']})
             except Exception as e:
                 fileops.write_log({'message': strings.ERROR_FIC_IN_SERIES, 'path': file['path'], 'error': str(e), 'stacktrace': traceback.format_exc()})    
 
+        library.save()
+
         print(strings.SERIES_INFO_URLS)
 
         series = dict[str, list[str]]()
@@ -40,9 +41,8 @@ def action():
             for s in work['series']:
                 if s not in series:
                     series[s] = []
-                link = work['link'].replace('http://', 'https://')
-                if link not in series[s]:
-                    series[s].append(link)
+                if work['link'] not in series[s]:
+                    series[s].append(work['link'])
 
         logs = fileops.load_logfile()
         if logs:
@@ -2,10 +2,12 @@
 
 import os
 import traceback
+from concurrent.futures import Future
+from typing import Iterator
 
 from bs4 import BeautifulSoup
 
-from ao3downloader import exceptions, parse_soup, parse_text, strings
+from ao3downloader import convert, exceptions, links, metrics, parse_soup, parse_text, parsing, patch, strings
 from ao3downloader.fileio import FileOps
 from ao3downloader.repo import Repository
 
@@ -19,12 +21,14 @@ class Ao3:
         self.series = series
         self.images = images
         self.mark = mark
+        self.source = convert.get_source(fileops) if filetypes else ''
+        self.processes = parsing.get_processes(fileops)
 
 
-    def download(self, link: str, visited: list[str]=None) -> None:
+    def download(self, link: str, visited: set[str]=None) -> None:
 
         log = {}
-        if not visited: visited = []
+        if visited is None: visited = set()
 
         try:
             self.download_recursive(link, log, visited)
@@ -32,12 +36,13 @@ class Ao3:
             self.log_error(log, e)
 
 
-    def update(self, link: str, chapters: str) -> None:
+    def update(self, link: str, chapters: str, files: dict[str, str]=None) -> None:
         
         log = {}
+        link = links.canonical_url(link)
         
         try:
-            self.download_work(link, log, chapters)
+            self.download_work(link, log, chapters, files)
         except Exception as e:
             self.log_error(log, e)
 
@@ -45,6 +50,7 @@ class Ao3:
     def update_series(self, link: str, visited: list[str]) -> None:
 
         log = {}
+        link = links.canonical_url(link)
 
         try:
             self.download_series(link, log, visited)
@@ -52,57 +58,86 @@ class Ao3:
             self.log_error(log, e)
 
 
-    def get_work_links(self, link: str, metadata: bool) -> dict[str, dict]:
-        
-        links_list = {}
+    def get_work_links(self, link: str, metadata: bool, seen: set[str]=None, linksfile: str=None) -> Iterator[tuple[str, parse_soup.BlurbMetadata]]:
+        """
+        Yield each work link (with metadata from the listing, if asked for) as soon as it is found. 
+        Links in seen are skipped, which is how getlinks carries on with a file that was cut off. 
+        The file the links are saved to is logged with each page, so that only that file is carried on with.
+        """
+
+        seen = set() if seen is None else seen
         visited_series = []
 
         try:
-            self.get_work_links_recursive(links_list, link, visited_series, metadata)
+            yield from self.get_work_links_recursive(link, seen, visited_series, metadata, None, linksfile)
         except Exception as e:
             print(strings.ERROR_LINKS_LIST)
             self.log_error({'message': strings.ERROR_LINKS_LIST}, e)
 
-        return links_list
 
+    def get_work_links_recursive(self, link: str, seen: set[str], visited_series: list[str], metadata: bool, listing: dict=None, linksfile: str=None) -> Iterator[tuple[str, parse_soup.BlurbMetadata]]:
 
-    def get_work_links_recursive(self, links_list: dict[str, dict], link: str, visited_series: list[str], metadata: bool, soup: BeautifulSoup=None) -> None:
+        link = links.canonical_url(link)
 
         if parse_text.is_work(link):
-            if link not in links_list:
+            if link not in seen:
+                seen.add(link)
                 if metadata:
-                    metadata = parse_soup.get_work_metadata_from_list(soup, link)
-                    links_list[link] = metadata
+                    # a work link entered directly has no listing page to take metadata from
+                    yield link, listing['metadata'][link] if listing else parse_soup.get_work_metadata_from_blurb(None)
                 else:
-                    links_list[link] = None
+                    yield link, None
         elif parse_text.is_series(link):
             if link not in visited_series:
                 visited_series.append(link)
-                series_soup = self.repo.get_soup(link)
-                series_soup = self.proceed(series_soup)
-                work_urls = parse_soup.get_work_urls(series_soup)
-                for work_url in work_urls:
-                    self.get_work_links_recursive(links_list, work_url, visited_series, metadata, series_soup)
+                series_listing = self.get_listing(link, True, metadata)
+                for work_url in series_listing['work_urls']:
+                    yield from self.get_work_links_recursive(work_url, seen, visited_series, metadata, series_listing, linksfile)
         elif strings.AO3_BASE_URL in link:
+            upcoming = None
             while True:
-                self.fileops.write_log({'starting': link})
-                thesoup = self.repo.get_soup(link)
-                urls = parse_soup.get_work_and_series_urls(thesoup, self.series)
+                self.fileops.write_log({'starting': link, 'linksfile': linksfile} if linksfile else {'starting': link})
+                page = upcoming or self.fetch_listing(link, self.series, metadata)
+                nextlink = parse_text.get_next_page(link)
+                pagenum = parse_text.get_page_number(nextlink)
+                last = self.pages and pagenum == self.pages + 1
+                # with processes to parse in, the next page is requested while this one is being parsed
+                upcoming = self.fetch_listing(nextlink, self.series, metadata) if self.processes and not last else None
+                thelisting = parsing.result(page)
+                urls = thelisting['work_urls'] + thelisting['series_urls']
                 if len(urls) == 0: break
                 for url in urls:
-                    self.get_work_links_recursive(links_list, url, visited_series, metadata, thesoup)
-                link = parse_text.get_next_page(link)
-                pagenum = parse_text.get_page_number(link)
-                if self.pages and pagenum == self.pages + 1: break
+                    yield from self.get_work_links_recursive(url, seen, visited_series, metadata, thelisting, linksfile)
+                if last: break
                 print(strings.INFO_FINISHED_PAGE.format(str(pagenum - 1), str(pagenum)))
+                link = nextlink
         else:
             raise exceptions.InvalidLinkException(strings.ERROR_INVALID_LINK)
 
 
-    def download_recursive(self, link: str, log: dict, visited: list[str]) -> None:
+    def fetch_listing(self, link: str, get_all: bool, metadata: bool) -> Future:
+        return parsing.submit(self.processes, self.repo.get_html(link), get_all, metadata)
+
+
+    def get_listing(self, link: str, get_all: bool, metadata: bool) -> dict:
+        """Fetch and parse a series page, checking locked/deleted and proceeding through explicit agreement like proceed does."""
 
+        listing = parsing.result(self.fetch_listing(link, get_all, metadata))
+        if listing['locked']:
+            raise exceptions.LockedException(strings.ERROR_LOCKED)
+        if listing['deleted']:
+            raise exceptions.DeletedException(strings.ERROR_DELETED)
+        if listing['explicit']:
+            if not listing['proceed']: raise exceptions.ProceedException(strings.ERROR_PROCEED_LINK)
+            listing = parsing.result(self.fetch_listing(listing['proceed'], get_all, metadata))
+        return listing
+
+
+    def download_recursive(self, link: str, log: dict, visited: set[str]) -> None:
+
+        link = links.canonical_url(link)
         if link in visited: return
-        visited.append(link)
+        visited.add(link)
 
         if parse_text.is_work(link):
             log = {}
@@ -116,7 +151,8 @@ class Ao3:
                 thesoup = self.repo.get_soup(link)
                 urls = parse_soup.get_work_and_series_urls(thesoup, self.series)
                 if len(urls) == 0: break
-                for url in urls:
+                for i, url in enumerate(urls):
+                    metrics.gauge('queue_depth', len(urls) - i, queue='listing')
                     self.download_recursive(url, log, visited)
                 if not self.mark:
                     link = parse_text.get_next_page(link)
@@ -144,22 +180,23 @@ class Ao3:
             self.log_error(log, e)
 
 
-    def download_work(self, link: str, log: dict, chapters: str) -> None:
+    def download_work(self, link: str, log: dict, chapters: str, files: dict[str, str]=None) -> None:
         """Download a single work"""
 
         try:
             log['link'] = link
-            downloaded = self.try_download(link, log, chapters)
+            downloaded = self.try_download(link, log, chapters, files)
             if downloaded == False: return
         except Exception as e:
             self.log_error(log, e)
         else:
             log['success'] = True
+            metrics.count('works_downloaded')
             self.fileops.write_log(log)
 
 
-    def try_download(self, work_url: str, log: dict, chapters: str) -> bool:
-        """Main download logic"""
+    def try_download(self, work_url: str, log: dict, chapters: str, files: dict[str, str]=None) -> bool:
+        """Main download logic. When updating, files (file type -> path) are the copies with the old chapter count."""
 
         thesoup = self.repo.get_soup(work_url)
         thesoup = self.proceed(thesoup)
@@ -176,11 +213,24 @@ class Ao3:
         log['title'] = title
         log['workskin'] = parse_soup.has_custom_skin(thesoup)
 
+        patched = self.get_patched(thesoup, work_url, log, chapters, files)
+        work = parse_text.get_work_number(work_url)
+
+        # with a source file type set, only that one is downloaded and the others are made from it
+        converted = [x for x in self.filetypes if self.source and x != self.source]
+        source = None
+        saved = {}
         for filetype in self.filetypes:
-            link = parse_soup.get_download_link(thesoup, filetype)
-            response = self.repo.get_book(link)
-            filetype = parse_text.get_file_type(filetype)
-            self.fileops.save_bytes(filename + filetype, response)
+            if filetype in converted: continue
+            response = self.get_file(thesoup, filetype, patched)
+            if filetype == self.source: source = response
+            saved[filename + parse_text.get_file_type(filetype)] = response
+
+        if converted:
+            if source is None: source = self.get_file(thesoup, self.source, patched)
+            filenames = {x: filename + parse_text.get_file_type(x) for x in converted}
+            convert.submit(self.fileops, work, work_url, source, self.source, filenames)
+            log['converted'] = converted
 
         if self.images:
             counter = 0
@@ -192,13 +242,15 @@ class Ao3:
                     if '?' in ext: ext = ext[:ext.index('?')]
                     response = self.repo.get_book(img)
                     imagefile = filename + ' img' + str(counter).zfill(3) + ext
-                    self.fileops.save_bytes(os.path.join(strings.IMAGE_FOLDER_NAME, imagefile), response)
+                    saved[os.path.join(strings.IMAGE_FOLDER_NAME, imagefile)] = response
                     counter += 1
                 except Exception as e:
                     self.fileops.write_log({
                         'message': strings.ERROR_IMAGE, 'link': work_url, 'title': title, 
                         'img': img, 'error': str(e), 'stacktrace': traceback.format_exc()})
 
+        if saved: self.fileops.save_work(work, saved, parse_soup.get_text_or_empty(thesoup, 'dl.stats dd.chapters'))
+
         if self.mark:
             marklink = parse_soup.get_mark_as_read_link(thesoup)
             if marklink: self.repo.my_get(marklink)
@@ -206,6 +258,63 @@ class Ao3:
         return True
 
 
+    def get_file(self, thesoup: BeautifulSoup, filetype: str, patched: dict[str, bytes]) -> bytes:
+        if filetype in patched: return patched[filetype]
+        link = parse_soup.get_download_link(thesoup, filetype)
+        return self.repo.get_book(link)
+
+
+    def get_patched(self, thesoup: BeautifulSoup, work_url: str, log: dict, chapters: str, files: dict[str, str]) -> dict[str, bytes]:
+        """
+        New versions of the old files with the chapters added since, for the file types that can be patched that way.
+        Anything that can't be patched (or if patching is off or too many chapters were added) is left out, to be downloaded whole.
+        """
+
+        if not files or chapters is None: return {}
+        filetypes = [x for x in self.filetypes if x in patch.PATCHABLE_TYPES and x in files]
+        limit = self.fileops.get_ini_value_integer(strings.INI_PATCH_CHAPTERS, 0)
+        old, current = int(chapters), int(parse_soup.get_current_chapters(thesoup))
+        if not filetypes or current - old > limit: return {}
+
+        try:
+            new = self.get_new_chapters(thesoup, work_url, old, current)
+            stats = patch.get_stats(thesoup)
+        except Exception as e:
+            metrics.count('patch_fallbacks')
+            log['patch_error'] = str(e)
+            return {}
+
+        patched = {}
+        for filetype in filetypes:
+            try:
+                with open(files[filetype], 'rb') as f:
+                    content = f.read()
+                patcher = patch.patch_epub if filetype == 'EPUB' else patch.patch_html
+                patched[filetype] = patcher(content, old, new, stats)
+                metrics.count('files_patched')
+            except Exception as e:
+                metrics.count('patch_fallbacks')
+                log['patch_error'] = str(e)
+        if patched: log['patched'] = list(patched)
+        return patched
+
+
+    def get_new_chapters(self, thesoup: BeautifulSoup, work_url: str, old: int, current: int) -> list[dict]:
+        """Chapters after the old chapter count: from the work page if it shows the whole work, otherwise one chapter page at a time."""
+
+        shown = patch.get_chapters(thesoup)
+        if len(shown) == current:
+            new = shown[old:]
+        else:
+            urls = patch.get_chapter_urls(thesoup, work_url)
+            if len(urls) != current: raise exceptions.PatchException(strings.ERROR_PATCH_CHAPTER)
+            new = []
+            for url in urls[old:]:
+                new.extend(patch.get_chapters(self.proceed(self.repo.get_soup(url))))
+        patch.check_new_chapters(new, old)
+        return new
+
+
     def proceed(self, thesoup: BeautifulSoup) -> BeautifulSoup:
         """Check locked/deleted and proceed through explicit agreement if needed"""
 
@@ -220,6 +329,7 @@ class Ao3:
 
 
     def log_error(self, log: dict, exception: Exception):
+        metrics.count('errors', exception=type(exception).__name__)
         log['error'] = str(exception)
         log['success'] = False
         if not isinstance(exception, exceptions.Ao3DownloaderException):
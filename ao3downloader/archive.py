@@ -0,0 +1,190 @@
+"""Zip archives that downloads are saved into instead of loose files, with an index to find each work's files again."""
+
+import contextlib
+import json
+import os
+import zipfile
+from typing import Iterator, NamedTuple
+
+from ao3downloader import links, metrics, parse_text, strings
+
+
+class Member(NamedTuple):
+    """Where one of a work's files is: the shard, which save of the work it is from, and its compressed size."""
+    shard: int
+    version: int
+    size: int
+
+
+class Archive:
+    """
+    Works are added to the newest shard (archive_NNNNN.zip) until it holds shard_works works, then a new shard is started.
+    Every addition is appended to index.jsonl after its shard has been written and synced, along with the shard's size.
+    If a run is interrupted while a shard is being written, the shard is cut back to that size the next time it is used.
+    A work that is saved again (e.g. updated) is added again under a new version; the index always points to its latest files.
+    The space taken by files that have been saved again is counted per shard, and once it is more than half of a shard, 
+    the shard is rewritten without them.
+    """
+
+    def __init__(self, folder: str, shard_works: int) -> None:
+        self.folder = folder
+        self.shard_works = shard_works
+        self.indexfile = os.path.join(folder, strings.ARCHIVE_INDEX_FILE_NAME)
+        self.files = {} # work number -> file name -> Member
+        self.versions = {} # work number -> latest version
+        self.stats = {} # work number -> latest chapter stats
+        self.shards = {} # shard -> {'size': committed size, 'dead': bytes of files saved again since, 'works': set of work numbers}
+        os.makedirs(folder, exist_ok=True)
+        try:
+            with open(self.indexfile, 'r', encoding='utf-8') as f:
+                for line in f:
+                    # a line cut off by an interruption is ignored, along with the files it was for
+                    with contextlib.suppress(ValueError):
+                        self.load_entry(json.loads(line))
+        except FileNotFoundError:
+            pass
+
+
+    def load_entry(self, entry: dict) -> None:
+        work, shard, version = entry['work'], entry['shard'], entry.get('version', 0)
+        info = self.shards.setdefault(shard, {'size': 0, 'dead': 0, 'works': set()})
+        info['size'] = entry['size']
+        info['works'].add(work)
+        files = self.files.setdefault(work, {})
+        for name, size in zip(entry['files'], entry.get('sizes', [0] * len(entry['files']))):
+            old = files.get(name)
+            if old: self.shards[old.shard]['dead'] += old.size
+            files[name] = Member(shard, version, size)
+        self.versions[work] = max(version, self.versions.get(work, 0))
+        if entry.get('stats'): self.stats[work] = entry['stats']
+
+
+    def get_path(self, shard: int) -> str:
+        return os.path.join(self.folder, strings.ARCHIVE_FILE_NAME.format(shard))
+
+
+    def get_shard(self, work: str) -> int:
+        """The shard to add a work to: the newest one, unless it is full (works already in it can always be added again)."""
+
+        shard = max(self.shards, default=0)
+        info = self.shards.get(shard)
+        if info and len(info['works']) >= self.shard_works and work not in info['works']: shard += 1
+        return shard
+
+
+    def add(self, work: str, files: dict[str, bytes], stats: str=None) -> None:
+        """Save a work's files (file name -> content). Returns once they and the index entry are on disk."""
+
+        shard = self.get_shard(work)
+        version = self.versions[work] + 1 if work in self.versions else 0
+        path = self.get_path(shard)
+        self.repair(shard)
+        with metrics.timer(metrics.SAVE_FILE):
+            sizes = []
+            with zipfile.ZipFile(path, 'a', zipfile.ZIP_DEFLATED) as f:
+                for name, content in files.items():
+                    f.writestr(get_member(work, name, version), content)
+                    sizes.append(f.getinfo(get_member(work, name, version)).compress_size)
+            with open(path, 'rb+') as f:
+                os.fsync(f.fileno())
+            entry = {'work': work, 'shard': shard, 'version': version, 'files': list(files), 'sizes': sizes, 'size': os.path.getsize(path)}
+            if stats: entry['stats'] = stats
+            with open(self.indexfile, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+        self.load_entry(entry)
+        metrics.count('bytes_saved', sum(len(x) for x in files.values()))
+        for shard, info in list(self.shards.items()):
+            if info['dead'] * 2 > info['size']: self.compact(shard)
+
+
+    def compact(self, shard: int) -> None:
+        """
+        Rewrite a shard with only the files the index points to, then rewrite the index to match. If this is interrupted 
+        the old index still finds every current file in either the old or the new shard, so nothing is lost.
+        """
+
+        path = self.get_path(shard)
+        tempfile = path + '.tmp'
+        current = {get_member(work, name, member.version) for work, names in self.files.items() for name, member in names.items() if member.shard == shard}
+        with zipfile.ZipFile(path) as src, zipfile.ZipFile(tempfile, 'w', zipfile.ZIP_DEFLATED) as dst:
+            for info in src.infolist():
+                if info.filename in current: dst.writestr(info, src.read(info))
+        with open(tempfile, 'rb+') as f:
+            os.fsync(f.fileno())
+        os.replace(tempfile, path)
+        self.shards[shard]['size'] = os.path.getsize(path)
+        self.shards[shard]['dead'] = 0
+        self.save_index()
+
+
+    def save_index(self) -> None:
+        """Write the index again with one entry per save of a work that still has files in the archive."""
+
+        entries = []
+        for work, names in self.files.items():
+            saves = {}
+            for name, member in names.items():
+                entry = saves.setdefault(member.version, {'work': work, 'shard': member.shard, 'version': member.version, 'files': [], 'sizes': []})
+                entry['files'].append(name)
+                entry['sizes'].append(member.size)
+            for version in sorted(saves):
+                entries.append(saves[version])
+            if work in self.stats: entries[-1]['stats'] = self.stats[work]
+        tempfile = self.indexfile + '.tmp'
+        with open(tempfile, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                entry['size'] = self.shards[entry['shard']]['size']
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tempfile, self.indexfile)
+
+
+    def repair(self, shard: int) -> None:
+        """Cut a shard back to its last indexed size if an interrupted write left it unreadable."""
+
+        path = self.get_path(shard)
+        if shard not in self.shards or not os.path.exists(path): return
+        size = self.shards[shard]['size']
+        if os.path.getsize(path) == size: return
+        try:
+            with zipfile.ZipFile(path):
+                return
+        except zipfile.BadZipFile:
+            with open(path, 'rb+') as f:
+                f.truncate(size)
+
+
+    def get_files(self, work: str) -> list[str]:
+        return list(self.files.get(work, {}))
+
+
+    def read(self, work: str, name: str) -> bytes:
+        """Get one of a work's files. Raises KeyError if the work or file isn't in the archive."""
+
+        member = self.files[work][name]
+        with zipfile.ZipFile(self.get_path(member.shard)) as f:
+            return f.read(get_member(work, name, member.version))
+
+
+    def get_incomplete(self) -> Iterator[dict[str, str]]:
+        """Yield {'link', 'chapters'} for the archived works whose latest chapter stats say they are incomplete."""
+
+        for work, stats in self.stats.items():
+            index = stats.find('/')
+            if index == -1: continue
+            chapters = parse_text.get_current_chapters(stats, index)
+            if chapters != parse_text.get_total_chapters(stats, index):
+                yield {'link': links.WorkRef(int(work)).url, 'chapters': chapters}
+
+
+def get_member(work: str, name: str, version: int=0) -> str:
+    """
+    Name of a file in the zip. Files are kept under the work number, since file names don't have to include it, 
+    and files from saving a work again are kept under the version as well, so no name is used twice.
+    """
+
+    prefix = f'{work}/{version}/' if version else work + '/'
+    return prefix + name.replace(os.sep, '/')
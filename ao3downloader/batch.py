@@ -0,0 +1,124 @@
+"""Run actions non-interactively from job files."""
+
+import importlib
+import json
+import os
+import time
+import traceback
+
+from ao3downloader import exceptions, metrics, profiling, strings
+from ao3downloader.actions import shared
+
+# job action name -> module in ao3downloader.actions (imported only when a job uses it)
+ACTIONS = {
+    'download': 'ao3download',
+    'links': 'getlinks',
+    'file': 'enterlinks',
+    'update': 'updatefics',
+    'update_series': 'updateseries',
+    'redownload': 'redownload',
+    'marked_for_later': 'markedforlater',
+    'pinboard': 'pinboarddownload',
+    'visualization': 'logvisualization',
+    'ignorelist': 'ignorelist',
+    'compact_log': 'compactlog'
+}
+
+EXIT_OK = 0
+EXIT_FAILED_DOWNLOADS = 1
+EXIT_FAILED_JOB = 2
+
+
+def run(paths: list[str], summary_path: str=None) -> int:
+    """Run every job in the given job files in order. Prints a json summary and returns the exit code."""
+
+    summaries = []
+    for path in paths:
+        try:
+            jobs = load_jobs(path)
+        except Exception as e:
+            summaries.append({'file': path, 'status': 'error', 'error': f'{strings.ERROR_JOB_FILE}: {e}'})
+            continue
+        for job in jobs:
+            summary = run_job(job)
+            summary['file'] = path
+            summaries.append(summary)
+
+    if any(x['status'] == 'error' for x in summaries):
+        code = EXIT_FAILED_JOB
+    elif any(x.get('failed') for x in summaries):
+        code = EXIT_FAILED_DOWNLOADS
+    else:
+        code = EXIT_OK
+
+    result = json.dumps({'exit_code': code, 'jobs': summaries}, ensure_ascii=False)
+    print(result)
+    if summary_path:
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write(result)
+    return code
+
+
+def load_jobs(path: str) -> list[dict]:
+    """A job file contains either a single job object or a list of them."""
+
+    with open(path, 'r', encoding='utf-8') as f:
+        jobs = json.load(f)
+    if isinstance(jobs, dict): jobs = [jobs]
+    if not isinstance(jobs, list) or not all(isinstance(x, dict) for x in jobs):
+        raise exceptions.JobException(strings.ERROR_JOB_INVALID_VALUE.format('jobs', type(jobs).__name__))
+    return jobs
+
+
+def run_job(job: dict, resident: shared.Resident=None) -> dict:
+    """
+    Run a single job, answering the action's prompts from the job instead of from the console. 
+    The daemon passes in the session, library index and log cache it keeps between jobs.
+    """
+
+    name = job.get('name', job.get('action'))
+    summary = {'name': name, 'action': job.get('action'), 'status': 'ok', 'succeeded': 0, 'failed': 0}
+    start = time.monotonic()
+
+    fileops = shared.fileops(resident)
+    fileops.rotate_log_if_needed() # now, so the offset below stays valid while the job runs
+    offset = os.path.getsize(fileops.logfile) if os.path.exists(fileops.logfile) else 0
+    fileops.write_log({'message': strings.MESSAGE_JOB_STARTING, 'job': name})
+    metrics.reset()
+
+    try:
+        if job.get('action') not in ACTIONS:
+            raise exceptions.JobException(strings.ERROR_JOB_ACTION.format(job.get('action'), ', '.join(ACTIONS)))
+        module = importlib.import_module(f'ao3downloader.actions.{ACTIONS[job["action"]]}')
+        shared.job = job
+        with profiling.profiled(job['action']):
+            module.action(resident)
+    except Exception as e:
+        summary['status'] = 'error'
+        summary['error'] = str(e)
+        log = {'message': strings.MESSAGE_JOB_FINISHED, 'job': name, 'error': str(e)}
+        if not isinstance(e, exceptions.Ao3DownloaderException):
+            log['stacktrace'] = traceback.format_exc()
+        fileops.write_log(log)
+    else:
+        fileops.write_log({'message': strings.MESSAGE_JOB_FINISHED, 'job': name})
+    finally:
+        shared.job = None
+
+    summary['metrics'] = metrics.snapshot()
+    fileops.log_metrics()
+
+    for log in read_logs_from(fileops.logfile, offset):
+        if log.get('success') == True: summary['succeeded'] += 1
+        if log.get('success') == False: summary['failed'] += 1
+
+    summary['seconds'] = round(time.monotonic() - start, 3)
+    return summary
+
+
+def read_logs_from(logfile: str, offset: int) -> list[dict]:
+    if not os.path.exists(logfile): return []
+    if os.path.getsize(logfile) < offset: offset = 0 # the log was rotated during the job
+    with open(logfile, 'rb') as f:
+        f.seek(offset)
+        return [json.loads(x) for x in f.read().decode('utf-8').split('\n') if x.strip()]
@@ -0,0 +1,102 @@
+"""Make the other file types for a work from one downloaded file, instead of downloading each of them from ao3."""
+
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from ao3downloader import metrics, parse_text, strings
+from ao3downloader.fileio import FileOps
+
+# the converter is an external program, so threads only wait on it and the conversions still run side by side
+CONVERT_THREADS = max(1, (os.cpu_count() or 2) - 1)
+CONVERT_TIMEOUT = 600
+
+executor = None
+# (future, fileops, work number, link, file type, file name) for each conversion that hasn't been saved yet
+pending = []
+
+
+def get_source(fileops: FileOps) -> str:
+    """The file type to download and convert from, or empty if converting is off (or the converter can't be found)."""
+
+    source = fileops.get_ini_value(strings.INI_CONVERT_FROM, '').strip().upper()
+    if not source: return ''
+    if source not in strings.AO3_ACCEPTABLE_DOWNLOAD_TYPES:
+        print(strings.ERROR_CONVERT_FROM.format(source))
+        return ''
+    command = get_command(fileops)
+    if not command or shutil.which(command[0]) is None:
+        print(strings.ERROR_CONVERT_COMMAND.format(command[0] if command else ''))
+        return ''
+    return source
+
+
+def get_command(fileops: FileOps) -> list[str]:
+    return shlex.split(fileops.get_ini_value(strings.INI_CONVERT_COMMAND, strings.INI_DEFAULT_CONVERT_COMMAND))
+
+
+def submit(fileops: FileOps, work: str, link: str, content: bytes, source: str, filenames: dict[str, str]) -> None:
+    """Start converting the source file into each file type (file type -> file name in the download folder)."""
+
+    global executor
+    if executor is None: executor = ThreadPoolExecutor(max_workers=CONVERT_THREADS)
+    command = get_command(fileops)
+    for filetype, filename in filenames.items():
+        future = executor.submit(convert, command, content, source, filetype)
+        pending.append((future, fileops, work, link, filetype, filename))
+    collect(False)
+
+
+def convert(command: list[str], content: bytes, source: str, filetype: str) -> bytes:
+    """Run the converter on a copy of the source file and return what it made."""
+
+    with tempfile.TemporaryDirectory() as folder:
+        infile = os.path.join(folder, 'work' + parse_text.get_file_type(source))
+        outfile = os.path.join(folder, 'converted' + parse_text.get_file_type(filetype))
+        with open(infile, 'wb') as f:
+            f.write(content)
+        with metrics.timer(metrics.CONVERT):
+            # only the placeholders are filled in, so braces in the converter's own options are left alone
+            subprocess.run([x.replace('{input}', infile).replace('{output}', outfile) for x in command],
+                           check=True, capture_output=True, timeout=CONVERT_TIMEOUT)
+        with open(outfile, 'rb') as f:
+            return f.read()
+
+
+def collect(block: bool) -> None:
+    """Save the finished conversions (all of them, if block is set) and log the ones that failed. Runs on the main thread."""
+
+    global pending
+    waiting = []
+    for item in pending:
+        future, fileops, work, link, filetype, filename = item
+        if not block and not future.done():
+            waiting.append(item)
+            continue
+        try:
+            fileops.save_work(work, {filename: future.result()})
+            metrics.count('files_converted')
+        except Exception as e:
+            metrics.count('errors', exception=type(e).__name__)
+            fileops.write_log({
+                'message': strings.ERROR_CONVERT, 'link': link, 'filetype': filetype, 'error': get_error(e),
+                'stacktrace': traceback.format_exc()})
+    pending = waiting
+
+
+def get_error(e: Exception) -> str:
+    if isinstance(e, subprocess.CalledProcessError) and e.stderr:
+        return e.stderr.decode('utf-8', 'replace').strip().splitlines()[-1]
+    return str(e)
+
+
+def finish() -> None:
+    """Wait for the conversions still running and save them."""
+
+    if pending:
+        print(strings.CONVERT_INFO_WAITING.format(len(pending)))
+        collect(True)
@@ -0,0 +1,180 @@
+"""
+Keep running, running scheduled jobs and jobs submitted over a local socket.
+
+The logged-in session, the library index and the parsed log stay in memory between jobs,
+so repeated runs don't pay for python startup, login, log loading and library rescans each time.
+"""
+
+import collections
+import contextlib
+import hmac
+import itertools
+import json
+import os
+import queue
+import secrets
+import socket
+import socketserver
+import threading
+import time
+
+from ao3downloader import batch, exceptions, metrics, strings
+from ao3downloader.actions import shared
+from ao3downloader.fileio import FileOps
+from ao3downloader.library import LibraryIndex
+from ao3downloader.repo import Repository
+
+
+class Daemon:
+    def __init__(self, schedule: list[dict], port: int) -> None:
+        self.port = port
+        self.queue = queue.Queue()
+        self.results = collections.deque(maxlen=100)
+        self.running = None
+        self.stopping = threading.Event()
+        self.ids = itertools.count(1)
+        self.resident = None
+        self.schedule = []
+        for job in schedule:
+            check_job(job)
+            minutes = job.get('every')
+            if not isinstance(minutes, (int, float)) or minutes <= 0:
+                raise exceptions.JobException(strings.ERROR_JOB_INVALID_VALUE.format('every', minutes))
+            self.schedule.append({'job': job, 'every': minutes * 60, 'next': time.monotonic()})
+
+
+    def run(self) -> None:
+        log_cache = {}
+        fileops = FileOps(log_cache)
+        repo = Repository(fileops)
+        self.resident = shared.Resident(repo, LibraryIndex(), log_cache)
+
+        server = ControlServer(('127.0.0.1', self.port), ControlHandler)
+        server.owner = self
+        server.token = write_token()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(strings.DAEMON_INFO_LISTENING.format(self.port))
+
+        try:
+            while not self.stopping.is_set():
+                self.queue_due_jobs()
+                metrics.gauge('queue_depth', self.queue.qsize(), queue='daemon')
+                try:
+                    jobid, job, entry = self.queue.get(timeout=1)
+                except queue.Empty:
+                    continue
+                self.running = job.get('name', job.get('action'))
+                summary = batch.run_job(job, self.resident)
+                summary['id'] = jobid
+                self.running = None
+                self.results.append(summary)
+                print(json.dumps(summary, ensure_ascii=False))
+                if entry: entry['next'] = time.monotonic() + entry['every']
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
+            server.server_close()
+            repo.session.close()
+            self.resident = None
+            with contextlib.suppress(OSError): os.remove(get_token_path())
+
+
+    def queue_due_jobs(self) -> None:
+        now = time.monotonic()
+        for entry in self.schedule:
+            if entry['next'] is not None and entry['next'] <= now:
+                entry['next'] = None # not scheduled again until this run has finished
+                self.submit(entry['job'], entry)
+
+
+    def submit(self, job: dict, entry: dict=None) -> int:
+        jobid = next(self.ids)
+        self.queue.put((jobid, job, entry))
+        return jobid
+
+
+    def handle(self, request: dict) -> dict:
+        command = request.get('command')
+        if command == 'status':
+            return {'queued': self.queue.qsize(), 'running': self.running, 'results': list(self.results)}
+        if command == 'stop':
+            self.stopping.set()
+            return {'stopping': True}
+        if command is not None:
+            raise exceptions.JobException(strings.ERROR_JOB_INVALID_VALUE.format('command', command))
+        check_job(request)
+        return {'queued': self.submit(request)}
+
+
+class ControlServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    """One json object per line in, one json object per line out. Every request has to carry the token from the token file."""
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip(): continue
+            try:
+                request = json.loads(line)
+                token = request.pop('token', '') if isinstance(request, dict) else ''
+                if not isinstance(token, str) or not hmac.compare_digest(token.encode('utf-8'), self.server.token.encode('utf-8')):
+                    raise exceptions.JobException(strings.ERROR_DAEMON_TOKEN)
+                response = self.server.owner.handle(request)
+            except Exception as e:
+                response = {'error': str(e)}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+
+
+def get_token_path() -> str:
+    return os.path.join(strings.LOG_FOLDER_NAME, strings.DAEMON_TOKEN_FILE_NAME)
+
+
+def write_token() -> str:
+    """
+    Make a new token for this run and save it where only this user can read it. Anything else on the computer 
+    can connect to the port, but without the token it can't run jobs (which read and write files) or stop the daemon.
+    """
+
+    token = secrets.token_urlsafe(32)
+    path = get_token_path()
+    with contextlib.suppress(FileNotFoundError): os.remove(path) # so the file is created with the permissions below
+    with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'w', encoding='utf-8') as f:
+        f.write(token)
+    return token
+
+
+def check_job(job: dict) -> None:
+    if not isinstance(job, dict) or job.get('action') not in batch.ACTIONS:
+        action = job.get('action') if isinstance(job, dict) else job
+        raise exceptions.JobException(strings.ERROR_JOB_ACTION.format(action, ', '.join(batch.ACTIONS)))
+
+
+def start(path: str, port: int) -> int:
+    """Run the daemon with the scheduled jobs in the given file (a json list of jobs, each with an 'every' value in minutes)."""
+
+    schedule = batch.load_jobs(path) if path else []
+    Daemon(schedule, port).run()
+    return batch.EXIT_OK
+
+
+def send(requests: list[dict], port: int) -> list[dict]:
+    """Send requests to a running daemon (started from the same folder, so its token can be read) and return its responses."""
+
+    try:
+        with open(get_token_path(), 'r', encoding='utf-8') as f:
+            token = f.read().strip()
+    except FileNotFoundError:
+        raise exceptions.JobException(strings.ERROR_DAEMON_NOT_RUNNING.format(get_token_path()))
+
+    responses = []
+    with socket.create_connection(('127.0.0.1', port)) as sock:
+        with sock.makefile('rwb') as f:
+            for request in requests:
+                f.write(json.dumps({**request, 'token': token}, ensure_ascii=False).encode('utf-8') + b'\n')
+                f.flush()
+                responses.append(json.loads(f.readline()))
+    return responses
@@ -21,9 +21,17 @@ class DownloadException(Ao3DownloaderException):
     pass
 
 
+class PatchException(Ao3DownloaderException):
+    pass
+
+
 class InvalidLinkException(Ao3DownloaderException):
     pass
 
 
 class LoginException(Ao3DownloaderException):
     pass
+
+
+class JobException(Ao3DownloaderException):
+    pass
@@ -0,0 +1,96 @@
+"""
+Serve the run metrics over http in the prometheus text format, so a long run or the daemon can be watched from a dashboard.
+
+Only listens on 127.0.0.1. Counters start over whenever the metrics are reset (at the start of each action or job),
+which prometheus treats as an ordinary counter reset.
+"""
+
+import http.server
+import threading
+import time
+
+from ao3downloader import metrics
+
+PREFIX = 'ao3downloader_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def render() -> str:
+    """Everything recorded since the last reset, in the prometheus text exposition format."""
+
+    with metrics.lock:
+        counters = dict(metrics.counters)
+        gauges = dict(metrics.gauges)
+        seconds = dict(metrics.seconds)
+        calls = dict(metrics.calls)
+        histograms = {k: list(v) for k, v in metrics.histograms.items()}
+        started = metrics.started
+
+    lines = []
+    families = {}
+    for (name, labels), value in counters.items():
+        families.setdefault(name, []).append((labels, value))
+    for name in sorted(families):
+        lines.append(f'# TYPE {PREFIX}{name}_total counter')
+        for labels, value in sorted(families[name]):
+            lines.append(f'{PREFIX}{name}_total{format_labels(labels)} {value}')
+
+    elapsed = max(time.time() - started, 1e-9)
+    works = sum(v for (k, _), v in counters.items() if k == 'works_downloaded')
+    size = sum(v for (k, _), v in counters.items() if k == 'bytes_downloaded')
+    gauges[('works_per_second', ())] = round(works / elapsed, 6)
+    gauges[('bytes_per_second', ())] = round(size / elapsed, 3)
+    gauges[('run_start_time_seconds', ())] = round(started, 3)
+
+    families = {}
+    for (name, labels), value in gauges.items():
+        families.setdefault(name, []).append((labels, value))
+    for name in sorted(families):
+        lines.append(f'# TYPE {PREFIX}{name} gauge')
+        for labels, value in sorted(families[name]):
+            lines.append(f'{PREFIX}{name}{format_labels(labels)} {value}')
+
+    if histograms:
+        lines.append(f'# TYPE {PREFIX}stage_seconds histogram')
+    for stage in sorted(histograms):
+        label = (('stage', stage),)
+        for bound, value in zip(metrics.BUCKETS, histograms[stage]):
+            lines.append(f'{PREFIX}stage_seconds_bucket{format_labels(label + (("le", str(bound)),))} {value}')
+        lines.append(f'{PREFIX}stage_seconds_bucket{format_labels(label + (("le", "+Inf"),))} {calls[stage]}')
+        lines.append(f'{PREFIX}stage_seconds_sum{format_labels(label)} {seconds[stage]:.6f}')
+        lines.append(f'{PREFIX}stage_seconds_count{format_labels(label)} {calls[stage]}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels: return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self) -> None:
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args) -> None:
+        pass # scrapes would otherwise be printed to the console every few seconds
+
+
+def start(port: int) -> http.server.ThreadingHTTPServer:
+    """Serve /metrics on 127.0.0.1 from a background thread. Port 0 picks a free port (see server.server_address)."""
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -1,21 +1,97 @@
 """File operations go here."""
 
+import atexit
 import configparser
+import contextlib
 import datetime
+import gzip
 import json
 import os
+import queue
+import shutil
+import threading
+from typing import Callable, Optional
 
-from ao3downloader import parse_text, strings
+from ao3downloader import links, metrics, parse_text, strings
+from ao3downloader.archive import Archive
+
+# how many files can wait for the background writer before saving has to wait for the disk
+WRITE_QUEUE_SIZE = 16
+
+writer = None
+
+
+class Writer:
+    """
+    Writes files on a background thread, so downloading the next work doesn't wait for the disk. Each file is written to a 
+    temporary file next to it and then renamed over it, so an interrupted run never leaves a half-written file behind.
+    """
+
+    def __init__(self) -> None:
+        self.queue = queue.Queue(WRITE_QUEUE_SIZE)
+        self.errors = []
+        self.done = [] # callbacks for files that have been written, run on the main thread by FileOps.check_writes
+        threading.Thread(target=self.run, name='writer', daemon=True).start()
+        atexit.register(self.flush)
+
+
+    def put(self, file: str, content: bytes, sync: bool, done: Callable[[], None]=None) -> None:
+        self.queue.put((file, content, sync, done))
+        metrics.gauge('queue_depth', self.queue.qsize(), queue='writes')
+
+
+    def run(self) -> None:
+        while True:
+            file, content, sync, done = self.queue.get()
+            try:
+                write_file(file, content, sync)
+                if done: self.done.append(done)
+            except Exception as e:
+                self.errors.append((file, e))
+            finally:
+                self.queue.task_done()
+                metrics.gauge('queue_depth', self.queue.qsize(), queue='writes')
+
+
+    def flush(self) -> None:
+        self.queue.join()
+
+
+def write_file(file: str, content: bytes, sync: bool) -> None:
+    tempfile = f'{file}.{os.getpid()}.tmp'
+    try:
+        with metrics.timer(metrics.SAVE_FILE):
+            with open(tempfile, 'wb') as f:
+                f.write(content)
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tempfile, file)
+    except BaseException:
+        with contextlib.suppress(OSError): os.remove(tempfile)
+        raise
+    metrics.count('bytes_saved', len(content))
 
 
 class FileOps:
-    def __init__(self):
+    def __init__(self, log_cache: dict=None):
         if not os.path.exists(strings.LOG_FOLDER_NAME): os.mkdir(strings.LOG_FOLDER_NAME)
         if not os.path.exists(strings.DOWNLOAD_FOLDER_NAME): os.mkdir(strings.DOWNLOAD_FOLDER_NAME)
         self.logfile = os.path.join(strings.LOG_FOLDER_NAME, strings.LOG_FILE_NAME)
+        self.historyfile = os.path.join(strings.LOG_FOLDER_NAME, strings.LOG_HISTORY_FILE_NAME)
+        self.ignorelistfile = strings.IGNORELIST_FILE_NAME
+        self.ignorelistindex = os.path.join(strings.LOG_FOLDER_NAME, strings.IGNORELIST_INDEX_FILE_NAME)
         self.inifile = strings.INI_FILE_NAME
         self.settingsfile = strings.SETTINGS_FILE_NAME
         self.downloadfolder = strings.DOWNLOAD_FOLDER_NAME
+        self.downloads = None
+        self.downloadsindex = os.path.join(strings.LOG_FOLDER_NAME, strings.DOWNLOADS_INDEX_FILE_NAME)
+        self.saved = None
+        self.archive = None
+        self.sync_files = self.get_ini_value_boolean(strings.INI_SYNC_FILES, True)
+        # parsed log entries by file path, so that only what was appended since last time has to be read.
+        # the daemon passes in the same dict for every job
+        self.log_cache = {} if log_cache is None else log_cache
 
 
     def write_log(self, log: dict) -> None:
@@ -25,11 +101,75 @@ class FileOps:
             f.write('\n')
 
 
-    def save_bytes(self, filename: str, content: bytes) -> None:
+    def log_metrics(self) -> None:
+        if self.get_ini_value_boolean(strings.INI_LOG_METRICS, False):
+            self.write_log({'message': strings.MESSAGE_METRICS, 'metrics': metrics.snapshot()})
+
+
+    def save_bytes(self, filename: str, content: bytes, done: Callable[[], None]=None) -> None:
+        """
+        Hand a file to the background writer. Once it has been written it is added to the downloads and done is called, 
+        the next time check_writes runs. Use flush to wait until every file is on disk and recorded.
+        """
+
+        global writer
         file = os.path.join(self.downloadfolder, filename)
         os.makedirs(os.path.dirname(file), exist_ok=True)
-        with open(file, 'wb') as f:
-            f.write(content)
+        self.check_writes()
+        if writer is None: writer = Writer()
+
+        def saved():
+            if self.downloads is not None and not os.path.dirname(filename):
+                self.downloads.add(os.path.normcase(filename))
+            if done: done()
+
+        writer.put(file, content, self.sync_files, saved)
+
+
+    def save_work(self, work: str, files: dict[str, bytes], stats: str=None) -> None:
+        """
+        Save the files downloaded for a work (file name -> content) and record them in the downloads index, 
+        or add them to the archive instead if that is turned on.
+        """
+
+        archive = self.get_archive()
+        if archive and work:
+            archive.add(work, files, stats)
+            names = {os.path.normcase(x) for x in files}
+            if self.downloads is not None: self.downloads.update(names)
+            if self.saved is not None: self.saved.setdefault(work, set()).update(names)
+            return
+        for name, content in files.items():
+            index = work and not os.path.dirname(name) # not images
+            self.save_bytes(name, content, (lambda name=name: self.add_to_downloads_index(work, [name])) if index else None)
+
+
+    def get_archive(self) -> Optional[Archive]:
+        """The archive that downloads are saved into, or None if they are saved as separate files."""
+
+        if self.archive is None:
+            works = self.get_ini_value_integer(strings.INI_ARCHIVE_SHARD_SIZE, 0)
+            folder = os.path.join(self.downloadfolder, strings.ARCHIVE_FOLDER_NAME)
+            self.archive = Archive(folder, works) if works > 0 else False
+        return self.archive or None
+
+
+    def flush(self) -> None:
+        """Wait until every file given to save_bytes has been written, and record or log them."""
+
+        if writer: writer.flush()
+        self.check_writes()
+
+
+    def check_writes(self) -> None:
+        """Record the files the background writer has finished, and log the ones it couldn't write."""
+
+        while writer and writer.done:
+            writer.done.pop(0)()
+        while writer and writer.errors:
+            file, e = writer.errors.pop(0)
+            metrics.count('errors', exception=type(e).__name__)
+            self.write_log({'message': strings.ERROR_SAVE_FILE, 'path': file, 'error': str(e)})
 
 
     def save_setting(self, setting: str, value) -> None:
@@ -72,23 +212,171 @@ class FileOps:
 
     def load_logfile(self) -> list[dict]:
         logs = []
+        for file in [self.historyfile, self.logfile]:
+            logs.extend(self.load_jsonl(file))
+        return logs
+
+
+    def load_jsonl(self, file: str) -> list[dict]:
         try:
-            with open(self.logfile, 'r', encoding='utf-8') as f:
-                objects = map(lambda x: json.loads(x), f.readlines())
-                logs.extend(list(objects))
+            stat = os.stat(file)
         except FileNotFoundError:
-            pass
-        return logs
+            self.log_cache.pop(file, None)
+            return []
+        cached = self.log_cache.get(file)
+        if not cached or cached['id'] != (stat.st_dev, stat.st_ino) or stat.st_size < cached['size']:
+            cached = {'id': (stat.st_dev, stat.st_ino), 'size': 0, 'entries': []}
+        if stat.st_size > cached['size']:
+            with open(file, 'rb') as f:
+                f.seek(cached['size'])
+                appended = f.read()
+            # only take complete lines, in case we caught a write in progress
+            end = appended.rfind(b'\n') + 1
+            cached['entries'].extend(json.loads(x) for x in appended[:end].decode('utf-8').split('\n') if x.strip())
+            cached['size'] += end
+        self.log_cache[file] = cached
+        return list(cached['entries'])
 
 
-    def file_exists(self, id: str, titles: dict[str, str], filetypes: list[str], maximum: int) -> bool:
-        if id not in titles: return False
-        filename = parse_text.get_valid_filename(titles[id], maximum)
-        files = list(map(lambda x: os.path.join(self.downloadfolder, filename + '.' + x.lower()), filetypes))
-        for file in files:
-            if not os.path.exists(file):
+    def rotate_log_if_needed(self) -> None:
+        """Called once at the start of each action or job, so the log is never moved out from under one that is running."""
+
+        if self.log_needs_rotation(): self.rotate_log()
+
+
+    def log_needs_rotation(self) -> bool:
+        if not os.path.exists(self.logfile): return False
+        size = self.get_ini_value_integer(strings.INI_LOG_ROTATE_SIZE, strings.INI_DEFAULT_LOG_ROTATE_SIZE)
+        if size > 0 and os.path.getsize(self.logfile) >= size * 1000000: return True
+        days = self.get_ini_value_integer(strings.INI_LOG_ROTATE_DAYS, strings.INI_DEFAULT_LOG_ROTATE_DAYS)
+        if days > 0:
+            try:
+                with open(self.logfile, 'r', encoding='utf-8') as f:
+                    first = datetime.datetime.strptime(json.loads(f.readline())['timestamp'], strings.TIMESTAMP_FORMAT)
+            except Exception:
                 return False
-        return True
+            return datetime.datetime.now() - first >= datetime.timedelta(days=days)
+        return False
+
+
+    def rotate_log(self) -> None:
+        """Move the current log into a compressed archive and fold it into the compacted history."""
+
+        if not os.path.exists(self.logfile): return
+        logs = self.load_logfile()
+        history = parse_text.compact_logs(logs)
+
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        archive = os.path.join(strings.LOG_FOLDER_NAME, strings.LOG_ARCHIVE_FILE_NAME.format(timestamp))
+        print(strings.INFO_COMPACTING_LOGS.format(archive))
+        with open(self.logfile, 'rb') as src, gzip.open(archive, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+
+        # if we crash after replacing the history but before removing the log, the next 
+        # compaction will simply collapse the duplicated entries again, so nothing is lost
+        tempfile = self.historyfile + '.tmp'
+        with open(tempfile, 'w', encoding='utf-8') as f:
+            for log in history:
+                json.dump(log, f, ensure_ascii=False)
+                f.write('\n')
+        os.replace(tempfile, self.historyfile)
+        os.remove(self.logfile)
+        # the next log file can get the same inode, so the cache couldn't tell it apart from this one
+        self.log_cache.pop(self.logfile, None)
+        self.log_cache.pop(self.historyfile, None)
+        print(strings.INFO_COMPACTED_LOGS.format(len(logs), len(history)))
+
+
+    def load_ignorelist(self) -> set[str]:
+        """Get the set of canonical links in the ignore list. Uses the saved index unless the ignore list has been edited since."""
+
+        try:
+            stat = os.stat(self.ignorelistfile)
+        except FileNotFoundError:
+            return set()
+        try:
+            with open(self.ignorelistindex, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index['mtime'] == stat.st_mtime_ns and index['size'] == stat.st_size:
+                return set(index['links'])
+        except Exception:
+            pass # missing or stale index, rebuild it
+        with open(self.ignorelistfile, 'r', encoding='utf-8') as f:
+            ignorelist = {links.canonical_url(x.split('; ', 1)[0]) for x in f if x.strip()}
+        self.save_ignorelist_index(ignorelist)
+        return ignorelist
+
+
+    def add_to_ignorelist(self, ignorelist: set[str], entries: dict[str, str]) -> None:
+        """Append links (with comments) to the ignore list, and add them to the given set and the saved index."""
+
+        with open(self.ignorelistfile, 'a+', encoding='utf-8') as f:
+            if f.tell() > 0:
+                f.seek(f.tell() - 1)
+                if f.read(1) != '\n': f.write('\n') # don't glue the first new link onto the last line
+            for link, comment in entries.items():
+                f.write(f'{link}; {comment}\n' if comment else f'{link}\n')
+        ignorelist.update(links.canonical_url(x) for x in entries)
+        self.save_ignorelist_index(ignorelist)
+
+
+    def save_ignorelist_index(self, ignorelist: set[str]) -> None:
+        stat = os.stat(self.ignorelistfile)
+        with open(self.ignorelistindex, 'w', encoding='utf-8') as f:
+            json.dump({'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'links': sorted(ignorelist)}, f)
+
+
+    def file_exists(self, id: str, titles: dict[str, str], filetypes: list[str], maximum: int) -> bool:
+        """
+        Whether the work is in the download folder (or the archive) in all of these file types. Files are found through the downloads index,
+        so changing the filename settings doesn't matter, or else by the title in the log (for files saved before the index existed).
+        """
+
+        work = parse_text.get_work_number(id)
+        stems = {os.path.splitext(x)[0] for x in self.get_saved_files().get(work, ())} if work else set()
+        if id in titles: stems.add(os.path.normcase(parse_text.get_valid_filename(titles[id], maximum)))
+        if not stems: return False
+        downloads = self.get_downloads()
+        extensions = [os.path.normcase(parse_text.get_file_type(x)) for x in filetypes]
+        return all(any(stem + extension in downloads for stem in stems) for extension in extensions)
+
+
+    def get_downloads(self) -> set[str]:
+        """Names of the files in the download folder and the archive. Listed once, then kept up to date by save_bytes and save_work."""
+
+        self.check_writes()
+        if self.downloads is None:
+            with os.scandir(self.downloadfolder) as entries:
+                self.downloads = {os.path.normcase(x.name) for x in entries if x.is_file()}
+            archive = self.get_archive()
+            if archive:
+                for names in archive.files.values():
+                    self.downloads.update(os.path.normcase(x) for x in names)
+        return self.downloads
+
+
+    def add_to_downloads_index(self, work: str, files: list[str]) -> None:
+        """Record the files (in the download folder) saved for a work."""
+
+        with open(self.downloadsindex, 'a', encoding='utf-8') as f:
+            json.dump({'work': work, 'files': files}, f, ensure_ascii=False)
+            f.write('\n')
+        if self.saved is not None:
+            self.saved.setdefault(work, set()).update(os.path.normcase(x) for x in files)
+
+
+    def get_saved_files(self) -> dict[str, set[str]]:
+        """Work number -> names of the files saved for it, from the downloads index and the archive. The files may since have been moved or deleted."""
+
+        if self.saved is None:
+            self.saved = {}
+            for entry in self.load_jsonl(self.downloadsindex):
+                self.saved.setdefault(entry['work'], set()).update(os.path.normcase(x) for x in entry['files'])
+            archive = self.get_archive()
+            if archive:
+                for work, names in archive.files.items():
+                    self.saved.setdefault(work, set()).update(os.path.normcase(x) for x in names)
+        return self.saved
 
 
     def get_ini_value(self, key: str, fallback: str = None) -> str:
@@ -0,0 +1,130 @@
+"""Index of the ao3 info found in library files, so unchanged files don't have to be parsed again, and the library folder walk."""
+
+import fnmatch
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterator
+
+from ao3downloader import strings
+
+INDEX_VERSION = 1
+
+# directories are listed in parallel because on network shares most of the walk is spent waiting for listings
+WALK_THREADS = 8
+
+# a directory modified this recently could still change within the same mtime tick, so its listing isn't kept
+RACY_SECONDS = 2
+
+
+class LibraryIndex:
+    def __init__(self, indexfile: str=None) -> None:
+        self.indexfile = indexfile or os.path.join(strings.LOG_FOLDER_NAME, strings.LIBRARY_INDEX_FILE_NAME)
+        self.files = {}
+        self.dirs = {}
+        self.changed = False
+        try:
+            with open(self.indexfile, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('version') == INDEX_VERSION:
+                self.files = index['files']
+                self.dirs = index.get('dirs', {})
+        except (FileNotFoundError, ValueError, KeyError):
+            pass # start from scratch
+
+
+    def get(self, path: str) -> dict:
+        """Get the indexed entry for a file, or None if the file is new or has changed since it was indexed."""
+
+        entry = self.files.get(os.path.abspath(path))
+        if entry is None: return None
+        stat = os.stat(path)
+        if entry['mtime'] != stat.st_mtime_ns or entry['size'] != stat.st_size: return None
+        return entry
+
+
+    def put(self, path: str, info: dict) -> None:
+        stat = os.stat(path)
+        self.files[os.path.abspath(path)] = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'info': info}
+        self.changed = True
+
+
+    def get_dir(self, path: str, stat: os.stat_result) -> dict:
+        """Get the indexed listing of a directory, or None if entries have been added, removed or renamed since."""
+
+        entry = self.dirs.get(os.path.abspath(path))
+        if entry is None or entry['mtime'] != stat.st_mtime_ns: return None
+        return entry
+
+
+    def put_dir(self, path: str, stat: os.stat_result, files: list[str], dirs: list[str]) -> None:
+        if time.time_ns() - stat.st_mtime_ns < RACY_SECONDS * 1000000000: return
+        self.dirs[os.path.abspath(path)] = {'mtime': stat.st_mtime_ns, 'files': files, 'dirs': dirs}
+        self.changed = True
+
+
+    def save(self) -> None:
+        if not self.changed: return
+        os.makedirs(os.path.dirname(self.indexfile) or '.', exist_ok=True)
+        tempfile = self.indexfile + '.tmp'
+        with open(tempfile, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'files': self.files, 'dirs': self.dirs}, f, ensure_ascii=False)
+        os.replace(tempfile, self.indexfile)
+        self.changed = False
+
+
+def find_files(folder: str, filetypes: list[str], exclude: list[str]=None, library: LibraryIndex=None) -> Iterator[dict[str, str]]:
+    """
+    Yield {'path', 'filetype'} for each file in the folder tree with one of the given (uppercase) extensions, as soon as its directory has been listed.
+    Files and directories matching an exclude glob (by name, or by path relative to the folder) are skipped.
+    Directories the library index has seen with the same mtime aren't listed again.
+    Like os.walk, symlinked directories are not followed and unreadable directories are skipped. The order is not defined.
+    """
+
+    filetypes = set(filetypes)
+    with ThreadPoolExecutor(max_workers=WALK_THREADS) as executor:
+        pending = {executor.submit(list_dir, folder, library)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, files, dirs = future.result()
+                for name in dirs:
+                    subdir = os.path.join(path, name)
+                    if not is_excluded(folder, subdir, exclude):
+                        pending.add(executor.submit(list_dir, subdir, library))
+                for name in files:
+                    filetype = os.path.splitext(name)[1][1:].upper()
+                    if filetype in filetypes:
+                        file = os.path.join(path, name)
+                        if not is_excluded(folder, file, exclude):
+                            yield {'path': file, 'filetype': filetype}
+
+
+def list_dir(path: str, library: LibraryIndex=None) -> tuple[str, list[str], list[str]]:
+    try:
+        stat = os.stat(path)
+        entry = library.get_dir(path, stat) if library else None
+        if entry: return path, entry['files'], entry['dirs']
+        files = []
+        dirs = []
+        with os.scandir(path) as entries:
+            for item in entries:
+                try:
+                    if item.is_dir():
+                        if not item.is_symlink(): dirs.append(item.name)
+                    else:
+                        files.append(item.name)
+                except OSError:
+                    files.append(item.name)
+        if library: library.put_dir(path, stat, files, dirs)
+        return path, files, dirs
+    except OSError:
+        return path, [], []
+
+
+def is_excluded(folder: str, path: str, exclude: list[str]) -> bool:
+    if not exclude: return False
+    name = os.path.basename(path)
+    relative = os.path.relpath(path, folder).replace(os.sep, '/')
+    return any(fnmatch.fnmatch(name, x) or fnmatch.fnmatch(relative, x) for x in exclude)
@@ -0,0 +1,163 @@
+"""Files that getlinks saves work links (and their metadata) to go here. Each link is written as soon as it is found."""
+
+import abc
+import csv
+import io
+import json
+import os
+from typing import Optional
+
+from ao3downloader import strings
+from ao3downloader.fileio import FileOps
+from ao3downloader.parse_soup import BlurbMetadata
+
+TEXT = 'txt'
+CSV = 'csv'
+JSONL = 'jsonl'
+PARQUET = 'parquet'
+METADATA_FORMATS = [CSV, JSONL, PARQUET]
+
+# parquet files are written a row group at a time
+PARQUET_ROWS = 1000
+
+FIELDS = {'link': str, **BlurbMetadata.__annotations__}
+
+
+def get_format(fileops: FileOps, metadata: bool) -> str:
+    """File type to save links as: plain text without metadata, otherwise the one in settings.ini."""
+
+    if not metadata: return TEXT
+    format = fileops.get_ini_value(strings.INI_METADATA_FORMAT, CSV).strip().lower()
+    if format not in METADATA_FORMATS:
+        print(strings.ERROR_METADATA_FORMAT.format(format, ', '.join(METADATA_FORMATS)))
+        return CSV
+    if format == PARQUET:
+        try:
+            import pyarrow
+        except ImportError:
+            print(strings.ERROR_PYARROW)
+            return JSONL
+    return format
+
+
+def open_writer(path: str, format: str, append: bool=False) -> 'LinkWriter':
+    writers = {TEXT: TextWriter, CSV: CsvWriter, JSONL: JsonlWriter, PARQUET: ParquetWriter}
+    return writers[format](path, append)
+
+
+def get_resumable(path: Optional[str], format: str) -> Optional[str]:
+    """The links file logged for the page being carried on from, if it can be added to: it is still there and of this type. Parquet files can't be."""
+
+    if not path or format == PARQUET or not path.endswith('.' + format) or not os.path.isfile(path): return None
+    return path
+
+
+def resume(path: str, format: str) -> set[str]:
+    """
+    Get the links already in a links file. If the file was cut off partway through a row, 
+    that row is removed, so that writing can carry on after the last complete one.
+    """
+
+    # csv rows end with \r\n, so newlines inside a quoted summary don't count as the end of a row
+    end = b'\r\n' if format == CSV else b'\n'
+    with open(path, 'rb+') as f:
+        content = f.read()
+        size = content.rfind(end) + len(end) if end in content else 0
+        f.truncate(size)
+    text = content[:size].decode('utf-8')
+    if format == TEXT: return {x for x in text.split('\n') if x}
+    if format == JSONL: return {json.loads(x)['link'] for x in text.split('\n') if x}
+    return {x['link'] for x in csv.DictReader(io.StringIO(text, newline=''))}
+
+
+def get_row(link: str, metadata: BlurbMetadata) -> dict:
+    """A work's link and metadata, with the fields in FIELDS order."""
+
+    return {'link': link, **metadata._asdict()}
+
+
+class LinkWriter(abc.ABC):
+    """Use as a context manager, so that whatever was found is saved even if getting the links fails partway."""
+
+    @abc.abstractmethod
+    def write(self, link: str, metadata: BlurbMetadata) -> None:
+        pass
+
+    @abc.abstractmethod
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> 'LinkWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class FileWriter(LinkWriter):
+    """Text files, which are written a row at a time and can be added to later."""
+
+    def __init__(self, path: str, append: bool) -> None:
+        self.file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+
+    def write(self, link: str, metadata: BlurbMetadata) -> None:
+        """Write a row and flush it to the file, so it isn't lost if the script is stopped."""
+
+        self.write_row(link, metadata)
+        self.file.flush()
+
+    @abc.abstractmethod
+    def write_row(self, link: str, metadata: BlurbMetadata) -> None:
+        pass
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class TextWriter(FileWriter):
+    def write_row(self, link: str, metadata: BlurbMetadata) -> None:
+        self.file.write(link + '\n')
+
+
+class CsvWriter(FileWriter):
+    """Lists (fandoms, tags etc) are joined with commas, which ao3 doesn't allow in tags."""
+
+    def __init__(self, path: str, append: bool) -> None:
+        super().__init__(path, append)
+        self.writer = csv.DictWriter(self.file, fieldnames=list(FIELDS))
+        if self.file.tell() == 0: self.writer.writeheader()
+
+    def write_row(self, link: str, metadata: BlurbMetadata) -> None:
+        row = get_row(link, metadata)
+        self.writer.writerow({k: ', '.join(v) if isinstance(v, tuple) else v for k, v in row.items()})
+
+
+class JsonlWriter(FileWriter):
+    def write_row(self, link: str, metadata: BlurbMetadata) -> None:
+        json.dump(get_row(link, metadata), self.file, ensure_ascii=False)
+        self.file.write('\n')
+
+
+class ParquetWriter(LinkWriter):
+    """Needs pyarrow. The file can only be read once it has been closed, and can't be added to afterwards."""
+
+    def __init__(self, path: str, append: bool) -> None:
+        import pyarrow
+        import pyarrow.parquet
+        types = {str: pyarrow.string(), tuple[str, ...]: pyarrow.list_(pyarrow.string()), Optional[bool]: pyarrow.bool_()}
+        self.schema = pyarrow.schema([(k, types[v]) for k, v in FIELDS.items()])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.rows = []
+
+    def write(self, link: str, metadata: BlurbMetadata) -> None:
+        self.rows.append(get_row(link, metadata))
+        if len(self.rows) >= PARQUET_ROWS: self.write_rows()
+
+    def write_rows(self) -> None:
+        import pyarrow
+        if self.rows: self.writer.write_table(pyarrow.Table.from_pylist(self.rows, self.schema))
+        self.rows = []
+
+    def close(self) -> None:
+        self.write_rows()
+        self.writer.close()
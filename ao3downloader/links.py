@@ -0,0 +1,66 @@
+"""Canonical ao3 links go here."""
+
+import re
+from typing import NamedTuple, Optional, Union
+
+from ao3downloader import strings
+
+WORK_PATTERN = re.compile(r'/works/(\d+)')
+SERIES_PATTERN = re.compile(r'/series/(\d+)')
+DIGITS_PATTERN = re.compile(r'\d*')
+
+
+class WorkRef(NamedTuple):
+    id: int
+
+    @property
+    def url(self) -> str:
+        return f'{strings.AO3_BASE_URL}/works/{self.id}'
+
+
+class SeriesRef(NamedTuple):
+    id: int
+
+    @property
+    def url(self) -> str:
+        return f'{strings.AO3_BASE_URL}/series/{self.id}'
+
+
+def get_work_ref(link: str) -> Optional[WorkRef]:
+    """Get the work a link points to, ignoring scheme, chapter and query string. None if it isn't a work link."""
+
+    match = WORK_PATTERN.search(link)
+    return WorkRef(int(match.group(1))) if match else None
+
+
+def get_series_ref(link: str) -> Optional[SeriesRef]:
+    """Get the series a link points to. None if it isn't a series link."""
+
+    match = SERIES_PATTERN.search(link)
+    return SeriesRef(int(match.group(1))) if match else None
+
+
+def get_ref(link: str) -> Optional[Union[WorkRef, SeriesRef]]:
+    """Get the work or series a link points to. Works take precedence."""
+
+    return get_work_ref(link) or get_series_ref(link)
+
+
+def canonical_url(link: str) -> str:
+    """
+    Get the canonical form of a link so the same work or series always compares equal.
+    Work and series links are reduced to https://archiveofourown.org/works/<id> or /series/<id>.
+    Anything else is returned with surrounding whitespace removed and http upgraded to https.
+    """
+
+    ref = get_ref(link)
+    if ref: return ref.url
+    link = link.strip()
+    if link.startswith('http://'): link = 'https://' + link[7:]
+    return link
+
+
+def get_digits(text: str, start: int) -> str:
+    """Get the run of digits in text beginning at start (empty string if there are none)."""
+
+    return DIGITS_PATTERN.match(text, start).group()
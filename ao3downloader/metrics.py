@@ -0,0 +1,98 @@
+"""Timers and counters for the slow parts of a run, so it's possible to tell where the time went."""
+
+import collections
+import contextlib
+import threading
+import time
+
+lock = threading.Lock()
+seconds = collections.Counter()
+calls = collections.Counter()
+histograms = {}
+counters = collections.Counter()
+gauges = {}
+started = time.time()
+
+# names of the timed stages
+REQUEST = 'request'
+READ_BODY = 'read_body'
+RATE_LIMIT_SLEEP = 'rate_limit_sleep'
+EXTRA_WAIT = 'extra_wait'
+PARSE_HTML = 'parse_html'
+PARSE_LISTING = 'parse_listing'
+SCAN_FILE = 'scan_file'
+SAVE_FILE = 'save_file'
+CONVERT = 'convert'
+
+# upper bounds (in seconds) of the latency histogram buckets kept for each stage
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+@contextlib.contextmanager
+def timer(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def record(stage: str, elapsed: float) -> None:
+    """Add time spent on a stage that was measured somewhere else (e.g. in another process)."""
+
+    with lock:
+        seconds[stage] += elapsed
+        calls[stage] += 1
+        buckets = histograms.setdefault(stage, [0] * len(BUCKETS))
+        for i, bound in enumerate(BUCKETS):
+            if elapsed <= bound: buckets[i] += 1
+
+
+def count(name: str, amount: int=1, **labels) -> None:
+    key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    with lock:
+        counters[key] += amount
+
+
+def gauge(name: str, value: float, **labels) -> None:
+    key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    with lock:
+        gauges[key] = value
+
+
+def reset() -> None:
+    global started
+    with lock:
+        seconds.clear()
+        calls.clear()
+        histograms.clear()
+        counters.clear()
+        gauges.clear()
+        started = time.time()
+
+
+def get_name(key: tuple) -> str:
+    name, labels = key
+    if not labels: return name
+    return name + '{' + ','.join(f'{k}={v}' for k, v in labels) + '}'
+
+
+def snapshot() -> dict:
+    with lock:
+        return {
+            'seconds': {k: round(v, 3) for k, v in seconds.items()},
+            'calls': dict(calls),
+            'counters': {get_name(k): v for k, v in counters.items()}}
+
+
+def summary() -> str:
+    """Human-readable report of everything recorded since the last reset."""
+
+    with lock:
+        if not seconds and not counters: return ''
+        lines = ['timing report:']
+        for stage, total in seconds.most_common():
+            lines.append(f'  {stage}: {total:.2f}s over {calls[stage]} calls')
+        for key, value in sorted(counters.items()):
+            lines.append(f'  {get_name(key)}: {value}')
+        return '\n'.join(lines)
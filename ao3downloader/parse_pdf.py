@@ -1,9 +1,12 @@
-import pdfquery
+from typing import TYPE_CHECKING
 
 from ao3downloader import strings
 
+if TYPE_CHECKING: # pdfquery is slow to import, so update.py only imports it when it finds a pdf
+    import pdfquery
 
-def get_work_link_pdf(pdf: pdfquery.PDFQuery) -> str:
+
+def get_work_link_pdf(pdf: 'pdfquery.PDFQuery') -> str:
     # assumption: work link is on the same line as preceding text. probably fine. ¯\_(ツ)_/¯
     # doing some weird string parsing here. considered taking a similar approach to the epub function
     # and parsing the xml tree for URIs. however that might break if someone linked another work in their summary.
@@ -15,7 +18,7 @@ def get_work_link_pdf(pdf: pdfquery.PDFQuery) -> str:
     return None
 
 
-def get_stats_pdf(pdf: pdfquery.PDFQuery) -> str:
+def get_stats_pdf(pdf: 'pdfquery.PDFQuery') -> str:
 
     # assumption: the exact text 'Chapters:' only appears once in the intro
     # and this indicates the chapter count will be on this or the next line
@@ -40,7 +43,7 @@ def get_stats_pdf(pdf: pdfquery.PDFQuery) -> str:
     return chapterstext
 
 
-def get_series_pdf(pdf: pdfquery.PDFQuery) -> list[str]:
+def get_series_pdf(pdf: 'pdfquery.PDFQuery') -> list[str]:
     links = map(lambda x: x.attrib['URI'] if 'URI' in x.attrib else '', pdf.pq('Annot'))
     series = filter(lambda x: 'archiveofourown.org/series/' in x, links)
     return list(series)
@@ -1,13 +1,55 @@
 import re
 import traceback
-from typing import Any
+from typing import NamedTuple, Optional
 
-from bs4 import BeautifulSoup, ResultSet
+from bs4 import BeautifulSoup, Tag
 
-from ao3downloader import parse_text, strings
+from ao3downloader import links, parse_text, strings
 from ao3downloader.exceptions import DownloadException, ProceedException
 
 
+class WorkMetadata(NamedTuple):
+    """Metadata from a work page. These are the {keys} that can be used in the filename pattern."""
+
+    worknum: str
+    title: str
+    author: str
+    fandom: str
+    pairing: str
+    rating: str
+    warning: str
+    category: str
+    words: str
+    chapters: str
+    language: str
+    published: str
+    updated: str
+    series_title: str
+    series_index: str
+
+
+class BlurbMetadata(NamedTuple):
+    """
+    Metadata from a work's blurb on a listing page. Fields that couldn't be read are left empty, with the reason in error,
+    so every work has the same fields (in the same order) for files of metadata. Tags are tuples of names.
+    """
+
+    title: str = ''
+    author: str = ''
+    summary: str = ''
+    fandoms: tuple[str, ...] = ()
+    warnings: tuple[str, ...] = ()
+    characters: tuple[str, ...] = ()
+    relationships: tuple[str, ...] = ()
+    tags: tuple[str, ...] = ()
+    words: str = ''
+    rating: str = ''
+    chapters: str = ''
+    categories: str = ''
+    complete: Optional[bool] = None
+    error: str = ''
+
+
 def get_work_link_html(soup: BeautifulSoup) -> str:
     msg = soup.select('#preface .message a')
     if msg and len(msg) == 2: # there should be exactly two links in here
@@ -97,57 +139,72 @@ def get_series_info(soup: BeautifulSoup) -> dict:
 def get_work_urls(soup: BeautifulSoup) -> list[str]:
     """Get all links to ao3 works on a page"""
 
-    return list(dict.fromkeys(list(
-        map(lambda w: get_full_work_url(w.get('href')), 
-            filter(lambda a : a.get('href') and parse_text.is_work(a.get('href')), 
-                   soup.find_all('a'))))))
+    return get_listing_info(soup, True)['work_urls']
 
 
 def get_full_work_url(url: str) -> str:
     """Get full ao3 work url from partial url"""
 
-    work_number = parse_text.get_work_number(url)
-    return strings.AO3_BASE_URL + '/works/' + work_number
+    return links.get_work_ref(url).url
 
 
 def get_series_urls(soup: BeautifulSoup, get_all: bool) -> list[str]:
     """Get all links to ao3 series on a page"""
 
-    bookmarks = None if get_all else soup.find_all('li', class_='bookmark')
+    return get_listing_info(soup, get_all)['series_urls']
 
-    return list(dict.fromkeys(list(
-        map(lambda w: get_full_series_url(w.get('href')), 
-            filter(lambda a : a.get('href') and is_series(a, get_all, bookmarks),
-                   soup.find_all('a'))))))
 
+def get_full_series_url(url: str) -> str:
+    """Get full ao3 series url from partial url"""
 
-def is_series(element: Any, get_all: bool, bookmarks: ResultSet[Any]) -> bool:
+    return links.get_series_ref(url).url
 
-    series_number = parse_text.get_series_number(element.get('href'))
 
-    # it's not a series at all, so return false
-    if not series_number: return False
+def get_work_and_series_urls(soup: BeautifulSoup, get_all: bool=False) -> list[str]:
+    """Get all links to ao3 works or series on a page"""
 
-    # it is a series and we want all of them, so return true
-    if get_all: return True
+    listing = get_listing_info(soup, get_all)
+    return listing['work_urls'] + listing['series_urls']
 
-    # check the bookmarks list to see if this is a series, and return true if it is
-    return len(list(filter(lambda x: f'series-{series_number}' in x.get('class'), bookmarks))) > 0
 
+def get_listing_info(soup: BeautifulSoup, get_all: bool, metadata: bool=False) -> dict:
+    """Get work urls, series urls and (optionally) blurb metadata from a listing page in a single pass"""
 
-def get_full_series_url(url: str) -> str:
-    """Get full ao3 series url from partial url"""
+    blurbs, bookmarks = get_blurb_index(soup)
 
-    series_number = parse_text.get_series_number(url)
-    return strings.AO3_BASE_URL + '/series/' + series_number
+    work_urls = {}
+    series_urls = {}
 
+    for a in soup.find_all('a', href=True):
+        href = a.get('href')
+        work = links.get_work_ref(href)
+        if work:
+            work_urls[work.url] = work
+        series = links.get_series_ref(href)
+        # bookmarked series are always included, other series links only if we want all of them
+        if series and (get_all or f'series-{series.id}' in bookmarks):
+            series_urls[series.url] = series
 
-def get_work_and_series_urls(soup: BeautifulSoup, get_all: bool=False) -> list[str]:
-    """Get all links to ao3 works or series on a page"""
+    listing = {'work_urls': list(work_urls), 'series_urls': list(series_urls)}
 
-    work_urls = get_work_urls(soup)
-    series_urls = get_series_urls(soup, get_all)
-    return work_urls + series_urls
+    if metadata:
+        listing['metadata'] = {url: get_work_metadata_from_blurb(blurbs.get(f'work-{work.id}')) for url, work in work_urls.items()}
+
+    return listing
+
+
+def get_blurb_index(soup: BeautifulSoup) -> tuple[dict[str, Tag], set[str]]:
+    """Map each class of each blurb on a page to its element, and collect the classes of bookmark blurbs"""
+
+    blurbs = {}
+    bookmarks = set()
+    for li in soup.find_all('li', class_=['blurb', 'bookmark']):
+        classes = li.get('class')
+        for cls in classes:
+            blurbs.setdefault(cls, li)
+        if 'bookmark' in classes:
+            bookmarks.update(classes)
+    return blurbs, bookmarks
 
 
 def get_proceed_link(soup: BeautifulSoup) -> str:
@@ -199,35 +256,56 @@ def has_custom_skin(soup: BeautifulSoup) -> bool:
 
 
 def get_title(soup: BeautifulSoup, link: str, pattern: str) -> str:
-    """Get (non-truncated) filename for the work"""
+    """Get (non-truncated) filename for the work. Only the fields that are in the pattern are read from the page."""
 
-    metadata = get_work_metadata_from_work(soup, link)
+    parts = parse_text.compile_pattern(pattern, WorkMetadata._fields)
+    return parse_text.fill_pattern(parts, get_work_fields(soup, link, [field for _, field in parts if field]))
 
-    for key, value in metadata.items():
-        pattern = pattern.replace(f'{{{key}}}', value)
 
-    return pattern
+def get_work_metadata_from_work(soup: BeautifulSoup, link: str) -> WorkMetadata:
+    return WorkMetadata(**get_work_fields(soup, link, WorkMetadata._fields))
 
 
-def get_work_metadata_from_work(soup: BeautifulSoup, link: str) -> dict:
-    metadata = {}
-    metadata['worknum'] = parse_text.get_work_number(link)
-    metadata['title'] = get_text_or_empty(soup, '.preface .title')
-    metadata['author'] = get_text_or_empty(soup, '.preface .byline')
-    metadata['fandom'] = str.join(', ', list(map(lambda x: x.get_text(), soup.select('dd.fandom a'))))
-    metadata['pairing'] = str.join(', ', list(map(lambda x: x.get_text(), soup.select('dd.relationship a'))))
-    metadata['rating'] = get_text_or_empty(soup, 'dd.rating')
-    metadata['warning'] = str.join(', ', list(map(lambda x: x.get_text(), soup.select('dd.warning a'))))
-    metadata['category'] = str.join(', ', list(map(lambda x: x.get_text(), soup.select('dd.category a'))))
-    metadata['words'] = get_text_or_empty(soup, 'dd.words').replace(',', '').strip()
-    metadata['chapters'] = get_current_chapters(soup)
-    metadata['language'] = get_text_or_empty(soup, 'dd.language')
-    metadata['published'] = get_text_or_empty(soup, 'dd.published')
-    metadata['updated'] = get_text_or_empty(soup, 'dd.status')
-    series_list = list(map(lambda x: get_series_from_span(x), soup.select('dd.series span.series span.position')))
-    metadata['series_title'] = str.join(', ', list(map(lambda x: x[0], series_list)))
-    metadata['series_index'] = str.join(', ', list(map(lambda x: x[1], series_list)))
-    return metadata
+def get_work_fields(soup: BeautifulSoup, link: str, fields: list[str]) -> dict[str, str]:
+    """Read these WorkMetadata fields from a work page. The series are read once for both series fields."""
+
+    values = {}
+    series = None
+    for field in fields:
+        if field in SERIES_FIELDS:
+            if series is None: series = get_series_list(soup)
+            values[field] = str.join(', ', list(map(lambda x: x[SERIES_FIELDS[field]], series)))
+        else:
+            values[field] = WORK_METADATA_GETTERS[field](soup, link)
+    return values
+
+
+def get_tag_list(soup: BeautifulSoup, selector: str) -> str:
+    return str.join(', ', list(map(lambda x: x.get_text(), soup.select(selector))))
+
+
+def get_series_list(soup: BeautifulSoup) -> list[tuple[str, str]]:
+    return list(map(lambda x: get_series_from_span(x), soup.select('dd.series span.series span.position')))
+
+
+# how to read each WorkMetadata field from a work page, apart from the series fields
+WORK_METADATA_GETTERS = {
+    'worknum': lambda soup, link: parse_text.get_work_number(link),
+    'title': lambda soup, link: get_text_or_empty(soup, '.preface .title'),
+    'author': lambda soup, link: get_text_or_empty(soup, '.preface .byline'),
+    'fandom': lambda soup, link: get_tag_list(soup, 'dd.fandom a'),
+    'pairing': lambda soup, link: get_tag_list(soup, 'dd.relationship a'),
+    'rating': lambda soup, link: get_text_or_empty(soup, 'dd.rating'),
+    'warning': lambda soup, link: get_tag_list(soup, 'dd.warning a'),
+    'category': lambda soup, link: get_tag_list(soup, 'dd.category a'),
+    'words': lambda soup, link: get_text_or_empty(soup, 'dd.words').replace(',', '').strip(),
+    'chapters': lambda soup, link: get_current_chapters(soup),
+    'language': lambda soup, link: get_text_or_empty(soup, 'dd.language'),
+    'published': lambda soup, link: get_text_or_empty(soup, 'dd.published'),
+    'updated': lambda soup, link: get_text_or_empty(soup, 'dd.status')}
+
+# series fields -> which part of each (title, index) pair from get_series_list they are
+SERIES_FIELDS = {'series_title': 0, 'series_index': 1}
 
 
 def get_text_or_empty(soup: BeautifulSoup, selector: str) -> str:
@@ -244,15 +322,20 @@ def get_series_from_span(soup: BeautifulSoup) -> tuple[str, str]:
 
     series_link = soup.find('a')
     series_title = series_link.get_text().strip()
-    work_index = re.sub(r'\D', '', soup.decode_contents().replace(str(series_link), '')).strip()
+    # the position is the number in the text around the link ("Part 3 of <a>series</a>")
+    text = ''.join(x.get_text() for x in soup.children if x is not series_link)
+    work_index = ''.join(c for c in text if c.isdigit())
     return series_title, work_index
 
 
-def get_work_metadata_from_list(soup: BeautifulSoup, link: str) -> dict:
+def get_work_metadata_from_list(soup: BeautifulSoup, link: str) -> BlurbMetadata:
+    worknum = parse_text.get_work_number(link)
+    return get_work_metadata_from_blurb(soup.find('li', class_=f'work-{worknum}'))
+
+
+def get_work_metadata_from_blurb(blurb: Tag) -> BlurbMetadata:
     metadata = {}
     try:
-        worknum = parse_text.get_work_number(link)
-        blurb = soup.find('li', class_=f'work-{worknum}')
         tags = blurb.find('ul', class_='tags')
         metadata['title'] = blurb.select('h4.heading a')[0].get_text()
         metadata['author'] = str.join(', ', list(x.get_text() for x in blurb.find_all('a', rel='author')))
@@ -261,11 +344,11 @@ def get_work_metadata_from_list(soup: BeautifulSoup, link: str) -> dict:
             metadata['summary'] = blurb.find('blockquote', class_='summary').decode_contents()
         except:
             metadata['summary'] = '' # some works don't have a summary
-        metadata['fandoms'] = list(x.get_text() for x in blurb.find('h5', class_='fandoms').find_all('a'))
-        metadata['warnings'] = list(x.find('a').get_text() for x in tags.find_all('li', class_='warnings'))
-        metadata['characters'] = list(x.find('a').get_text() for x in tags.find_all('li', class_='characters'))
-        metadata['relationships'] = list(x.find('a').get_text() for x in tags.find_all('li', class_='relationships'))
-        metadata['tags'] = list(x.find('a').get_text() for x in tags.find_all('li', class_='freeforms'))
+        metadata['fandoms'] = get_tags(blurb.find('h5', class_='fandoms').find_all('a'))
+        metadata['warnings'] = get_tags(x.find('a') for x in tags.find_all('li', class_='warnings'))
+        metadata['characters'] = get_tags(x.find('a') for x in tags.find_all('li', class_='characters'))
+        metadata['relationships'] = get_tags(x.find('a') for x in tags.find_all('li', class_='relationships'))
+        metadata['tags'] = get_tags(x.find('a') for x in tags.find_all('li', class_='freeforms'))
         metadata['words'] = blurb.find('dd', class_='words').get_text()
         metadata['rating'] = blurb.find('span', class_='rating').get_text()
         metadata['chapters'] = blurb.find('dd', class_='chapters').get_text()
@@ -273,7 +356,11 @@ def get_work_metadata_from_list(soup: BeautifulSoup, link: str) -> dict:
         metadata['complete'] = True if blurb.find('span', class_='iswip').get_text() == 'Complete Work' else False
     except Exception as e: # don't crash the entire download if there is an unhandled exception
         metadata['error'] = ''.join(traceback.TracebackException.from_exception(e).format())
-    return metadata
+    return BlurbMetadata(**metadata)
+
+
+def get_tags(elements: list[Tag]) -> tuple[str, ...]:
+    return tuple(x.get_text() for x in elements)
 
 
 def get_current_chapters(soup: BeautifulSoup) -> str:
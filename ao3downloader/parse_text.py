@@ -1,6 +1,8 @@
 import datetime
+import functools
+import re
 
-from ao3downloader import strings
+from ao3downloader import links, strings
 
 
 def get_pinboard_url(api_token: str, date: datetime.datetime) -> str:
@@ -20,32 +22,47 @@ def get_valid_filename(filename: str, maximum: int) -> str:
     return valid_name[:maximum].strip()
 
 
+@functools.lru_cache(maxsize=None)
+def compile_pattern(pattern: str, fields: tuple[str, ...]) -> tuple[tuple[str, str], ...]:
+    """
+    Split a filename pattern into (text, field) pairs: the text up to each {field} in it, then the field. The last pair 
+    has the text after the last field and an empty field. Anything in braces that isn't one of the fields is kept as text.
+    Each pattern is only split once, however many works it's used for.
+    """
+
+    parts = []
+    start = 0
+    for match in re.finditer('{(' + '|'.join(map(re.escape, fields)) + ')}', pattern):
+        parts.append((pattern[start:match.start()], match.group(1)))
+        start = match.end()
+    parts.append((pattern[start:], ''))
+    return tuple(parts)
+
+
+def fill_pattern(parts: tuple[tuple[str, str], ...], values: dict[str, str]) -> str:
+    return ''.join(text + (str(values[field]) if field else '') for text, field in parts)
+
+
 def get_file_type(filetype: str) -> str:
     return '.' + filetype.lower()
 
 
 def get_work_number(link: str) -> str:
-    return get_digits_after('/works/', link)
+    ref = links.get_work_ref(link)
+    return str(ref.id) if ref else None
 
 
 def get_series_number(link: str) -> str:
-    return get_digits_after('/series/', link)
+    ref = links.get_series_ref(link)
+    return str(ref.id) if ref else None
 
 
 def is_work(link: str) -> bool:
-    return get_work_number(link) != None
+    return links.WORK_PATTERN.search(link) is not None
 
 
 def is_series(link: str) -> bool:
-    return get_series_number(link) != None
-
-
-def get_digits_after(test: str, url: str) -> str:
-    index = str.find(url, test)
-    if index == -1: return None
-    digits = get_num_from_link(url, index + len(test))
-    if not digits or len(digits) == 0: return None
-    return digits
+    return links.SERIES_PATTERN.search(link) is not None
 
 
 def get_next_page(link: str) -> str:
@@ -74,10 +91,7 @@ def get_page_number(link: str) -> int:
 
 
 def get_num_from_link(link: str, start: int) -> str:
-    end = start
-    while end < len(link) and str.isdigit(link[start:end+1]):
-        end = end + 1
-    return link[start:end]
+    return links.get_digits(link, start)
 
 
 def get_total_chapters(text: str, index: int) -> str:
@@ -124,7 +138,7 @@ def get_title_dict(logs: list[dict]) -> dict[str, str]:
     dictionary = {}
     titles = filter(lambda x: 'title' in x and 'link' in x, logs)
     for obj in list(titles):
-        link = obj['link']
+        link = links.canonical_url(obj['link'])
         if link not in dictionary:
             title = obj['title']
             dictionary[link] = title
@@ -132,10 +146,39 @@ def get_title_dict(logs: list[dict]) -> dict[str, str]:
 
 
 def get_unsuccessful_downloads(logs: list[dict]) -> list[str]:
-    links = []
+    unsuccessful = {}
     errors = filter(lambda x:'link' in x and 'success' in x and x['success'] == False, logs)
     for error in errors:
-        link = error['link']
-        if link not in links: 
-            links.append(link)
-    return links
+        unsuccessful[links.canonical_url(error['link'])] = None
+    return list(unsuccessful)
+
+
+def compact_logs(logs: list[dict]) -> list[dict]:
+    '''
+    collapse log entries into the smallest list of entries that gives the same results for get_title_dict,
+    get_unsuccessful_downloads, the ignore list, and resuming from the last page downloaded.
+    everything else (progress messages, stacktraces, repeated successes) is dropped. order is preserved.
+    '''
+    titles = {}
+    failures = {}
+    paths = {}
+    starting = None
+    for index, log in enumerate(logs):
+        if 'starting' in log:
+            starting = index
+            continue
+        link = links.canonical_url(log['link']) if 'link' in log else None
+        if link and 'title' in log and link not in titles:
+            titles[link] = index
+        if link and log.get('success') == False:
+            failures[(link, log.get('error'))] = index
+        if 'path' in log:
+            paths[(log['path'], link)] = index
+    kept = set(titles.values()) | set(failures.values()) | set(paths.values())
+    if starting is not None: kept.add(starting)
+    compacted = []
+    for index in sorted(kept):
+        entry = {k: v for k, v in logs[index].items() if k != 'stacktrace'}
+        if 'link' in entry: entry['link'] = links.canonical_url(entry['link'])
+        compacted.append(entry)
+    return compacted
@@ -2,7 +2,7 @@ import xml.etree.ElementTree as ET
 
 from urllib.parse import urlparse
 
-from ao3downloader import parse_text
+from ao3downloader import links, parse_text
 
 
 def get_bookmark_list(bookmark_xml: ET.Element, exclude_toread: bool) -> list[dict[str, str]]:
@@ -12,6 +12,7 @@ def get_bookmark_list(bookmark_xml: ET.Element, exclude_toread: bool) -> list[di
         # only include valid ao3 links
         link = attributes['href']
         if urlparse(link).hostname == 'archiveofourown.org' and (parse_text.is_work(link) or parse_text.is_series(link)):
+            attributes = dict(attributes, href=links.canonical_url(link))
             # if exclude_toread is true, only include read bookmarks
             if exclude_toread:
                 if not 'toread' in attributes:
@@ -0,0 +1,70 @@
+"""Parsing listing pages in other processes goes here, so that collecting links from big listings isn't held to one core."""
+
+import contextlib
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from bs4 import BeautifulSoup
+
+from ao3downloader import exceptions, metrics, parse_soup, strings
+from ao3downloader.fileio import FileOps
+
+executor = None
+
+
+def get_processes(fileops: FileOps) -> int:
+    """How many processes to parse listing pages in. 0 parses them on the main thread, as they are fetched."""
+
+    return max(0, fileops.get_ini_value_integer(strings.INI_PARSE_PROCESSES, 0))
+
+
+def parse_listing(html: str, get_all: bool, metadata: bool) -> dict:
+    """
+    Get what get_listing_info gets from a page, plus whether the page is locked, deleted or behind the explicit work agreement
+    (and the link to proceed through it). Runs in a worker process, so it returns only plain data, which is quick to send back.
+    """
+
+    start = time.perf_counter()
+    soup = BeautifulSoup(html, 'html.parser')
+    listing = parse_soup.get_listing_info(soup, get_all, metadata)
+    listing['locked'] = parse_soup.is_locked(soup)
+    listing['deleted'] = parse_soup.is_deleted(soup)
+    listing['explicit'] = parse_soup.is_explicit(soup)
+    listing['proceed'] = None
+    if listing['explicit']:
+        with contextlib.suppress(exceptions.ProceedException):
+            listing['proceed'] = parse_soup.get_proceed_link(soup)
+    listing['seconds'] = time.perf_counter() - start
+    return listing
+
+
+def submit(processes: int, html: str, get_all: bool, metadata: bool) -> Future:
+    """Start parsing a listing page. Without processes it is parsed right away, and the future is already done."""
+
+    global executor
+    if processes > 0:
+        if executor is None: executor = ProcessPoolExecutor(max_workers=processes)
+        return executor.submit(parse_listing, html, get_all, metadata)
+    future = Future()
+    try:
+        future.set_result(parse_listing(html, get_all, metadata))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def result(future: Future) -> dict:
+    """Wait for a listing page to be parsed and return what parse_listing got from it."""
+
+    listing = future.result()
+    metrics.record(metrics.PARSE_LISTING, listing.pop('seconds'))
+    return listing
+
+
+def shutdown() -> None:
+    """Stop the worker processes, if any were started. New ones are started the next time a page is submitted."""
+
+    global executor
+    if executor is not None:
+        executor.shutdown()
+        executor = None
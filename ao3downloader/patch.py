@@ -0,0 +1,299 @@
+"""Add new chapters to a work downloaded before (html or epub), instead of downloading the whole work again."""
+
+import html
+import io
+import posixpath
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+from typing import Optional
+from urllib.parse import unquote
+
+from bs4 import BeautifulSoup, Tag
+
+from ao3downloader import links, parse_soup, strings
+from ao3downloader.exceptions import PatchException
+
+PATCHABLE_TYPES = ['EPUB', 'HTML']
+
+CHAPTER_HEADING = re.compile(r'\s*Chapter (\d+)\b')
+STATS = re.compile(r'(<dd\b[^>]*>)([^<]*Chapters: [^<]*)(</dd>)')
+BODY_START = re.compile(r'<body\b[^>]*>')
+
+OPF_NAMESPACE = '{http://www.idpf.org/2007/opf}'
+CONTAINER_NAMESPACE = '{urn:oasis:names:tc:opendocument:xmlns:container}'
+NCX_MEDIA_TYPE = 'application/x-dtbncx+xml'
+
+
+def get_stats(soup: BeautifulSoup) -> dict:
+    """Chapter count, word count and last update (or completion) from an ao3 work page, as they appear in a download."""
+
+    status = parse_soup.get_text_or_empty(soup, 'dl.stats dt.status')
+    date = parse_soup.get_text_or_empty(soup, 'dl.stats dd.status')
+    return {
+        'chapters': parse_soup.get_text_or_empty(soup, 'dl.stats dd.chapters'),
+        'words': parse_soup.get_text_or_empty(soup, 'dl.stats dd.words'),
+        'updated': f'{status} {date}' if status and date else ''}
+
+
+def get_chapter_urls(soup: BeautifulSoup, link: str) -> list[str]:
+    """Links to every chapter of the work, from the chapter index on the work page. Empty if the page doesn't have one."""
+
+    work = links.get_work_ref(link).url
+    return [f'{work}/chapters/{x.get("value")}?view_adult=true' for x in soup.select('#chapter_index select option[value]')]
+
+
+def get_chapters(soup: BeautifulSoup) -> list[dict]:
+    """Heading, summary, notes, text and end notes of each chapter shown on an ao3 work or chapter page."""
+
+    chapters = []
+    for chapter in soup.select('#chapters > div.chapter'):
+        title = chapter.select_one('.preface h3.title')
+        text = chapter.find('div', class_='userstuff')
+        if title is None or text is None: raise PatchException(strings.ERROR_PATCH_CHAPTER)
+        landmark = text.find('h3', class_='landmark')
+        if landmark: landmark.decompose()
+        chapters.append({
+            'heading': ' '.join(title.get_text().split()),
+            'summary': get_contents(chapter.select_one('#summary blockquote.userstuff')),
+            'notes': get_contents(chapter.select_one('#notes blockquote.userstuff')),
+            'text': text.decode_contents().strip(),
+            'endnotes': get_contents(chapter.select_one('.end.notes blockquote.userstuff'))})
+    return chapters
+
+
+def get_contents(tag: Optional[Tag]) -> str:
+    return tag.decode_contents().strip() if tag else ''
+
+
+def check_new_chapters(chapters: list[dict], old: int) -> None:
+    """Make sure the fetched chapters are the ones that come after the old chapter count, in order."""
+
+    numbers = [get_number(x['heading']) for x in chapters]
+    if not chapters or numbers != list(range(old + 1, old + 1 + len(chapters))):
+        raise PatchException(strings.ERROR_PATCH_CHAPTER)
+
+
+def get_number(heading: str) -> Optional[int]:
+    match = CHAPTER_HEADING.match(heading)
+    return int(match.group(1)) if match else None
+
+
+def patch_html(content: bytes, old: int, chapters: list[dict], stats: dict) -> bytes:
+    """Add chapters to an ao3 html download that has the old number of chapters."""
+
+    text = content.decode('utf-8')
+    soup = BeautifulSoup(text, 'html.parser')
+    heading, toc = get_last_chapter([soup], old)[1:]
+    container = soup.find('div', id='chapters')
+    afterword = soup.find('div', id='afterword')
+    if container is None or afterword is None or container.find_next_sibling() is not afterword:
+        raise PatchException(strings.ERROR_PATCH_FILE)
+
+    # the new chapters go right before the end of the chapters div, which is closed just before the afterword
+    start = get_offset(text, afterword)
+    end = text.rfind('</div>', 0, start)
+    if end == -1 or text[end + len('</div>'):start].strip(): raise PatchException(strings.ERROR_PATCH_FILE)
+    markup = ''.join('\n' + get_chapter_markup(soup, heading, toc, x) for x in chapters)
+    return update_stats(text[:end] + markup + '\n' + text[end:], stats).encode('utf-8')
+
+
+def patch_epub(content: bytes, old: int, chapters: list[dict], stats: dict) -> bytes:
+    """
+    Add chapters to an ao3 epub that has the old number of chapters. Each new chapter gets its own document, made from the
+    last chapter's, and is added to the manifest, spine and table of contents. Everything else in the book is copied as is.
+    """
+
+    with zipfile.ZipFile(io.BytesIO(content)) as book:
+        opfpath = get_opf_path(book)
+        opf = book.read(opfpath).decode('utf-8')
+        folder = posixpath.dirname(opfpath)
+        manifest, spine, ncxpath = read_opf(opf, folder)
+        docs = [manifest[x] for x in spine]
+        texts = {x: book.read(x).decode('utf-8') for x in docs}
+        soups = [BeautifulSoup(texts[x], 'html.parser') for x in docs]
+
+        last, heading, toc = get_last_chapter(soups, old)
+        template = texts[docs[last]]
+
+        # the afterword has to stay at the end. calibre leaves it in the last chapter's document, in which case it is moved
+        # to the last new one, unless it starts a document of its own, in which case the new chapters go before that one
+        afterword = next(((i, x.find('div', id='afterword')) for i, x in enumerate(soups) if i >= last and x.find('div', id='afterword')), None)
+        moved = ''
+        if afterword is None:
+            after = spine[-1]
+            before = None
+        else:
+            index, tag = afterword
+            text = texts[docs[index]]
+            start = get_offset(text, tag)
+            body = BODY_START.search(text)
+            if tag.find_next_sibling() is not None or body is None or body.end() > start: raise PatchException(strings.ERROR_PATCH_FILE)
+            if text[body.end():start].strip():
+                end = text.rfind('</body>')
+                moved = text[start:end]
+                texts[docs[index]] = text[:start] + text[end:]
+                after, before = spine[index], None
+            else:
+                after, before = None, spine[index]
+
+        body = BODY_START.search(template)
+        end = template.rfind('</body>')
+        if body is None or end < body.end(): raise PatchException(strings.ERROR_PATCH_FILE)
+        added = {}
+        for i, chapter in enumerate(chapters):
+            name = get_new_name(book, docs[last], old + 1 + i)
+            markup = get_chapter_markup(soups[last], heading, toc, chapter)
+            if i == len(chapters) - 1: markup += moved
+            added[name] = template[:body.end()] + '\n' + markup + '\n' + template[end:]
+
+        preface = docs[0]
+        texts[preface] = update_stats(texts[preface], stats)
+        opf = add_to_opf(opf, folder, after, before, list(added))
+        ncxfolder = posixpath.dirname(ncxpath) or '.'
+        ncx = add_to_ncx(book.read(ncxpath).decode('utf-8'), ncxfolder, old, chapters, list(added))
+        if moved:
+            source, target = (html.escape(posixpath.relpath(x, ncxfolder)) for x in (docs[afterword[0]], list(added)[-1]))
+            ncx = ncx.replace(f'src="{source}#afterword"', f'src="{target}#afterword"')
+
+        changed = {**{x: y.encode('utf-8') for x, y in texts.items()}, opfpath: opf.encode('utf-8'), ncxpath: ncx.encode('utf-8')}
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, 'w') as patched:
+            # copied in the same order with the same compression, so the uncompressed mimetype file stays first
+            for info in book.infolist():
+                patched.writestr(info, changed.get(info.filename) or book.read(info))
+            for name, text in added.items():
+                patched.writestr(name, text.encode('utf-8'), zipfile.ZIP_DEFLATED)
+        return output.getvalue()
+
+
+def get_last_chapter(soups: list[BeautifulSoup], old: int) -> tuple[int, Tag, Optional[Tag]]:
+    """
+    Find the last chapter's heading (and its table of contents heading, if the file has those) after checking that the
+    chapter headings in the file are exactly chapters 1 to old, in order. Returns the index of the soup it is in as well.
+    """
+
+    headings = [(i, get_number(x.get_text()), x) for i, soup in enumerate(soups) for x in soup.find_all('h2')]
+    headings = [x for x in headings if x[1] is not None]
+    numbers = [x[1] for i, x in enumerate(headings) if i == 0 or headings[i - 1][1] != x[1]]
+    if numbers != list(range(1, old + 1)): raise PatchException(strings.ERROR_PATCH_HEADINGS)
+    last = [x for x in headings if x[1] == old]
+    index, heading = last[-1][0], last[-1][2]
+    toc = last[-2][2] if len(last) > 1 else None
+    if heading.parent is None or heading.parent.find_next_sibling('div') is None: raise PatchException(strings.ERROR_PATCH_FILE)
+    return index, heading, toc
+
+
+def get_chapter_markup(soup: BeautifulSoup, heading: Tag, toc: Optional[Tag], chapter: dict) -> str:
+    """Markup for a new chapter, using the same tags and classes as the last chapter in the file."""
+
+    meta = heading.parent
+    text = meta.find_next_sibling('div')
+    quote = soup.find('blockquote') or text
+    title = html.escape(chapter['heading'], False)
+
+    notes = ''.join(f'<p>{label}</p><blockquote{get_class(quote)}>{chapter[key]}</blockquote>'
+                    for key, label in (('summary', 'Chapter Summary'), ('notes', 'Chapter Notes')) if chapter[key])
+    parts = [f'<h2{get_class(toc)}>{title}</h2>'] if toc else []
+    parts.append(f'<div{get_class(meta)}><h2{get_class(heading)}>{title}</h2>{notes}</div>')
+    parts.append(f'<div{get_class(text)}>{chapter["text"]}</div>')
+    if chapter['endnotes']:
+        parts.append(f'<div{get_class(meta)}><p>Chapter End Notes</p><blockquote{get_class(quote)}>{chapter["endnotes"]}</blockquote></div>')
+    return '\n'.join(parts)
+
+
+def get_class(tag: Tag) -> str:
+    classes = tag.get('class')
+    return f' class="{html.escape(" ".join(classes))}"' if classes else ''
+
+
+def update_stats(text: str, stats: dict) -> str:
+    """Replace the chapter count, word count and update date in the stats of a file's preface."""
+
+    match = STATS.search(text)
+    if match is None or not stats['chapters']: raise PatchException(strings.ERROR_PATCH_STATS)
+    dd = re.sub(r'Chapters: \S+', lambda _: 'Chapters: ' + stats['chapters'], match.group(2), count=1)
+    if stats['words']: dd = re.sub(r'Words: [\d,]+', lambda _: 'Words: ' + stats['words'], dd, count=1)
+    if stats['updated']: dd = re.sub(r'(Updated|Completed): \S+', lambda _: stats['updated'], dd, count=1)
+    return text[:match.start(2)] + dd + text[match.end(2):]
+
+
+def get_offset(text: str, tag: Tag) -> int:
+    """Position of a tag in the text it was parsed from (html.parser records the line and column)."""
+
+    lines = text.split('\n', tag.sourceline - 1)
+    offset = sum(len(x) + 1 for x in lines[:tag.sourceline - 1]) + tag.sourcepos
+    if not text.startswith('<' + tag.name, offset): raise PatchException(strings.ERROR_PATCH_FILE)
+    return offset
+
+
+def get_opf_path(book: zipfile.ZipFile) -> str:
+    container = ET.fromstring(book.read('META-INF/container.xml'))
+    rootfile = container.find(f'.//{CONTAINER_NAMESPACE}rootfile')
+    if rootfile is None: raise PatchException(strings.ERROR_PATCH_FILE)
+    return rootfile.get('full-path')
+
+
+def read_opf(opf: str, folder: str) -> tuple[dict[str, str], list[str], str]:
+    """Manifest (id -> path in the zip), spine (ids) and the path of the ncx. Books with an epub 3 nav document aren't patched."""
+
+    package = ET.fromstring(opf)
+    manifest, ncx = {}, None
+    for item in package.iter(f'{OPF_NAMESPACE}item'):
+        manifest[item.get('id')] = posixpath.join(folder, unquote(item.get('href')))
+        if item.get('media-type') == NCX_MEDIA_TYPE: ncx = manifest[item.get('id')]
+        if 'nav' in (item.get('properties') or '').split(): raise PatchException(strings.ERROR_PATCH_FILE)
+    spine = [x.get('idref') for x in package.iter(f'{OPF_NAMESPACE}itemref')]
+    if ncx is None or not spine or any(x not in manifest for x in spine): raise PatchException(strings.ERROR_PATCH_FILE)
+    return manifest, spine, ncx
+
+
+def get_new_name(book: zipfile.ZipFile, template: str, number: int) -> str:
+    """A file name for a new chapter document next to the last chapter's."""
+
+    folder, extension = posixpath.dirname(template), posixpath.splitext(template)[1]
+    name, suffix = posixpath.join(folder, f'chapter_{number}{extension}'), 0
+    names = set(book.namelist())
+    while name in names:
+        suffix += 1
+        name = posixpath.join(folder, f'chapter_{number}_{suffix}{extension}')
+    return name
+
+
+def get_new_id(name: str) -> str:
+    return 'ao3downloader_' + posixpath.splitext(posixpath.basename(name))[0]
+
+
+def add_to_opf(opf: str, folder: str, after: Optional[str], before: Optional[str], added: list[str]) -> str:
+    """Add the new documents to the manifest, and to the spine after (or before) the given item."""
+
+    items = ''.join(f'<item href="{html.escape(posixpath.relpath(x, folder or "."))}" id="{get_new_id(x)}" media-type="application/xhtml+xml"/>' for x in added)
+    itemrefs = ''.join(f'<itemref idref="{get_new_id(x)}"/>' for x in added)
+    end = opf.find('</manifest>')
+    match = re.search(r'<itemref\b[^>]*\bidref="' + re.escape(after or before) + r'"[^>]*/>', opf)
+    if end == -1 or match is None: raise PatchException(strings.ERROR_PATCH_FILE)
+    position = match.end() if after else match.start()
+    opf = opf[:position] + itemrefs + opf[position:]
+    return opf[:end] + items + opf[end:]
+
+
+def add_to_ncx(ncx: str, folder: str, old: int, chapters: list[dict], added: list[str]) -> str:
+    """Add the new chapters to the table of contents after the last chapter's entry, and renumber the play order."""
+
+    match = next((x for x in re.finditer(r'<navPoint\b.*?<text>([^<]*)</text>', ncx, re.S) if get_number(html.unescape(x.group(1))) == old), None)
+    if match is None: raise PatchException(strings.ERROR_PATCH_TOC)
+    depth, end = 0, None
+    for tag in re.finditer(r'<(/?)navPoint\b[^>]*>', ncx[match.start():]):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            end = match.start() + tag.end()
+            break
+    if end is None: raise PatchException(strings.ERROR_PATCH_TOC)
+
+    points = ''.join(
+        f'<navPoint id="{get_new_id(name)}" playOrder="0"><navLabel><text>{html.escape(chapter["heading"], False)}</text></navLabel>'
+        f'<content src="{html.escape(posixpath.relpath(name, folder))}"/></navPoint>'
+        for chapter, name in zip(chapters, added))
+    ncx = ncx[:end] + points + ncx[end:]
+    order = iter(range(1, ncx.count('playOrder=') + 1))
+    return re.sub(r'playOrder="\d+"', lambda _: f'playOrder="{next(order)}"', ncx)
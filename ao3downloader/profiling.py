@@ -0,0 +1,83 @@
+"""Optionally run an action under a profiler, save the trace in the logs folder and print the hottest functions."""
+
+import contextlib
+import datetime
+import io
+import os
+
+from ao3downloader import strings
+from ao3downloader.fileio import FileOps
+
+CPROFILE = 'cprofile'
+PYINSTRUMENT = 'pyinstrument'
+TOP_FUNCTIONS = 15
+
+
+def get_profiler(fileops: FileOps) -> str:
+    """The profiler to use: the environment variable takes precedence over settings.ini. Empty if profiling is off."""
+
+    profiler = os.environ.get(strings.PROFILE_ENV_VAR)
+    if profiler is None: profiler = fileops.get_ini_value(strings.INI_PROFILE, '')
+    profiler = profiler.strip().lower()
+    if profiler in ('', 'false', 'off', '0'): return ''
+    if profiler not in (CPROFILE, PYINSTRUMENT): raise ValueError(strings.ERROR_PROFILER.format(profiler))
+    return profiler
+
+
+@contextlib.contextmanager
+def profiled(name: str):
+    """Profile whatever runs inside this block if profiling is switched on."""
+
+    fileops = FileOps()
+    try:
+        profiler = get_profiler(fileops)
+    except ValueError as e:
+        print(str(e))
+        profiler = ''
+
+    if profiler == PYINSTRUMENT:
+        try:
+            import pyinstrument
+        except ImportError:
+            print(strings.ERROR_PYINSTRUMENT)
+            profiler = CPROFILE
+
+    if not profiler:
+        yield
+        return
+
+    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    if profiler == CPROFILE:
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            path = os.path.join(strings.LOG_FOLDER_NAME, strings.PROFILE_FILE_NAME.format(name, timestamp, 'prof'))
+            profile.dump_stats(path)
+            print(strings.INFO_PROFILE_SAVED.format(path))
+            print(get_cprofile_summary(profile))
+    else:
+        profile = pyinstrument.Profiler()
+        profile.start()
+        try:
+            yield
+        finally:
+            profile.stop()
+            path = os.path.join(strings.LOG_FOLDER_NAME, strings.PROFILE_FILE_NAME.format(name, timestamp, 'html'))
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(profile.output_html())
+            print(strings.INFO_PROFILE_SAVED.format(path))
+            print(profile.output_text(unicode=True, color=False))
+
+
+def get_cprofile_summary(profile) -> str:
+    """Functions from this program that took the most time, including the time spent in what they called."""
+
+    import pstats
+    stream = io.StringIO()
+    stats = pstats.Stats(profile, stream=stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(r'ao3downloader[\\/]', TOP_FUNCTIONS)
+    return stream.getvalue().strip()
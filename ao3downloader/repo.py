@@ -8,7 +8,7 @@ import requests
 from bs4 import BeautifulSoup
 from requests import codes
 
-from ao3downloader import exceptions, parse_soup, parse_text, strings
+from ao3downloader import exceptions, metrics, parse_soup, parse_text, strings
 from ao3downloader.fileio import FileOps
 
 
@@ -20,6 +20,7 @@ class Repository:
     def __init__(self, fileops: FileOps) -> None:
         self.session = requests.Session()
         self.extra_wait = int(fileops.get_ini_value(strings.INI_WAIT_TIME, '0'))
+        self.logged_in = False
 
 
     def __enter__(self):
@@ -41,11 +42,18 @@ class Repository:
     def get_soup(self, url: str) -> BeautifulSoup:
         """Get BeautifulSoup object from a url."""
 
-        html = self.my_get(url).text
-        soup = BeautifulSoup(html, 'html.parser')
+        html = self.get_html(url)
+        with metrics.timer(metrics.PARSE_HTML):
+            soup = BeautifulSoup(html, 'html.parser')
         return soup
 
 
+    def get_html(self, url: str) -> str:
+        """Get the text of a page, to be parsed somewhere else."""
+
+        return self.my_get(url).text
+
+
     def get_book(self, url: str) -> bytes:
         """Get content from url. Intended for downloading works from ao3."""
 
@@ -56,7 +64,13 @@ class Repository:
     def my_get(self, url: str) -> requests.Response:
         """Get response from a url."""
 
-        response = self.session.get(url, headers=self.headers, timeout=(30, 30))
+        # the request is timed until the headers arrive, and reading the body is timed on its own
+        with metrics.timer(metrics.REQUEST):
+            response = self.session.get(url, headers=self.headers, timeout=(30, 30), stream=True)
+        with metrics.timer(metrics.READ_BODY):
+            size = len(response.content)
+        metrics.count('requests', status=response.status_code)
+        metrics.count('bytes_downloaded', size)
 
         if response.status_code == codes['too_many_requests']:
             try:
@@ -67,11 +81,15 @@ class Repository:
             now = datetime.datetime.now()
             later = now + datetime.timedelta(0, pause_time)
             print(strings.MESSAGE_TOO_MANY_REQUESTS.format(pause_time, now.strftime('%H:%M:%S'), later.strftime('%H:%M:%S')))
-            sleep(pause_time)
+            metrics.count('retry_after_seconds', pause_time)
+            with metrics.timer(metrics.RATE_LIMIT_SLEEP):
+                sleep(pause_time)
             print(strings.MESSAGE_RESUMING)
             return self.my_get(url)
     
-        if self.extra_wait > 0: sleep(self.extra_wait)
+        if self.extra_wait > 0:
+            with metrics.timer(metrics.EXTRA_WAIT):
+                sleep(self.extra_wait)
 
         return response
 
@@ -86,3 +104,4 @@ class Repository:
         soup = BeautifulSoup(response.text, 'html.parser')
         if parse_soup.is_failed_login(soup):
             raise exceptions.LoginException(strings.ERROR_FAILED_LOGIN)
+        self.logged_in = True
@@ -9,10 +9,20 @@ IMAGE_FOLDER_NAME = 'images'
 HTML_FOLDER_NAME = 'html'
 LOG_FOLDER_NAME = 'logs'
 LOG_FILE_NAME = 'log.jsonl'
+LOG_HISTORY_FILE_NAME = 'history.jsonl'
+LOG_ARCHIVE_FILE_NAME = 'log_{}.jsonl.gz'
 SETTINGS_FILE_NAME = 'settings.json'
 TEMPLATE_FILE_NAME = 'template.html'
 VISUALIZATION_FILE_NAME = 'logvisualization{}.html'
 IGNORELIST_FILE_NAME = 'ignorelist.txt'
+IGNORELIST_INDEX_FILE_NAME = 'ignorelist_index.json'
+LIBRARY_INDEX_FILE_NAME = 'library_index.json'
+DOWNLOADS_INDEX_FILE_NAME = 'downloads_index.jsonl'
+ARCHIVE_FOLDER_NAME = 'archive'
+ARCHIVE_FILE_NAME = 'archive_{:05d}.zip'
+ARCHIVE_INDEX_FILE_NAME = 'index.jsonl'
+PROFILE_FILE_NAME = 'profile_{}_{}.{}'
+DAEMON_TOKEN_FILE_NAME = 'daemon_token.txt'
 INI_FILE_NAME = 'settings.ini'
 INI_SECTION_NAME = 'settings'
 
@@ -20,9 +30,27 @@ INI_WAIT_TIME = 'ExtraWaitTime'
 INI_PASSWORD_SAVE = 'SavePassword'
 INI_NAME_LENGTH = 'FileNameLength'
 INI_NAME_PATTERN = 'FileNamePattern'
+INI_LOG_ROTATE_SIZE = 'LogRotateSize'
+INI_LOG_ROTATE_DAYS = 'LogRotateDays'
+INI_LOG_METRICS = 'LogMetrics'
+INI_METRICS_PORT = 'MetricsPort'
+INI_PROFILE = 'Profile'
+INI_SCAN_EXCLUDE = 'ScanExclude'
+INI_PATCH_CHAPTERS = 'PatchChapters'
+INI_CONVERT_FROM = 'ConvertFrom'
+INI_CONVERT_COMMAND = 'ConvertCommand'
+INI_SYNC_FILES = 'SyncFiles'
+INI_ARCHIVE_SHARD_SIZE = 'ArchiveShardSize'
+INI_METADATA_FORMAT = 'MetadataFormat'
+INI_PARSE_PROCESSES = 'ParseProcesses'
+
+PROFILE_ENV_VAR = 'AO3DOWNLOADER_PROFILE'
 
 INI_DEFAULT_NAME_LENGTH = '50'
 INI_DEFAULT_NAME_PATTERN = '{worknum} {title} - {author}'
+INI_DEFAULT_LOG_ROTATE_SIZE = 100
+INI_DEFAULT_LOG_ROTATE_DAYS = 0
+INI_DEFAULT_CONVERT_COMMAND = 'ebook-convert {input} {output}'
 
 SETTING_USERNAME = 'username'
 SETTING_PASSWORD = 'password'
@@ -53,6 +81,20 @@ ACTION_DESCRIPTION_LINKS_ONLY = 'get all work links from an ao3 listing (saves l
 ACTION_DESCRIPTION_MARKED_FOR_LATER = 'download marked for later list and mark all as read (requires login)'
 ACTION_DESCRIPTION_FILE_INPUT = 'download links from file'
 ACTION_DESCRIPTION_CONFIGURE_IGNORELIST = 'configure ignore list (list of links to never try to download)'
+ACTION_DESCRIPTION_COMPACT_LOG = 'archive and compact the log file'
+
+CLI_DESCRIPTION = 'download fanfiction from ao3. run without arguments for the interactive menu.'
+CLI_HELP_JOB = 'run the jobs in these json files without prompting, then exit. see readme for the job file format.'
+CLI_HELP_SUMMARY = 'also write the json summary of the jobs to this file'
+CLI_HELP_DAEMON = 'keep running and run the scheduled jobs in this json file (each job needs an "every" value in minutes). also accepts jobs from --submit.'
+CLI_HELP_SUBMIT = 'send the jobs in these json files to a running daemon'
+CLI_HELP_COMMAND = 'send a command to a running daemon'
+CLI_HELP_PORT = 'local port the daemon listens on'
+CLI_HELP_METRICS_PORT = 'serve prometheus metrics on this local port (overrides the MetricsPort setting, 0 to turn off)'
+
+DAEMON_DEFAULT_PORT = 47310
+DAEMON_INFO_LISTENING = 'daemon listening on 127.0.0.1:{}. press ctrl+c to stop.'
+METRICS_INFO_LISTENING = 'serving metrics on http://127.0.0.1:{}/metrics'
 
 PINBOARD_PROMPT_API_TOKEN = 'please enter api token'
 PINBOARD_PROMPT_INCLUDE_UNREAD = 'do you want to include unread bookmarks? ({}/{})'.format(PROMPT_YES, PROMPT_NO)
@@ -78,6 +120,7 @@ AO3_PROMPT_FILE_INPUT = 'please enter complete file path (including file extensi
 AO3_INFO_LOGIN = 'logging in'
 AO3_INFO_DOWNLOADING = 'downloading works'
 AO3_INFO_FILE_TYPE = 'added {} to list of download types'
+CONVERT_INFO_WAITING = 'waiting for {} file conversions to finish'
 AO3_INFO_VISITED = 'generating list of work links that are already in the downloads folder (will be skipped)'
 
 UPDATE_PROMPT_INPUT = 'input path to folder containing files you want to check for updates (also checks subfolders)'
@@ -113,12 +156,18 @@ INFO_NO_FOLDER = 'folder does not exist'
 INFO_EXCLUDING_WORKS = 'filtering out works that are already in the downloads folder'
 INFO_FINISHED_PAGE = 'finished getting page {}. starting page {}'
 INFO_PARSING_LOGS = 'parsing data from log entries with timestamps starting at {} and ending at {}'
+INFO_COMPACTING_LOGS = 'archiving log file to {} and compacting history'
+INFO_COMPACTED_LOGS = 'compacted {} log entries into {}'
+INFO_PROFILE_SAVED = 'profile saved to {}'
 
 MESSAGE_TOO_MANY_REQUESTS = 'ao3 has requested a {} second break\npaused at: {}\nresuming at: {}'
 MESSAGE_RESUMING = 'resuming execution'
 MESSAGE_INCOMPLETE_FIC = 'found incomplete fic'
 MESSAGE_FIC_FILE = 'found fic file'
 MESSAGE_SERIES_FILE = 'found work in series'
+MESSAGE_JOB_STARTING = 'starting job'
+MESSAGE_JOB_FINISHED = 'finished job'
+MESSAGE_METRICS = 'run metrics'
 
 # endregion
 
@@ -158,5 +207,24 @@ ERROR_FIC_IN_SERIES = 'Problem parsing file while checking for fics in series'
 ERROR_REDOWNLOAD = 'Error processing file for re-download'
 ERROR_IMAGE = 'Problem getting image'
 ERROR_LINKS_LIST = 'Error encountered while getting links list. List may not be complete.'
+ERROR_JOB_MISSING_VALUE = 'Job is missing a value for \'{}\''
+ERROR_JOB_INVALID_VALUE = 'Invalid value in job for \'{}\': {}'
+ERROR_JOB_ACTION = 'Unknown job action: {}. Valid actions are {}'
+ERROR_JOB_FILE = 'Problem reading job file'
+ERROR_DAEMON_TOKEN = 'Request is missing the daemon\'s token'
+ERROR_DAEMON_NOT_RUNNING = 'No daemon token found at {}. Is the daemon running from this folder?'
+ERROR_PATCH_HEADINGS = 'Chapter headings in the file do not match its chapter count'
+ERROR_PATCH_FILE = 'Problem finding where to add chapters in the file'
+ERROR_PATCH_STATS = 'Problem finding the chapter stats in the file'
+ERROR_PATCH_TOC = 'Problem finding the last chapter in the table of contents'
+ERROR_PATCH_CHAPTER = 'Problem getting new chapters from ao3'
+ERROR_SAVE_FILE = 'Problem saving file'
+ERROR_CONVERT = 'Problem converting file'
+ERROR_CONVERT_FROM = 'Unknown file type to convert from: {}. Downloading every file type from ao3 instead'
+ERROR_CONVERT_COMMAND = 'Could not find the file converter ({}). Downloading every file type from ao3 instead'
+ERROR_PROFILER = 'Unknown profiler: {}. Use cprofile or pyinstrument'
+ERROR_PYINSTRUMENT = 'pyinstrument is not installed, using cprofile instead'
+ERROR_METADATA_FORMAT = 'Unknown metadata format: {}. Use one of {}. Saving as csv instead'
+ERROR_PYARROW = 'pyarrow is not installed, saving metadata as jsonl instead'
 
 # endregion
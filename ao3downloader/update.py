@@ -2,32 +2,77 @@ import os
 import shutil
 import xml.etree.ElementTree as ET
 
-import ebooklib
-import mobi
-import pdfquery
 from bs4 import BeautifulSoup
-from ebooklib import epub
 
-from ao3downloader import parse_pdf, parse_soup, parse_text, parse_xml, strings
+from ao3downloader import links, metrics, parse_pdf, parse_soup, parse_text, parse_xml, strings
+from ao3downloader.library import LibraryIndex
 
 
-def process_file(path: str, filetype: str, update: bool=True, update_series: bool=False) -> dict:
+def process_file(path: str, filetype: str, update: bool=True, update_series: bool=False, library: LibraryIndex=None) -> dict:
     '''add url of work to list if current version of work is incomplete'''
 
+    info = get_file_info(path, filetype, library)
+
+    if info is None: return None # if this isn't a work from ao3, return
+    href = info['link']
+    stats = info['stats']
+    series = info['series']
+
+    # if we don't care whether the fic is incomplete, just return the work link
+    if not update: return {'link': href}
+
+    # if this is a series update, return the series links if any were found
+    if update_series: return {'link': href, 'series': series} if series else None
+
+    # otherwise continue checking for incomplete fics
+    if stats is None: return None # if we can't find the series metadata, return
+
+    # if the metadata does not contain the character "/", return
+    # we assume that the "/" character represents chapter count
+    index = stats.find('/')
+    if index == -1: return None
+
+    # if the chapter counts do not match, we assume the work is incomplete
+    totalchap = parse_text.get_total_chapters(stats, index)
+    currentchap = parse_text.get_current_chapters(stats, index)
+
+    # if the work is incomplete, return the info
+    if currentchap != totalchap:
+        return {'link': href, 'chapters': currentchap}
+
+
+def get_file_info(path: str, filetype: str, library: LibraryIndex=None) -> dict:
+    '''get work link, chapter stats and series links from a file, skipping the parsing if the library index has them already'''
+
+    entry = library.get(path) if library else None
+    if entry:
+        metrics.count('files_from_library_index')
+        return entry['info']
+    with metrics.timer(metrics.SCAN_FILE):
+        info = parse_file(path, filetype)
+    if library: library.put(path, info)
+    return info
+
+
+def parse_file(path: str, filetype: str) -> dict:
+    '''get work link, chapter stats and series links from a file. None if the file isn't from ao3.'''
+
+    # the ebook libraries are slow to import, so only import the one this file type needs
     if filetype == 'EPUB':
         xml = get_epub_preface(path)
         href = parse_xml.get_work_link_epub(xml)
         stats = parse_xml.get_stats_epub(xml)
-        if update_series: series = parse_xml.get_series_epub(xml)
+        series = parse_xml.get_series_epub(xml)
 
     elif filetype == 'HTML':
         with open(path, 'r', encoding='utf-8') as f:
             soup = BeautifulSoup(f, 'html.parser')
             href = parse_soup.get_work_link_html(soup)
             stats = parse_soup.get_stats_html(soup)
-            if update_series: series = parse_soup.get_series_html(soup)
+            series = parse_soup.get_series_html(soup)
 
     elif filetype == 'AZW3':
+        import mobi
         tempdir, filepath = mobi.extract(path)
         try:
             if os.path.splitext(filepath)[1].upper()[1:] != 'EPUB':
@@ -38,7 +83,7 @@ def process_file(path: str, filetype: str, update: bool=True, update_series: boo
             xml = get_epub_preface(filepath)
             href = parse_xml.get_work_link_epub(xml)
             stats = parse_xml.get_stats_epub(xml)
-            if update_series: series = parse_xml.get_series_epub(xml)
+            series = parse_xml.get_series_epub(xml)
         finally:
             # putting this in a finally block *should* ensure that 
             # I never accidentally leave temp files lying around
@@ -46,6 +91,7 @@ def process_file(path: str, filetype: str, update: bool=True, update_series: boo
             shutil.rmtree(tempdir) 
 
     elif filetype == 'MOBI':
+        import mobi
         tempdir, filepath = mobi.extract(path)
         try:
             if os.path.splitext(filepath)[1].upper()[1:] != 'HTML':
@@ -54,50 +100,37 @@ def process_file(path: str, filetype: str, update: bool=True, update_series: boo
                 soup = BeautifulSoup(f, 'html.parser')
                 href = parse_soup.get_work_link_mobi(soup)
                 stats = parse_soup.get_stats_mobi(soup)
-                if update_series: series = parse_soup.get_series_mobi(soup)
+                series = parse_soup.get_series_mobi(soup)
         finally:
             shutil.rmtree(tempdir)
 
     elif filetype == 'PDF':
+        import pdfquery
         pdf = pdfquery.PDFQuery(path, input_text_formatter='utf-8')
         try:
             pdf.load(0, 1, 2) # load the first 3 pages. please god no one has a longer tag wall than that.
         except StopIteration:
-            pdf.load() # handle pdfs with fewer than 3 pages
+            # handle pdfs with fewer than 3 pages. the pages read before running out have already had 
+            # their link annotations rewritten, and reading them again would fail, so start over
+            pdf = pdfquery.PDFQuery(path, input_text_formatter='utf-8')
+            pdf.load()
         href = parse_pdf.get_work_link_pdf(pdf)
         stats = parse_pdf.get_stats_pdf(pdf)
-        if update_series: series = parse_pdf.get_series_pdf(pdf)
+        series = parse_pdf.get_series_pdf(pdf)
 
     else:
         raise ValueError('Invalid filetype argument: {}. Valid filetypes are '.format(filetype) + ','.join(strings.UPDATE_ACCEPTABLE_FILE_TYPES))
 
-    # done with format-specific parsing, now we can proceed in the same way for all
-    if href is None: return None # if this isn't a work from ao3, return
-    
-    # if we don't care whether the fic is incomplete, just return the work link
-    if not update: return {'link': href}
-
-    # if this is a series update, return the series links if any were found
-    if update_series: return {'link': href, 'series': series} if series else None
-
-    # otherwise continue checking for incomplete fics
-    if stats is None: return None # if we can't find the series metadata, return
-
-    # if the metadata does not contain the character "/", return
-    # we assume that the "/" character represents chapter count
-    index = stats.find('/')
-    if index == -1: return None
-
-    # if the chapter counts do not match, we assume the work is incomplete
-    totalchap = parse_text.get_total_chapters(stats, index)
-    currentchap = parse_text.get_current_chapters(stats, index)
-
-    # if the work is incomplete, return the info
-    if currentchap != totalchap:
-        return {'link': href, 'chapters': currentchap}
+    if href is None: return None
+    return {
+        'link': links.canonical_url(href), 
+        'stats': stats, 
+        'series': list(dict.fromkeys(map(links.canonical_url, series)))}
 
 
 def get_epub_preface(path: str) -> ET.Element:
+    import ebooklib
+    from ebooklib import epub
     book = epub.read_epub(path, {'ignore_ncx': True})
     preface = list(book.get_items_of_type(ebooklib.ITEM_DOCUMENT))[0]
     content = preface.get_content().decode('utf-8')
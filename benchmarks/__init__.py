@@ -0,0 +1 @@
+"""Offline benchmarks. Run from the main script folder, e.g. python -m benchmarks.parse_listing"""
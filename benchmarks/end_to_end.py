@@ -0,0 +1,108 @@
+'''
+Measure end-to-end throughput against a local stand-in for ao3 (see standin.py), without touching the network.
+
+Runs, in a temporary folder: collecting links from a listing, downloading it (works and series),
+then updating the downloaded files after the stand-in has "moved on" (new chapters and new series works).
+Reports works per second and requests per work for each stage.
+'''
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from ao3downloader import batch, metrics, strings
+from ao3downloader.actions import shared
+from benchmarks import standin
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+
+def run_stage(name: str, server: standin.StandIn, function) -> dict:
+    metrics.reset()
+    requests = server.total_requests()
+    start = time.perf_counter()
+    works = function()
+    seconds = time.perf_counter() - start
+    requests = server.total_requests() - requests
+    if works is None:
+        works = sum(v for (k, _), v in metrics.counters.items() if k == 'works_downloaded')
+    return {
+        'stage': name, 'works': works, 'requests': requests, 'seconds': round(seconds, 3),
+        'works/sec': round(works / seconds, 2) if seconds else 0,
+        'requests/work': round(requests / works, 2) if works else None,
+        'rate limited': sum(v for (k, labels), v in metrics.counters.items() if k == 'requests' and ('status', '429') in labels)}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=5, help='listing pages')
+    parser.add_argument('--per-page', type=int, default=20, help='works per listing page')
+    parser.add_argument('--series-size', type=int, default=3, help='works in each series (one series per page, 0 for none)')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--throttle-every', type=int, default=0, help='answer every nth request with 429 (0 for never)')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with a 429')
+    parser.add_argument('--payload-size', type=int, default=50000, help='bytes per downloaded file')
+    parser.add_argument('--parse-processes', type=int, default=2, help='processes to parse listing pages in, for the second link collection stage')
+    parser.add_argument('--filetypes', nargs='+', default=['HTML'], choices=strings.AO3_ACCEPTABLE_DOWNLOAD_TYPES)
+    args = parser.parse_args(args)
+
+    server = standin.StandIn(standin.Library(args.pages, args.per_page, args.series_size),
+                             args.latency, args.throttle_every, args.retry_after, args.payload_size).start()
+    link = strings.AO3_BASE_URL + standin.LISTING_PATH
+    cwd = os.getcwd()
+    folder = tempfile.mkdtemp()
+
+    try:
+        os.chdir(folder)
+        shutil.copy(os.path.join(ROOT, strings.INI_FILE_NAME), strings.INI_FILE_NAME)
+
+        from ao3downloader.ao3 import Ao3
+        from ao3downloader.fileio import FileOps
+        from ao3downloader.library import LibraryIndex
+        from ao3downloader.repo import Repository
+
+        log_cache = {}
+        fileops = FileOps(log_cache)
+        repo = Repository(fileops)
+        standin.connect(repo.session, server)
+        resident = shared.Resident(repo, LibraryIndex(), log_cache)
+
+        def job(job: dict):
+            summary = batch.run_job(job, resident)
+            if summary['status'] != 'ok': raise RuntimeError(summary['error'])
+
+        def get_work_links(processes: int):
+            ao3 = Ao3(repo, fileops, None, None, True, False)
+            ao3.processes = processes
+            return sum(1 for _ in ao3.get_work_links(link, True))
+
+        def download():
+            Ao3(repo, fileops, args.filetypes, None, True, False).download(link)
+            fileops.flush()
+
+        update = {'update_folder': strings.DOWNLOAD_FOLDER_NAME, 'update_filetypes': ['HTML'], 'filetypes': args.filetypes}
+
+        results = [
+            run_stage('get_work_links', server, lambda: get_work_links(0)),
+            run_stage('get_work_links_processes', server, lambda: get_work_links(args.parse_processes)),
+            run_stage('download', server, download)]
+
+        server.library.advance()
+
+        if 'HTML' in args.filetypes:
+            results.append(run_stage('update', server, lambda: job({'action': 'update', **update})))
+            results.append(run_stage('update_series', server, lambda: job({'action': 'update_series', **update})))
+
+        for result in results:
+            print(', '.join(f'{k}: {v}' for k, v in result.items()))
+        return results
+    finally:
+        os.chdir(cwd)
+        server.stop()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
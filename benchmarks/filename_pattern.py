@@ -0,0 +1,58 @@
+'''Time making a work's filename from the filename pattern against the multipleSeries fixture.'''
+
+import os
+import re
+import timeit
+
+from bs4 import BeautifulSoup
+
+from ao3downloader import parse_soup, strings
+
+FIXTURE = os.path.join(os.path.dirname(__file__), '..', 'test', 'fixtures', 'multipleSeries.html')
+LINK = 'https://archiveofourown.org/works/12345678'
+PATTERNS = [strings.INI_DEFAULT_NAME_PATTERN, '{series_title} {series_index} {title}', '{' + '} {'.join(parse_soup.WorkMetadata._fields) + '}']
+NUMBER = 200
+
+
+def old_series_from_span(soup: BeautifulSoup) -> tuple[str, str]:
+    '''the old way: decode the span back to html and strip everything but digits once the link is cut out'''
+    series_link = soup.find('a')
+    return series_link.get_text().strip(), re.sub(r'\D', '', soup.decode_contents().replace(str(series_link), '')).strip()
+
+
+def old_get_title(soup: BeautifulSoup, link: str, pattern: str) -> str:
+    '''the old way: read every field, then replace each one in the pattern'''
+    metadata = {field: get(soup, link) for field, get in parse_soup.WORK_METADATA_GETTERS.items() if not field.startswith('series_')}
+    series_list = [old_series_from_span(x) for x in soup.select('dd.series span.series span.position')]
+    metadata['series_title'] = ', '.join(x[0] for x in series_list)
+    metadata['series_index'] = ', '.join(x[1] for x in series_list)
+    for key, value in metadata.items():
+        pattern = pattern.replace(f'{{{key}}}', value)
+    return pattern
+
+
+def main():
+    with open(FIXTURE, encoding='utf-8') as f:
+        soup = BeautifulSoup(f.read(), 'html.parser')
+    old_get_title(soup, LINK, PATTERNS[0]) # warm up
+
+    results = []
+    spans = soup.select('dd.series span.series span.position')
+    assert [old_series_from_span(x) for x in spans] == [parse_soup.get_series_from_span(x) for x in spans]
+    for name, function in [('old', old_series_from_span), ('direct', parse_soup.get_series_from_span)]:
+        seconds = timeit.timeit(lambda: [function(x) for x in spans], number=NUMBER)
+        results.append({'stage': 'series positions', 'way': name, 'ms per work': round(seconds / NUMBER * 1000, 3)})
+
+    for pattern in PATTERNS:
+        assert old_get_title(soup, LINK, pattern) == parse_soup.get_title(soup, LINK, pattern)
+        for name, function in [('old', old_get_title), ('compiled', parse_soup.get_title)]:
+            seconds = timeit.timeit(lambda: function(soup, LINK, pattern), number=NUMBER)
+            results.append({'stage': f'title from {pattern}', 'way': name, 'ms per work': round(seconds / NUMBER * 1000, 3)})
+
+    for result in results:
+        print(', '.join(f'{k}: {v}' for k, v in result.items()))
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+'''Report python -X importtime results for the entry point and each action module.'''
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+HEAVY_MODULES = ['bs4', 'requests', 'ebooklib', 'mobi', 'pdfquery', 'lxml', 'pdfminer', 'pyquery']
+
+TARGETS = {
+    'menu': [os.path.join(ROOT, 'ao3downloader.py'), '--help'],
+    'log visualization': ['-c', 'import ao3downloader.actions.logvisualization'],
+    'links only': ['-c', 'import ao3downloader.actions.getlinks'],
+    'update': ['-c', 'import ao3downloader.actions.updatefics'],
+}
+
+
+def get_import_times(args: list[str]) -> tuple[dict[str, int], int]:
+    '''
+    cumulative import time in microseconds for each module imported by running python with args,
+    and the total for all top level imports (nested imports are indented in the importtime output)
+    '''
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=ROOT, capture_output=True, text=True)
+    times = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line: continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+        if not name.startswith('  '): total += int(cumulative)
+    return times, total
+
+
+def main():
+    for name, args in TARGETS.items():
+        times, total = get_import_times(args)
+        heavy = ', '.join(x for x in HEAVY_MODULES if x in times) or 'none'
+        print(f'{name}: {total / 1000:.1f} ms total imports, heavy modules loaded: {heavy}')
+
+
+if __name__ == '__main__':
+    main()
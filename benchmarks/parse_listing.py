@@ -0,0 +1,38 @@
+'''Time listing page parsing against the bookmarks fixture.'''
+
+import os
+import timeit
+
+from bs4 import BeautifulSoup
+
+from ao3downloader import parse_soup
+
+FIXTURE = os.path.join(os.path.dirname(__file__), '..', 'test', 'fixtures', 'bookmarks.html')
+NUMBER = 20
+
+
+def per_work_lookup(soup: BeautifulSoup) -> dict:
+    '''the old way: scan the page once per work to find its blurb'''
+    urls = parse_soup.get_work_and_series_urls(soup)
+    return {url: parse_soup.get_work_metadata_from_list(soup, url) for url in urls if '/works/' in url}
+
+
+def single_pass(soup: BeautifulSoup) -> dict:
+    return parse_soup.get_listing_info(soup, False, True)['metadata']
+
+
+def main():
+    with open(FIXTURE, encoding='utf-8') as f:
+        soup = BeautifulSoup(f.read(), 'html.parser')
+
+    assert per_work_lookup(soup) == single_pass(soup)
+
+    for name, function in [('urls only', lambda: parse_soup.get_work_and_series_urls(soup)),
+                           ('urls + metadata, per-work lookup', lambda: per_work_lookup(soup)),
+                           ('urls + metadata, single pass', lambda: single_pass(soup))]:
+        seconds = timeit.timeit(function, number=NUMBER)
+        print(f'{name}: {seconds / NUMBER * 1000:.2f} ms per page')
+
+
+if __name__ == '__main__':
+    main()
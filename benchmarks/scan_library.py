@@ -0,0 +1,65 @@
+'''
+Time the update scan per file type and overall: finding files (library.find_files, which shared.get_files_of_type uses)
+and reading the work link, stats and series from each one.
+
+Uses a library made by synthetic_library (generated into a temporary folder unless one is given).
+Each scan is run cold, then again with a warm library index, which is what repeated update runs see.
+'''
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from ao3downloader import strings, update
+from ao3downloader.library import LibraryIndex, find_files
+from benchmarks import synthetic_library
+
+
+def scan(folder: str, filetypes: list[str], library: LibraryIndex=None) -> dict:
+    start = time.perf_counter()
+    files = list(find_files(folder, filetypes, library=library))
+    listed = time.perf_counter()
+    found = 0
+    for file in files:
+        if update.process_file(file['path'], file['filetype'], library=library): found += 1
+    end = time.perf_counter()
+    return {'files': len(files), 'incomplete': found, 'list seconds': round(listed - start, 3),
+            'parse seconds': round(end - listed, 3), 'files/sec': round(len(files) / (end - start), 1) if files else 0}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--folder', help='existing library to scan (generated if not given)')
+    parser.add_argument('--count', type=int, default=100, help='works to generate for each file type')
+    parser.add_argument('--filetypes', nargs='+', default=strings.UPDATE_ACCEPTABLE_FILE_TYPES, choices=strings.UPDATE_ACCEPTABLE_FILE_TYPES)
+    args = parser.parse_args(args)
+
+    folder = args.folder or tempfile.mkdtemp()
+    indexfile = os.path.join(tempfile.mkdtemp(), strings.LIBRARY_INDEX_FILE_NAME)
+    results = []
+
+    try:
+        if not args.folder:
+            start = time.perf_counter()
+            synthetic_library.generate(folder, args.count, args.filetypes)
+            print(f'generated {args.count} works x {len(args.filetypes)} file types in {time.perf_counter() - start:.1f}s')
+
+        for filetypes in [[x] for x in args.filetypes] + [args.filetypes]:
+            name = filetypes[0] if len(filetypes) == 1 else 'all'
+            results.append({'scan': name, 'index': 'none', **scan(folder, filetypes)})
+            library = LibraryIndex(indexfile) # never saved, so each file type starts empty
+            scan(folder, filetypes, library)
+            results.append({'scan': name, 'index': 'warm', **scan(folder, filetypes, library)})
+
+        for result in results:
+            print(', '.join(f'{k}: {v}' for k, v in result.items()))
+        return results
+    finally:
+        if not args.folder: shutil.rmtree(folder, ignore_errors=True)
+        shutil.rmtree(os.path.dirname(indexfile), ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
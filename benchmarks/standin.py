@@ -0,0 +1,252 @@
+'''
+A local stand-in for ao3, so downloads can be benchmarked offline.
+
+Serves generated listing, series and work pages (work pages are built from the test fixtures) and fake download payloads.
+HTML downloads are shaped like real ao3 html downloads, so the update actions can scan them afterwards.
+Optionally adds latency to every response and answers every nth request with 429 and a Retry-After header.
+'''
+
+import collections
+import http.server
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+
+from ao3downloader import strings
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'test', 'fixtures')
+FIXTURE_WORK_ID = '41822007'
+FIXTURE_TITLE = 'so I open the window to hear sounds of people'
+LISTING_PATH = '/users/standin/bookmarks'
+FIRST_WORK_ID = 100000
+FIRST_SERIES_ID = 5000
+
+PAGE = '<!DOCTYPE html><html><head><title>{title}</title></head><body><div id="outer"><div id="inner" class="wrapper"><div id="main" class="{main}" role="article">{body}</div></div></div></body></html>'
+
+WORK_BLURB = '''<li id="work_{id}" class="work blurb group work-{id} user-1" role="article">
+<div class="header module"><h4 class="heading"><a href="/works/{id}">Work {id}</a> by <a rel="author" href="/users/author{author}/pseuds/author{author}">author{author}</a></h4>
+<h5 class="fandoms heading"><span class="landmark">Fandoms:</span> <a class="tag" href="/tags/Fandom%20{fandom}/works">Fandom {fandom}</a></h5>
+<ul class="required-tags">
+<li><span class="rating-general-audience rating" title="General Audiences"><span class="text">General Audiences</span></span></li>
+<li><span class="warning-no warnings" title="No Archive Warnings Apply"><span class="text">No Archive Warnings Apply</span></span></li>
+<li><span class="category-gen category" title="Gen"><span class="text">Gen</span></span></li>
+<li><span class="complete-no iswip" title="Work in Progress"><span class="text">Work in Progress</span></span></li>
+</ul><p class="datetime">01 Jan 2023</p></div>
+<ul class="tags commas">
+<li class="warnings"><strong><a class="tag" href="/tags/No%20Archive%20Warnings%20Apply/works">No Archive Warnings Apply</a></strong></li>
+<li class="characters"><a class="tag" href="/tags/Character%20{author}/works">Character {author}</a></li>
+<li class="freeforms"><a class="tag" href="/tags/Fluff/works">Fluff</a></li>
+</ul>
+<blockquote class="userstuff summary"><p>Summary of work {id}.</p></blockquote>
+<dl class="stats"><dt class="language">Language:</dt><dd class="language">English</dd><dt class="words">Words:</dt><dd class="words">{words}</dd><dt class="chapters">Chapters:</dt><dd class="chapters">{chapters}/?</dd></dl>
+</li>'''
+
+SERIES_BLURB = '''<li id="series_{id}" class="series blurb group series-{id} user-1" role="article">
+<div class="header module"><h4 class="heading"><a href="/series/{id}">Series {id}</a> by <a rel="author" href="/users/author1/pseuds/author1">author1</a></h4></div>
+</li>'''
+
+HTML_DOWNLOAD = '''<!DOCTYPE html><html><head><meta charset="UTF-8"/><title>Work {id}</title></head><body>
+<div id="preface">
+<p class="message"><b>Work {id}</b><br/>Posted originally on the <a href="http://archiveofourown.org/">Archive of Our Own</a> at <a href="http://archiveofourown.org/works/{id}">http://archiveofourown.org/works/{id}</a>.</p>
+<div class="meta"><dl class="tags">
+<dt>Rating:</dt><dd><a href="http://archiveofourown.org/tags/General%20Audiences">General Audiences</a></dd>
+{series}<dt>Stats:</dt><dd>Published: 2023-01-01 Chapters: {chapters}/? Words: {words}</dd>
+</dl></div></div>
+<div id="chapters" class="userstuff">{text}</div>
+</body></html>'''
+
+HTML_DOWNLOAD_SERIES = '<dt>Series:</dt><dd>Part {position} of <a href="http://archiveofourown.org/series/{id}">Series {id}</a></dd>\n'
+
+
+class Library:
+    '''
+    The works and series the stand-in knows about.
+    Listing pages hold per_page works each, followed by one series link per page; each series holds series_size works of its own.
+    '''
+
+    def __init__(self, pages: int, per_page: int, series_size: int) -> None:
+        self.pages = pages
+        self.per_page = per_page
+        self.series_size = series_size
+        self.chapters = {}
+        self.series = {}
+        for page in range(pages):
+            for i in range(per_page):
+                self.chapters[FIRST_WORK_ID + page * per_page + i] = 1
+            if series_size:
+                sid = FIRST_SERIES_ID + page
+                works = [FIRST_WORK_ID + pages * per_page + page * 1000 + i for i in range(series_size)]
+                self.series[sid] = works
+                for work in works:
+                    self.chapters[work] = 1
+        self.lock = threading.Lock()
+
+
+    def listed_works(self, page: int) -> list[int]:
+        start = FIRST_WORK_ID + (page - 1) * self.per_page
+        return list(range(start, start + self.per_page)) if 1 <= page <= self.pages else []
+
+
+    def advance(self) -> None:
+        '''Let time pass: every other work gets a new chapter and every series gets a new work.'''
+
+        with self.lock:
+            for work in list(self.chapters)[::2]:
+                self.chapters[work] += 1
+            for sid, works in self.series.items():
+                work = works[-1] + 1
+                works.append(work)
+                self.chapters[work] = 1
+
+
+    def series_of(self, work: int) -> list[tuple[int, int]]:
+        return [(sid, works.index(work) + 1) for sid, works in self.series.items() if work in works]
+
+
+class StandIn(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, library: Library, latency: float=0, throttle_every: int=0, retry_after: int=1, payload_size: int=50000) -> None:
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.library = library
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.payload_size = payload_size
+        self.requests = collections.Counter()
+        self.counter_lock = threading.Lock()
+        with open(os.path.join(FIXTURES, 'unlockedWork.html'), encoding='utf-8') as f:
+            self.work_template = f.read().replace(FIXTURE_TITLE, 'Work {id}')
+
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+    def start(self) -> 'StandIn':
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+    def total_requests(self) -> int:
+        with self.counter_lock:
+            return sum(self.requests.values())
+
+
+    def count(self, kind: str) -> int:
+        with self.counter_lock:
+            self.requests[kind] += 1
+            return sum(self.requests.values())
+
+
+    def work_page(self, work: int) -> str:
+        chapters = self.library.chapters[work]
+        page = self.work_template.replace(FIXTURE_WORK_ID, str(work)).replace('Work {id}', f'Work {work}')
+        return page.replace('class="chapters">1/1', f'class="chapters">{chapters}/?')
+
+
+    def listing_page(self, page: int) -> str:
+        blurbs = [WORK_BLURB.format(id=work, author=work % 50, fandom=work % 7, words=f'{1000 + work % 9000:,}',
+                                    chapters=self.library.chapters[work]) for work in self.library.listed_works(page)]
+        if blurbs and self.library.series:
+            blurbs.append(SERIES_BLURB.format(id=FIRST_SERIES_ID + page - 1))
+        body = f'<h2 class="heading">Bookmarks</h2><ol class="bookmark index group">{"".join(blurbs)}</ol>'
+        return PAGE.format(title='Bookmarks', main='bookmarks-index dashboard region', body=body)
+
+
+    def series_page(self, sid: int) -> str:
+        blurbs = ''.join(WORK_BLURB.format(id=work, author=1, fandom=1, words='1,000', chapters=self.library.chapters[work])
+                         for work in self.library.series[sid])
+        body = f'<div class="series-show region"><h2 class="heading">Series {sid}</h2><ul class="series work index group">{blurbs}</ul></div>'
+        return PAGE.format(title=f'Series {sid}', main='series-show region', body=body)
+
+
+    def download(self, work: int, extension: str) -> bytes:
+        if extension != 'html':
+            return (f'%fake {extension} for work {work}\n'.encode('utf-8') * (self.payload_size // 32 + 1))[:self.payload_size]
+        series = ''.join(HTML_DOWNLOAD_SERIES.format(id=sid, position=position) for sid, position in self.library.series_of(work))
+        text = '<p>' + 'All work and no play. ' * (self.payload_size // 22) + '</p>'
+        return HTML_DOWNLOAD.format(id=work, series=series, chapters=self.library.chapters[work], words=1000, text=text).encode('utf-8')
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    routes = [
+        ('work', re.compile(r'^/works/(\d+)')),
+        ('series', re.compile(r'^/series/(\d+)')),
+        ('download', re.compile(r'^/downloads/(\d+)/[^/?]*\.(\w+)')),
+        ('listing', re.compile('^' + re.escape(LISTING_PATH) + '$'))]
+
+
+    def do_GET(self) -> None:
+        server: StandIn = self.server
+        url = urlsplit(self.path)
+        kind, match = next(((k, p.match(url.path)) for k, p in self.routes if p.match(url.path)), ('missing', None))
+        number = server.count(kind)
+
+        if server.latency: time.sleep(server.latency)
+
+        if server.throttle_every and number % server.throttle_every == 0:
+            self.reply(429, b'Retry later', {'Retry-After': str(server.retry_after)})
+            return
+
+        try:
+            if kind == 'work':
+                body = server.work_page(int(match.group(1))).encode('utf-8')
+            elif kind == 'series':
+                body = server.series_page(int(match.group(1))).encode('utf-8')
+            elif kind == 'download':
+                body = server.download(int(match.group(1)), match.group(2).lower())
+            elif kind == 'listing':
+                page = re.search(r'page=(\d+)', url.query)
+                body = server.listing_page(int(page.group(1)) if page else 1).encode('utf-8')
+            else:
+                raise KeyError(url.path)
+        except KeyError:
+            self.reply(404, PAGE.format(title='Error 404', main='error-404 region', body='<h2>Error 404</h2>').encode('utf-8'))
+            return
+
+        self.reply(200, body)
+
+
+    def reply(self, status: int, body: bytes, headers: dict={}) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class StandInAdapter(HTTPAdapter):
+    '''Send requests for ao3 to the stand-in instead. Mount it on a session for the ao3 base url.'''
+
+    def __init__(self, base_url: str) -> None:
+        super().__init__()
+        self.base_url = base_url
+
+
+    def send(self, request, **kwargs):
+        request.url = self.base_url + request.url[len(strings.AO3_BASE_URL):]
+        return super().send(request, **kwargs)
+
+
+def connect(session, standin: StandIn) -> None:
+    '''Route a requests session's ao3 traffic to the stand-in.'''
+
+    session.mount(strings.AO3_BASE_URL, StandInAdapter(standin.base_url))
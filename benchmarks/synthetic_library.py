@@ -0,0 +1,245 @@
+'''
+Generate a library of ao3-shaped ebooks (EPUB, HTML, MOBI, AZW3 and PDF) for benchmarking the update scan offline.
+
+Every file has the preface the update actions look for: the work link, the Chapters stats and any series links.
+EPUB files are written with ebooklib, HTML matches ao3's html download, and MOBI (mobipocket 6), AZW3 (kf8) and PDF
+files are written by hand with just enough structure for the mobi and pdfquery readers to unpack them.
+
+    python -m benchmarks.synthetic_library FOLDER --count 1000 --filetypes EPUB MOBI
+'''
+
+import argparse
+import os
+import struct
+
+from ao3downloader import strings
+from benchmarks.standin import HTML_DOWNLOAD, HTML_DOWNLOAD_SERIES
+
+FIRST_WORK_ID = 200000
+FIRST_SERIES_ID = 9000
+RECORD_SIZE = 4096
+EOF_RECORD = b'\xe9\x8e\r\n'
+
+XHTML_PREFACE = '''<html xmlns="http://www.w3.org/1999/xhtml"><head><title>Work {id}</title></head><body{body_attributes}>
+<div class="meta"><h1>Work {id}</h1><p class="message">Posted originally on the <a href="http://archiveofourown.org/">Archive of Our Own</a> at <a href="http://archiveofourown.org/works/{id}">http://archiveofourown.org/works/{id}</a>.</p>
+<dl class="tags"><dt class="calibre3">Rating:</dt><dd class="calibre4"><a href="http://archiveofourown.org/tags/General%20Audiences">General Audiences</a></dd>
+{series}<dt class="calibre3">Stats:</dt><dd class="calibre5">Published: 2023-01-01 Chapters: {chapters}/? Words: {words}</dd></dl></div>
+{text}</body></html>'''
+
+XHTML_SERIES = '<dt class="calibre3">Series:</dt><dd class="calibre4">Part {position} of <a href="http://archiveofourown.org/series/{id}">Series {id}</a></dd>\n'
+
+MOBI_PREFACE = '''<html><head><guide></guide></head><body>
+<h1>Work {id}</h1><p>Posted originally on the Archive of Our Own at <a href="http://archiveofourown.org/works/{id}">http://archiveofourown.org/works/{id}</a>.</p>
+{series}<p>Stats:</p><blockquote>Published: 2023-01-01 Chapters: {chapters}/? Words: {words}</blockquote>
+<mbp:pagebreak/>{text}</body></html>'''
+
+MOBI_SERIES = '<p>Series:</p><blockquote>Part {position} of <a href="http://archiveofourown.org/series/{id}">Series {id}</a></blockquote>\n'
+
+
+def get_work(number: int, series_every: int=3, size: int=20000) -> dict:
+    '''The made-up work behind the number-th file. Every series_every-th work belongs to a series.'''
+
+    work = FIRST_WORK_ID + number
+    series = [(FIRST_SERIES_ID + number // (series_every * 5), number // series_every % 5 + 1)] if series_every and number % series_every == 0 else []
+    # text is kept ascii so mobi text records never split a multibyte character
+    text = '<p>' + 'All work and no play makes Jack a dull boy. ' * (size // 45) + '</p>'
+    return {'id': work, 'chapters': number % 20 + 1, 'words': 1000 + number % 9000, 'series': series, 'text': text}
+
+
+def get_xhtml(work: dict, body_attributes: str='') -> str:
+    series = ''.join(XHTML_SERIES.format(id=sid, position=position) for sid, position in work['series'])
+    return XHTML_PREFACE.format(series=series, body_attributes=body_attributes, **{k: v for k, v in work.items() if k != 'series'})
+
+
+def write_html(path: str, work: dict) -> None:
+    series = ''.join(HTML_DOWNLOAD_SERIES.format(id=sid, position=position) for sid, position in work['series'])
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(HTML_DOWNLOAD.format(series=series, **{k: v for k, v in work.items() if k != 'series'}))
+
+
+def write_epub(path: str, work: dict) -> None:
+    from ebooklib import epub
+    book = epub.EpubBook()
+    book.set_identifier(f'ao3-{work["id"]}')
+    book.set_title(f'Work {work["id"]}')
+    book.set_language('en')
+    preface = epub.EpubHtml(title='Preface', file_name='preface.xhtml', content=get_xhtml(dict(work, text='')))
+    chapter = epub.EpubHtml(title='Chapter 1', file_name='chapter1.xhtml', content=f'<html><body>{work["text"]}</body></html>')
+    book.add_item(preface)
+    book.add_item(chapter)
+    book.toc = [chapter]
+    book.spine = [preface, chapter]
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    epub.write_epub(path, book)
+
+
+def write_mobi(path: str, work: dict) -> None:
+    series = ''.join(MOBI_SERIES.format(id=sid, position=position) for sid, position in work['series'])
+    html = MOBI_PREFACE.format(series=series, **{k: v for k, v in work.items() if k != 'series'})
+    with open(path, 'wb') as f:
+        f.write(get_mobi(f'Work {work["id"]}', html.encode('utf-8'), 6))
+
+
+def write_azw3(path: str, work: dict) -> None:
+    # the whole book is a single kf8 skeleton with no fragments, which unpacks to an epub with one xhtml file
+    html = ('<?xml version="1.0" encoding="utf-8"?>\n' + get_xhtml(work, ' aid="0"')).encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(get_mobi(f'Work {work["id"]}', html, 8))
+
+
+def get_mobi(title: str, text: bytes, version: int) -> bytes:
+    '''A palm database holding an uncompressed mobipocket book. Version 8 (kf8) adds the skeleton index kf8 needs.'''
+
+    records = [text[i:i + RECORD_SIZE] for i in range(0, len(text), RECORD_SIZE)]
+    count = len(records)
+    name = title.encode('utf-8')
+    length = 248 if version == 8 else 232
+
+    header = bytearray(b'\xff' * length)
+    struct.pack_into('>4sLLLLL', header, 0x00, b'MOBI', length, 2, 65001, 1, version) # type book, utf-8
+    struct.pack_into('>LLL', header, 0x40, count + 1, 16 + length, len(name)) # first non-text record, title offset and length
+    struct.pack_into('>LLLL', header, 0x4C, 9, 0, 0, version) # locale, languages, minimum reader version
+    struct.pack_into('>LLLL', header, 0x5C, count + (3 if version == 8 else 1), 0, 0, 0) # first resource record, no huffman
+    struct.pack_into('>L', header, 0x70, 0) # no exth
+    header[0x74:0x94] = bytes(32)
+    struct.pack_into('>LLLL', header, 0x98, 0xFFFFFFFF, 0, 0, 0) # no drm
+    if version == 8:
+        struct.pack_into('>LL', header, 0xB0, 0xFFFFFFFF, 0) # no fdst, so kf8 treats all the text as one flow
+    else:
+        struct.pack_into('>HH', header, 0xB0, 1, count) # first and last content record
+    struct.pack_into('>HH', header, 0xE0, 0, 0) # no trailing entries in the text records
+    if version == 8:
+        struct.pack_into('>LLLLL', header, 0xE4, 0xFFFFFFFF, 0xFFFFFFFF, count + 1, 0xFFFFFFFF, 0xFFFFFFFF) # skeleton index
+
+    # palmdoc header: uncompressed, text length, text record count, record size, not encrypted
+    first = struct.pack('>HHLHHHH', 1, 0, len(text), count, RECORD_SIZE, 0, 0) + bytes(header) + name
+    first += bytes(4 - len(first) % 4)
+
+    records = [first] + records
+    if version == 8: records += get_skeleton_index(len(text))
+    return get_palm_database(title, records + [EOF_RECORD])
+
+
+def get_skeleton_index(length: int) -> list[bytes]:
+    '''kf8 skeleton index with one skeleton covering the whole text: a header record with the tag table and one data record.'''
+
+    # tag 1: fragment count, tag 6: (position, length)
+    tagx = b'TAGX' + struct.pack('>LL', 24, 1) + bytes([1, 1, 1, 0, 6, 2, 2, 0, 0, 0, 0, 1])
+    name = b'SKEL0000000000'
+    entry = bytes([len(name)]) + name + b'\x03' + get_varwidth(0) + get_varwidth(0) + get_varwidth(length)
+    entry += bytes(-(192 + len(entry)) % 4)
+    idxt = b'IDXT' + struct.pack('>H', 192) + bytes(2)
+    return [get_index_header(0, 1, 1) + tagx, get_index_header(192 + len(entry), 1, 0) + entry + idxt]
+
+
+def get_index_header(start: int, count: int, total: int) -> bytes:
+    header = bytearray(192)
+    struct.pack_into('>4s13L', header, 0, b'INDX', 192, 0, 0, 0, start, count, 65001, 0xFFFFFFFF, total, 0, 0, 0, 0)
+    return bytes(header)
+
+
+def get_varwidth(value: int) -> bytes:
+    '''mobi index values are big-endian 7 bit groups, with the high bit set on the last byte'''
+
+    groups = [value & 0x7F]
+    value >>= 7
+    while value:
+        groups.insert(0, value & 0x7F)
+        value >>= 7
+    groups[-1] |= 0x80
+    return bytes(groups)
+
+
+def get_palm_database(name: str, records: list[bytes]) -> bytes:
+    header = name.encode('utf-8')[:31].ljust(32, b'\0')
+    header += struct.pack('>HHLLLLLL4s4sLLH', 0, 0, 0, 0, 0, 0, 0, 0, b'BOOK', b'MOBI', 0, 2 * len(records) - 1, len(records))
+    offset = len(header) + 8 * len(records) + 2
+    table = b''
+    for i, record in enumerate(records):
+        table += struct.pack('>LL', offset, 2 * i)
+        offset += len(record)
+    return header + table + bytes(2) + b''.join(records)
+
+
+def write_pdf(path: str, work: dict) -> None:
+    '''One page of preface (with a link annotation for each series) followed by pages of text.'''
+
+    preface = [f'Work {work["id"]}', f'Posted originally on the Archive of Our Own at http://archiveofourown.org/works/{work["id"]}.', 'Rating: General Audiences']
+    preface += [f'Series: Part {position} of Series {sid}' for sid, position in work['series']]
+    preface += [f'Stats: Published: 2023-01-01 Chapters: {work["chapters"]}/? Words: {work["words"]}']
+    words = work['text'][3:-4].split()
+    lines = [' '.join(words[i:i + 14]) for i in range(0, len(words), 14)]
+    pages = [preface] + [lines[i:i + 50] for i in range(0, len(lines), 50)]
+
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for number, page in enumerate(pages):
+        content = 'BT /F1 10 Tf 14 TL 72 740 Td ' + ' '.join(f'({escape_pdf(x)}) \'' for x in page) + ' ET'
+        objects.append(f'<< /Length {len(content)} >>\nstream\n{content}\nendstream')
+        annots = []
+        if number == 0:
+            for i, (sid, _) in enumerate(work['series']):
+                top = 740 - 14 * (4 + i)
+                objects.append(f'<< /Type /Annot /Subtype /Link /Rect [72 {top - 4} 300 {top + 10}] /Border [0 0 0] '
+                               f'/A << /S /URI /URI (http://archiveofourown.org/series/{sid}) >> >>')
+                annots.append(f'{len(objects)} 0 R')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects) - len(annots)} 0 R '
+                       f'/Resources << /Font << /F1 3 0 R >> >> /Annots [{" ".join(annots)}] >>')
+        kids.append(f'{len(objects)} 0 R')
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'
+
+    output = b'%PDF-1.4\n'
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f'{number} 0 obj\n{obj}\nendobj\n'.encode('latin-1')
+    xref = len(output)
+    output += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1')
+    output += ''.join(f'{x:010d} 00000 n \n' for x in offsets).encode('latin-1')
+    output += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1')
+    with open(path, 'wb') as f:
+        f.write(output)
+
+
+def escape_pdf(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+WRITERS = {
+    'EPUB': write_epub,
+    'HTML': write_html,
+    'MOBI': write_mobi,
+    'AZW3': write_azw3,
+    'PDF': write_pdf
+}
+
+
+def generate(folder: str, count: int, filetypes: list[str], per_folder: int=100, size: int=20000) -> dict[str, int]:
+    '''Write count works in each of the filetypes, per_folder works to a subfolder. Returns the number of files written per type.'''
+
+    written = dict.fromkeys(filetypes, 0)
+    for number in range(count):
+        work = get_work(number, size=size)
+        subfolder = os.path.join(folder, f'fandom {number // per_folder:04d}')
+        os.makedirs(subfolder, exist_ok=True)
+        for filetype in filetypes:
+            WRITERS[filetype](os.path.join(subfolder, f'{work["id"]} Work {work["id"]} - author.{filetype.lower()}'), work)
+            written[filetype] += 1
+    return written
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('folder')
+    parser.add_argument('--count', type=int, default=1000, help='works to generate (each is written once per file type)')
+    parser.add_argument('--filetypes', nargs='+', default=strings.UPDATE_ACCEPTABLE_FILE_TYPES, choices=strings.UPDATE_ACCEPTABLE_FILE_TYPES)
+    parser.add_argument('--per-folder', type=int, default=100, help='works per subfolder')
+    parser.add_argument('--size', type=int, default=20000, help='approximate bytes of text per work')
+    args = parser.parse_args(args)
+    written = generate(args.folder, args.count, args.filetypes, args.per_folder, args.size)
+    print(', '.join(f'{k}: {v}' for k, v in written.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import os
+import warnings
+import zipfile
+
+import pytest
+
+from ao3downloader.archive import Archive
+from ao3downloader.fileio import FileOps
+
+
+@pytest.fixture
+def fileops(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'settings.ini').write_text('[settings]\nArchiveShardSize=2\n')
+    return FileOps()
+
+
+def test_add_and_read(tmp_path):
+    archive = Archive(str(tmp_path), 2)
+    archive.add('1', {'one.epub': b'one', 'one.pdf': b'one pdf'}, '1/2')
+    archive.add('2', {'two.epub': b'two'}, '3/3')
+    archive.add('3', {'three.epub': b'three'}, '1/?')
+    archive.add('1', {'one.epub': b'one again'}, '2/2')
+
+    assert sorted(x.name for x in tmp_path.glob('*.zip')) == ['archive_00000.zip', 'archive_00001.zip']
+
+    # the index is read back when the archive is opened again
+    archive = Archive(str(tmp_path), 2)
+    assert archive.read('1', 'one.epub') == b'one again'
+    assert archive.read('1', 'one.pdf') == b'one pdf'
+    assert archive.read('3', 'three.epub') == b'three'
+    assert sorted(archive.get_files('1')) == ['one.epub', 'one.pdf']
+    assert list(archive.get_incomplete()) == [{'link': 'https://archiveofourown.org/works/3', 'chapters': '1'}]
+    with pytest.raises(KeyError):
+        archive.read('4', 'four.epub')
+
+
+def test_saving_again_uses_new_names_and_compacts(tmp_path):
+    archive = Archive(str(tmp_path), 10)
+    archive.add('1', {'one.epub': os.urandom(1000), 'one.pdf': b'one pdf'}, '1/3')
+    archive.add('2', {'two.epub': os.urandom(1000)})
+    with warnings.catch_warnings():
+        warnings.simplefilter('error') # no duplicate names in the zip
+        archive.add('1', {'one.epub': os.urandom(1000)}, '2/3')
+    assert archive.shards[0]['dead'] >= 1000
+    assert Archive(str(tmp_path), 10).shards[0]['dead'] == archive.shards[0]['dead']
+
+    # once more than half the shard is old files, it is rewritten without them
+    archive.add('1', {'one.epub': b'one again'}, '3/3')
+    assert archive.shards[0]['dead'] == 0
+    with zipfile.ZipFile(tmp_path / 'archive_00000.zip') as f:
+        assert sorted(f.namelist()) == ['1/2/one.epub', '1/one.pdf', '2/two.epub']
+
+    archive = Archive(str(tmp_path), 10)
+    assert archive.shards[0]['dead'] == 0
+    assert archive.read('1', 'one.epub') == b'one again'
+    assert archive.read('1', 'one.pdf') == b'one pdf'
+    assert len(archive.read('2', 'two.epub')) == 1000
+    assert list(archive.get_incomplete()) == []
+    archive.add('3', {'three.epub': b'three'}, '1/2')
+    assert Archive(str(tmp_path), 10).read('3', 'three.epub') == b'three'
+
+
+def test_interrupted_write(tmp_path):
+    archive = Archive(str(tmp_path), 10)
+    archive.add('1', {'one.epub': b'one'})
+    # a write that was cut off before its central directory (and index entry) were written
+    with open(tmp_path / 'archive_00000.zip', 'ab') as f:
+        f.write(b'PK\x03\x04 half a file')
+
+    archive = Archive(str(tmp_path), 10)
+    archive.add('2', {'two.epub': b'two'})
+    assert archive.read('1', 'one.epub') == b'one'
+    assert archive.read('2', 'two.epub') == b'two'
+    with zipfile.ZipFile(tmp_path / 'archive_00000.zip') as f:
+        assert f.testzip() is None
+
+
+def test_save_work(fileops, tmp_path):
+    link = 'https://archiveofourown.org/works/1'
+    fileops.save_work('1', {'one.epub': b'one', 'images/one img000.png': b'img'}, '1/1')
+
+    assert not (tmp_path / 'downloads' / 'one.epub').exists()
+    assert fileops.get_archive().read('1', 'images/one img000.png') == b'img'
+    assert fileops.file_exists(link, {}, ['EPUB'], 0)
+    assert FileOps().file_exists(link, {}, ['EPUB'], 0)
+    assert not FileOps().file_exists(link, {}, ['EPUB', 'PDF'], 0)
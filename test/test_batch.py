@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from ao3downloader import batch
+from ao3downloader.actions import shared
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_run_reports_unknown_action(workdir):
+    (workdir / 'job.json').write_text(json.dumps({'action': 'nope'}))
+    assert batch.run(['job.json']) == batch.EXIT_FAILED_JOB
+
+
+def test_run_reports_missing_value(workdir):
+    summary = batch.run_job({'action': 'download', 'link': 'https://archiveofourown.org/works/1'})
+    assert summary['status'] == 'error'
+    assert 'filetypes' in summary['error']
+    assert shared.job is None
+
+
+def test_run_writes_summary(workdir):
+    (workdir / 'job.json').write_text(json.dumps([{'action': 'ignorelist', 'name': 'first'}, {'action': 'ignorelist'}]))
+    assert batch.run(['job.json'], 'summary.json') == batch.EXIT_OK
+    summary = json.loads((workdir / 'summary.json').read_text())
+    assert [x['name'] for x in summary['jobs']] == ['first', 'ignorelist']
+
+
+def test_ask_uses_job_values(monkeypatch):
+    monkeypatch.setattr(shared, 'job', {'images': True, 'pages': '3'})
+    assert shared.images() == True
+    assert shared.series() == False
+    assert shared.pages() == 3
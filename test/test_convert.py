@@ -0,0 +1,60 @@
+import json
+import shlex
+import sys
+
+import pytest
+
+from ao3downloader import convert, strings
+from ao3downloader.fileio import FileOps
+
+COPY = shlex.quote(sys.executable) + ' -c "import shutil, sys; shutil.copy(sys.argv[1], sys.argv[2])" {input} {output}'
+FAIL = shlex.quote(sys.executable) + ' -c "import sys; sys.exit(\'cannot convert\')" {input} {output}'
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def get_fileops(workdir, command: str) -> FileOps:
+    (workdir / 'settings.ini').write_text(f'[settings]\nConvertFrom=epub\nConvertCommand={command}\n')
+    return FileOps()
+
+
+def test_convert(workdir):
+    fileops = get_fileops(workdir, COPY)
+    assert convert.get_source(fileops) == 'EPUB'
+
+    convert.submit(fileops, '1', 'https://archiveofourown.org/works/1', b'a book', 'EPUB', {'PDF': 'work.pdf', 'MOBI': 'work.mobi'})
+    convert.finish()
+    fileops.flush()
+    assert convert.pending == []
+    assert (workdir / 'downloads' / 'work.pdf').read_bytes() == b'a book'
+    assert (workdir / 'downloads' / 'work.mobi').read_bytes() == b'a book'
+    assert fileops.get_saved_files()['1'] == {'work.pdf', 'work.mobi'}
+
+
+def test_convert_command_with_braces(workdir):
+    # only {input} and {output} are filled in, so converter options can contain braces (e.g. calibre's --extra-css)
+    fileops = get_fileops(workdir, COPY + ' --extra-css "p{margin:0}" {}')
+    convert.submit(fileops, '1', 'https://archiveofourown.org/works/1', b'a book', 'EPUB', {'PDF': 'work.pdf'})
+    convert.finish()
+    fileops.flush()
+    assert (workdir / 'downloads' / 'work.pdf').read_bytes() == b'a book'
+
+
+def test_convert_failure(workdir):
+    fileops = get_fileops(workdir, FAIL)
+    convert.submit(fileops, '1', 'https://archiveofourown.org/works/1', b'a book', 'EPUB', {'PDF': 'work.pdf'})
+    convert.finish()
+    fileops.flush()
+    assert not (workdir / 'downloads' / 'work.pdf').exists()
+    log = [json.loads(x) for x in (workdir / 'logs' / 'log.jsonl').read_text().splitlines()]
+    assert log[-1]['message'] == strings.ERROR_CONVERT
+    assert log[-1]['error'] == 'cannot convert'
+
+
+def test_missing_converter(workdir):
+    fileops = get_fileops(workdir, 'no-such-converter {input} {output}')
+    assert convert.get_source(fileops) == ''
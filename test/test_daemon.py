@@ -0,0 +1,61 @@
+import json
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+from ao3downloader import daemon, exceptions, strings
+
+
+def test_handle_queues_jobs_and_reports_status():
+    d = daemon.Daemon([], 0)
+    assert d.handle({'action': 'visualization'}) == {'queued': 1}
+    assert d.handle({'command': 'status'}) == {'queued': 1, 'running': None, 'results': []}
+    with pytest.raises(exceptions.JobException):
+        d.handle({'action': 'nope'})
+
+
+def test_scheduled_jobs_wait_for_previous_run():
+    d = daemon.Daemon([{'action': 'visualization', 'every': 60}], 0)
+    d.queue_due_jobs()
+    d.queue_due_jobs()
+    assert d.queue.qsize() == 1
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir(strings.LOG_FOLDER_NAME)
+    server = daemon.ControlServer(('127.0.0.1', 0), daemon.ControlHandler)
+    server.owner = daemon.Daemon([], 0)
+    server.token = daemon.write_token()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_control_socket_round_trip(server):
+    responses = daemon.send([{'action': 'ignorelist'}, {'action': 'nope'}, {'command': 'stop'}], server.server_address[1])
+    assert responses[0] == {'queued': 1}
+    assert 'error' in responses[1]
+    assert responses[2] == {'stopping': True}
+    assert server.owner.stopping.is_set()
+
+
+def test_control_socket_needs_token(server):
+    if os.name == 'posix':
+        assert stat.S_IMODE(os.stat(daemon.get_token_path()).st_mode) == 0o600
+
+    with socket.create_connection(server.server_address) as sock, sock.makefile('rwb') as f:
+        for request in [{'command': 'stop'}, {'command': 'stop', 'token': 'wrong'}, ['stop']]:
+            f.write(json.dumps(request).encode('utf-8') + b'\n')
+            f.flush()
+            assert json.loads(f.readline()) == {'error': strings.ERROR_DAEMON_TOKEN}
+    assert not server.owner.stopping.is_set()
+
+    os.remove(daemon.get_token_path())
+    with pytest.raises(exceptions.JobException):
+        daemon.send([{'command': 'status'}], server.server_address[1])
@@ -0,0 +1,16 @@
+from benchmarks import end_to_end
+
+
+def test_end_to_end_against_standin():
+    results = {x['stage']: x for x in end_to_end.main(['--pages', '2', '--per-page', '3', '--series-size', '2', '--payload-size', '1000'])}
+
+    # 2 pages of 3 works plus one series of 2 works per page
+    assert results['get_work_links']['works'] == 10
+    assert results['get_work_links_processes']['works'] == 10
+    # the page after the empty one that ends the listing is requested too
+    assert results['get_work_links_processes']['requests'] == results['get_work_links']['requests'] + 1
+    assert results['download']['works'] == 10
+    # after the stand-in moves on, every other work has a new chapter and each series has a new work
+    assert results['update']['works'] == 5
+    assert results['update_series']['works'] == 2
+    assert results['download']['requests/work'] > 1
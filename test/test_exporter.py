@@ -0,0 +1,38 @@
+import urllib.request
+
+from ao3downloader import exporter, metrics
+
+
+def test_scrape():
+    metrics.reset()
+    metrics.count('works_downloaded', 3)
+    metrics.count('requests', 4, status=200)
+    metrics.count('requests', status=429)
+    metrics.count('retry_after_seconds', 120)
+    metrics.count('errors', exception='LockedException')
+    metrics.gauge('queue_depth', 5, queue='listing')
+    with metrics.timer(metrics.PARSE_HTML):
+        pass
+
+    server = exporter.start(0)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics') as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            body = response.read().decode('utf-8')
+    finally:
+        server.shutdown()
+        server.server_close()
+        metrics.reset()
+
+    lines = body.splitlines()
+    assert '# TYPE ao3downloader_works_downloaded_total counter' in lines
+    assert 'ao3downloader_works_downloaded_total 3' in lines
+    assert 'ao3downloader_requests_total{status="200"} 4' in lines
+    assert 'ao3downloader_requests_total{status="429"} 1' in lines
+    assert 'ao3downloader_retry_after_seconds_total 120' in lines
+    assert 'ao3downloader_errors_total{exception="LockedException"} 1' in lines
+    assert 'ao3downloader_queue_depth{queue="listing"} 5' in lines
+    assert 'ao3downloader_stage_seconds_bucket{stage="parse_html",le="+Inf"} 1' in lines
+    assert 'ao3downloader_stage_seconds_count{stage="parse_html"} 1' in lines
+    assert any(x.startswith('ao3downloader_works_per_second ') for x in lines)
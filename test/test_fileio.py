@@ -0,0 +1,167 @@
+import ast
+import json
+import os
+
+import pytest
+
+from ao3downloader import strings
+
+from ao3downloader.fileio import FileOps
+
+
+@pytest.fixture
+def fileops(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return FileOps()
+
+
+def test_file_exists(fileops, tmp_path):
+    titles = {'https://archiveofourown.org/works/1': 'one: a title', 'https://archiveofourown.org/works/2': 'two'}
+    (tmp_path / 'downloads' / 'one a title.epub').write_bytes(b'x')
+
+    assert fileops.file_exists('https://archiveofourown.org/works/1', titles, ['EPUB'], 0)
+    assert not fileops.file_exists('https://archiveofourown.org/works/1', titles, ['EPUB', 'PDF'], 0)
+    assert not fileops.file_exists('https://archiveofourown.org/works/2', titles, ['EPUB'], 0)
+    assert not fileops.file_exists('https://archiveofourown.org/works/3', titles, ['EPUB'], 0)
+
+    # files saved after the folder was listed are picked up without listing it again, once they have been written
+    fileops.save_bytes('one a title.pdf', b'x')
+    fileops.save_bytes('two.epub', b'x')
+    fileops.flush()
+    assert fileops.file_exists('https://archiveofourown.org/works/1', titles, ['EPUB', 'PDF'], 0)
+    assert fileops.file_exists('https://archiveofourown.org/works/2', titles, ['EPUB'], 0)
+
+
+def test_file_exists_by_work_id(fileops, tmp_path):
+    link = 'https://archiveofourown.org/works/1'
+    fileops.save_bytes('1 old name.epub', b'x')
+    fileops.flush()
+    fileops.add_to_downloads_index('1', ['1 old name.epub'])
+
+    # the title in the log no longer gives the file's name (e.g. the filename pattern was changed)
+    titles = {link: 'new name'}
+    assert FileOps().file_exists(link, titles, ['EPUB'], 0)
+    assert not FileOps().file_exists(link, titles, ['EPUB', 'PDF'], 0)
+    assert FileOps().file_exists(link, {}, ['EPUB'], 0)
+
+    # a file saved under the new name counts too
+    fileops.save_bytes('new name.pdf', b'x')
+    fileops.flush()
+    assert FileOps().file_exists(link, titles, ['EPUB', 'PDF'], 0)
+
+    # indexed files that were deleted since don't
+    (tmp_path / 'downloads' / '1 old name.epub').unlink()
+    assert not FileOps().file_exists(link, titles, ['EPUB'], 0)
+
+
+def test_save_bytes(fileops, tmp_path):
+    fileops.save_bytes('work.epub', b'first')
+    fileops.save_bytes('work.epub', b'second')
+    (tmp_path / 'downloads' / 'folder.epub').mkdir()
+    fileops.save_bytes('folder.epub', b'x')
+    fileops.flush()
+
+    assert (tmp_path / 'downloads' / 'work.epub').read_bytes() == b'second'
+    assert sorted(os.listdir(tmp_path / 'downloads')) == ['folder.epub', 'work.epub'] # no temporary files left over
+    log = [json.loads(x) for x in (tmp_path / 'logs' / 'log.jsonl').read_text().splitlines()]
+    assert [(x['message'], os.path.basename(x['path'])) for x in log] == [(strings.ERROR_SAVE_FILE, 'folder.epub')]
+
+
+def test_failed_write_is_not_recorded(fileops, tmp_path):
+    link = 'https://archiveofourown.org/works/1'
+    (tmp_path / 'downloads' / '1 title.pdf').mkdir() # can't be replaced by a file
+    fileops.get_downloads()
+    fileops.save_work('1', {'1 title.epub': b'x', '1 title.pdf': b'x'})
+    fileops.flush()
+
+    assert fileops.file_exists(link, {}, ['EPUB'], 0)
+    assert not fileops.file_exists(link, {}, ['PDF'], 0)
+    assert FileOps().get_saved_files() == {'1': {'1 title.epub'}}
+    assert [x['message'] for x in fileops.load_logfile()] == [strings.ERROR_SAVE_FILE]
+
+
+def test_rotate_log_if_needed(fileops, tmp_path):
+    (tmp_path / 'settings.ini').write_text('[settings]\nLogRotateSize=0\nLogRotateDays=1\n')
+    with open(fileops.logfile, 'w', encoding='utf-8') as f:
+        json.dump({'link': 'https://archiveofourown.org/works/1', 'title': 'one', 'timestamp': '01/01/2000, 00:00:00'}, f)
+        f.write('\n')
+
+    # making a FileOps (as the menu, profiler and metrics do) leaves the log alone
+    FileOps()
+    assert os.path.exists(fileops.logfile)
+
+    fileops.rotate_log_if_needed()
+    assert not os.path.exists(fileops.logfile)
+    assert [x['title'] for x in fileops.load_logfile()] == ['one']
+
+
+def test_ignorelist_index(fileops, tmp_path):
+    ignorelist = tmp_path / 'ignorelist.txt'
+    ignorelist.write_text('https://archiveofourown.org/works/1; a comment\nhttp://archiveofourown.org/works/2/chapters/3\n\n')
+
+    assert fileops.load_ignorelist() == {'https://archiveofourown.org/works/1', 'https://archiveofourown.org/works/2'}
+    index = tmp_path / 'logs' / 'ignorelist_index.json'
+    assert json.loads(index.read_text())['links'] == ['https://archiveofourown.org/works/1', 'https://archiveofourown.org/works/2']
+
+    # an up to date index is used as is
+    stale = json.loads(index.read_text())
+    index.write_text(json.dumps({**stale, 'links': ['https://archiveofourown.org/works/9']}))
+    assert fileops.load_ignorelist() == {'https://archiveofourown.org/works/9'}
+
+    # once the ignore list is edited by hand the index is stale and is rebuilt
+    ignorelist.write_text('https://archiveofourown.org/works/4\n')
+    assert fileops.load_ignorelist() == {'https://archiveofourown.org/works/4'}
+    assert json.loads(index.read_text())['links'] == ['https://archiveofourown.org/works/4']
+
+
+def test_add_to_ignorelist(fileops, tmp_path):
+    (tmp_path / 'ignorelist.txt').write_text('https://archiveofourown.org/works/1') # no newline at the end
+    ignorelist = fileops.load_ignorelist()
+    fileops.add_to_ignorelist(ignorelist, {'https://archiveofourown.org/works/2': 'Deleted', 'https://archiveofourown.org/works/3': None})
+
+    assert (tmp_path / 'ignorelist.txt').read_text() == (
+        'https://archiveofourown.org/works/1\nhttps://archiveofourown.org/works/2; Deleted\nhttps://archiveofourown.org/works/3\n')
+    expected = {'https://archiveofourown.org/works/1', 'https://archiveofourown.org/works/2', 'https://archiveofourown.org/works/3'}
+    assert ignorelist == expected
+    # the index was saved along with the file, so it is read back without parsing the file again
+    assert FileOps().load_ignorelist() == expected
+    os.remove(tmp_path / 'ignorelist.txt')
+    assert FileOps().load_ignorelist() == set()
+
+
+def test_ignorelist_action(fileops, tmp_path, monkeypatch):
+    from ao3downloader.actions import ignorelist, shared
+    monkeypatch.setattr(shared, 'job', {'check_deleted': True})
+    (tmp_path / 'ignorelist.txt').write_text('https://archiveofourown.org/works/1\n')
+    for log in [
+        {'link': 'https://archiveofourown.org/works/1', 'error': strings.ERROR_DELETED},
+        {'link': 'https://archiveofourown.org/works/2', 'path': 'two.epub'},
+        {'link': 'https://archiveofourown.org/works/3', 'path': 'three.epub', 'series': ['https://archiveofourown.org/works/2/']},
+        {'link': 'http://archiveofourown.org/works/2', 'error': strings.ERROR_DELETED},
+        {'link': 'https://archiveofourown.org/works/4', 'error': strings.ERROR_DELETED}]:
+        fileops.write_log(log)
+
+    ignorelist.action()
+
+    lines = (tmp_path / 'ignorelist.txt').read_text().splitlines()
+    assert lines[0] == 'https://archiveofourown.org/works/1'
+    link, comment = lines[1].split('; ')
+    assert link == 'https://archiveofourown.org/works/2'
+    assert comment.startswith('Deleted: associated filepaths - ')
+    assert sorted(ast.literal_eval(comment.split(' - ')[1])) == ['three.epub', 'two.epub']
+    assert lines[2:] == ['https://archiveofourown.org/works/4; Deleted']
+
+
+def test_rotate_log_clears_shared_cache(fileops, tmp_path):
+    cache = {}
+    first = FileOps(cache)
+    for i in range(3):
+        first.write_log({'link': f'https://archiveofourown.org/works/{i}', 'title': f'old {i}'})
+    assert len(first.load_logfile()) == 3
+    first.rotate_log()
+
+    # a new log that grows past the old one's size before it is read again (as the daemon's next job would)
+    second = FileOps(cache)
+    for i in range(5):
+        second.write_log({'link': f'https://archiveofourown.org/works/{i + 10}', 'title': f'new title {i}'})
+    assert [x['title'] for x in second.load_logfile()] == [f'old {i}' for i in range(3)] + [f'new title {i}' for i in range(5)]
@@ -0,0 +1,19 @@
+import os
+
+from benchmarks.import_time import HEAVY_MODULES, ROOT, get_import_times
+
+
+def test_menu_does_not_import_heavy_modules():
+    times, _ = get_import_times([os.path.join(ROOT, 'ao3downloader.py'), '--help'])
+    assert 'ao3downloader.strings' in times
+    assert [x for x in HEAVY_MODULES if x in times] == []
+
+
+def test_log_visualization_does_not_import_heavy_modules():
+    times, _ = get_import_times(['-c', 'import ao3downloader.actions.logvisualization'])
+    assert [x for x in HEAVY_MODULES if x in times] == []
+
+
+def test_update_imports_ebook_libraries_only_when_used():
+    times, _ = get_import_times(['-c', 'import ao3downloader.actions.updatefics'])
+    assert [x for x in ['ebooklib', 'mobi', 'pdfquery'] if x in times] == []
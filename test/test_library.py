@@ -0,0 +1,49 @@
+import os
+
+from ao3downloader.library import LibraryIndex, find_files
+
+
+def test_library_index_skips_unchanged_files(tmp_path):
+    fic = tmp_path / 'fic.html'
+    fic.write_text('hello')
+    indexfile = str(tmp_path / 'index.json')
+
+    library = LibraryIndex(indexfile)
+    assert library.get(str(fic)) is None
+    library.put(str(fic), {'link': 'https://archiveofourown.org/works/1', 'stats': None, 'series': []})
+    library.save()
+
+    library = LibraryIndex(indexfile)
+    assert library.get(str(fic))['info']['link'] == 'https://archiveofourown.org/works/1'
+
+    fic.write_text('hello again')
+    os.utime(fic, ns=(1, 1))
+    assert library.get(str(fic)) is None
+
+
+def test_find_files(tmp_path):
+    for path in ['a/one.epub', 'a/two.EPUB', 'a/skip.txt', 'b/c/three.html', '.hidden/four.epub', 'old/five.epub']:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text('x')
+    for folder in [tmp_path, *tmp_path.rglob('*')]:
+        if folder.is_dir(): os.utime(folder, ns=(1, 1)) # old enough for the listing to be kept
+
+    def find(library=None):
+        files = find_files(str(tmp_path), ['EPUB', 'HTML'], ['.*', 'old/*'], library)
+        return sorted((os.path.relpath(x['path'], tmp_path), x['filetype']) for x in files)
+
+    expected = [(os.path.join('a', 'one.epub'), 'EPUB'), (os.path.join('a', 'two.EPUB'), 'EPUB'), (os.path.join('b', 'c', 'three.html'), 'HTML')]
+    assert find() == expected
+
+    library = LibraryIndex(str(tmp_path / 'index.json'))
+    assert find(library) == expected
+    assert str(tmp_path / 'a') in library.dirs
+
+    # an unchanged directory is not listed again, so a file added without changing its mtime is not seen
+    (tmp_path / 'a' / 'new.epub').write_text('x')
+    os.utime(tmp_path / 'a', ns=(1, 1))
+    assert find(library) == expected
+
+    # once the directory's mtime changes it is listed again
+    os.utime(tmp_path / 'a', ns=(2, 2))
+    assert (os.path.join('a', 'new.epub'), 'EPUB') in find(library)
@@ -0,0 +1,140 @@
+import csv
+import datetime
+import itertools
+import json
+import os
+import types
+
+import pytest
+from bs4 import BeautifulSoup
+
+from ao3downloader import linkfile, parse_soup
+
+
+@pytest.fixture
+def listing():
+    with open(os.path.join(os.path.dirname(__file__), 'fixtures', 'bookmarks.html'), encoding='utf-8') as f:
+        soup = BeautifulSoup(f.read(), 'html.parser')
+    metadata = parse_soup.get_listing_info(soup, False, True)['metadata']
+    # a work link entered directly, which has none of the fields
+    metadata['https://archiveofourown.org/works/1'] = parse_soup.get_work_metadata_from_blurb(None)
+    return metadata
+
+
+def write(path, format, listing):
+    with linkfile.open_writer(str(path), format) as writer:
+        for link, metadata in listing.items():
+            writer.write(link, metadata)
+
+
+def test_csv(tmp_path, listing):
+    write(tmp_path / 'links.csv', linkfile.CSV, listing)
+    with open(tmp_path / 'links.csv', newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+
+    assert [x['link'] for x in rows] == list(listing)
+    assert all(list(x) == list(linkfile.FIELDS) for x in rows)
+    first = next(iter(listing.values()))
+    assert rows[0]['tags'] == ', '.join(first.tags)
+    assert rows[-1]['title'] == '' and rows[-1]['error']
+
+
+def test_jsonl(tmp_path, listing):
+    write(tmp_path / 'links.jsonl', linkfile.JSONL, listing)
+    with open(tmp_path / 'links.jsonl', encoding='utf-8') as f:
+        rows = [json.loads(x) for x in f]
+
+    assert [x['link'] for x in rows] == list(listing)
+    assert all(list(x) == list(linkfile.FIELDS) for x in rows)
+    first = next(iter(listing.values()))
+    assert rows[0]['fandoms'] == list(first.fandoms)
+    assert rows[-1]['tags'] == []
+
+
+def test_parquet(tmp_path, listing, monkeypatch):
+    parquet = pytest.importorskip('pyarrow.parquet')
+    monkeypatch.setattr(linkfile, 'PARQUET_ROWS', 3)
+    write(tmp_path / 'links.parquet', linkfile.PARQUET, listing)
+    table = parquet.read_table(tmp_path / 'links.parquet')
+
+    assert table.column_names == list(linkfile.FIELDS)
+    rows = [linkfile.get_row(k, v) for k, v in listing.items()]
+    assert table.to_pylist() == [{k: list(v) if isinstance(v, tuple) else v for k, v in x.items()} for x in rows]
+
+
+@pytest.mark.parametrize('format', [linkfile.TEXT, linkfile.CSV, linkfile.JSONL])
+def test_resume(tmp_path, listing, format):
+    path = tmp_path / f'links_1.{format}'
+    links = list(listing)
+    write(path, format, {x: listing[x] for x in links[:3]})
+    # the script was stopped partway through writing a row
+    with open(path, 'ab') as f:
+        f.write(b'https://archiveofourown.org/works/9')
+
+    assert linkfile.get_resumable(str(path), format) == str(path)
+    seen = linkfile.resume(str(path), format)
+    assert seen == set(links[:3])
+    with linkfile.open_writer(str(path), format, True) as writer:
+        for link in links[3:]:
+            writer.write(link, listing[link])
+
+    assert linkfile.resume(str(path), format) == set(links)
+    if format == linkfile.CSV:
+        with open(path, newline='', encoding='utf-8') as f:
+            assert [x['link'] for x in csv.DictReader(f)] == links
+
+
+def test_get_resumable(tmp_path):
+    path = tmp_path / 'links_1.csv'
+    path.write_text('link\r\n')
+    assert linkfile.get_resumable(str(path), linkfile.CSV) == str(path)
+    assert linkfile.get_resumable(str(path), linkfile.JSONL) is None # the format was changed since
+    assert linkfile.get_resumable(str(tmp_path / 'links_2.csv'), linkfile.CSV) is None
+    assert linkfile.get_resumable(None, linkfile.CSV) is None
+
+
+def test_getlinks_resumes_its_own_file(tmp_path, monkeypatch):
+    from ao3downloader.actions import getlinks, shared
+    from ao3downloader.fileio import FileOps
+
+    listing = 'https://archiveofourown.org/users/me/bookmarks'
+    with open(os.path.join(os.path.dirname(__file__), 'fixtures', 'bookmarks.html'), encoding='utf-8') as f:
+        first_page = f.read()
+
+    class Repo:
+        fail = True
+        def get_html(self, url):
+            if url == listing: return first_page
+            if self.fail and 'page=2' in url: raise ConnectionError('cut off')
+            return '<html></html>'
+
+    monkeypatch.chdir(tmp_path)
+    # each new links file is named after the time, so give every run its own second
+    times = (datetime.datetime(2024, 1, 1, 0, 0, x) for x in itertools.count())
+    monkeypatch.setattr(getlinks, 'datetime', types.SimpleNamespace(datetime=types.SimpleNamespace(now=lambda: next(times))))
+    repo = Repo()
+    fileops = FileOps()
+    resident = shared.Resident(repo, None, {})
+    def run(**job):
+        monkeypatch.setattr(shared, 'job', {'link': listing, 'metadata': True, 'login': False, **job})
+        getlinks.action(resident)
+        return sorted(os.listdir('downloads'))
+
+    # the first run is cut off on the second page
+    files = run()
+    assert len(files) == 1
+    first = tmp_path / 'downloads' / files[0]
+    rows = first.read_text(encoding='utf-8')
+    assert {x.get('linksfile') for x in fileops.load_logfile() if 'starting' in x} == {os.path.join('downloads', files[0])}
+
+    # a newer links file from something else is left alone, and the cut off file is carried on with
+    (tmp_path / 'downloads' / 'links_99999999999999.csv').write_text('link\r\n')
+    repo.fail = False
+    assert run(resume=True) == files + ['links_99999999999999.csv']
+    assert first.read_text(encoding='utf-8') == rows
+
+    # the last page started was from a download, not from getting links, so a new file is started
+    fileops.write_log({'starting': listing})
+    files = run(resume=True)
+    assert len(files) == 3
+    assert (tmp_path / 'downloads' / files[1]).read_text(encoding='utf-8') == rows
@@ -0,0 +1,24 @@
+import ao3downloader.links as links
+
+
+def test_canonical_url_work():
+    assert links.canonical_url('http://archiveofourown.org/works/123/chapters/456?view_adult=true') == 'https://archiveofourown.org/works/123'
+
+
+def test_canonical_url_series():
+    assert links.canonical_url(' https://archiveofourown.org/series/789\n') == 'https://archiveofourown.org/series/789'
+
+
+def test_canonical_url_listing():
+    assert links.canonical_url('http://archiveofourown.org/users/someone/bookmarks?page=3') == 'https://archiveofourown.org/users/someone/bookmarks?page=3'
+
+
+def test_get_work_ref():
+    assert links.get_work_ref('/works/42') == links.WorkRef(42)
+    assert links.get_work_ref('/works/new') is None
+    assert links.get_work_ref('/series/42') is None
+
+
+def test_get_series_ref():
+    assert links.get_series_ref('/series/42') == links.SeriesRef(42)
+    assert links.get_series_ref('/works/42') is None
@@ -0,0 +1,61 @@
+import json
+import os
+
+import pytest
+
+from ao3downloader import strings
+from ao3downloader.actions import logvisualization
+
+
+@pytest.fixture
+def logfile(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(logvisualization, 'SIZE_HINT', 300)
+    os.mkdir(strings.LOG_FOLDER_NAME)
+    os.mkdir(strings.HTML_FOLDER_NAME)
+    with open(os.path.join(strings.HTML_FOLDER_NAME, strings.TEMPLATE_FILE_NAME), 'w', encoding='utf-8') as f:
+        f.write('<table>%TABLE%</table>')
+    path = os.path.join(strings.LOG_FOLDER_NAME, strings.LOG_FILE_NAME)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(40):
+            entry = {'starting': 'link'} if i % 10 == 0 else {'link': f'https://archiveofourown.org/works/{i}', 'title': 'ü' * (i % 7) * 5}
+            f.write(json.dumps({'timestamp': f'01/01/2024, 00:00:{i:02d}', **entry}, ensure_ascii=False) + '\n')
+    return path
+
+
+def test_get_chunks_matches_readlines(logfile):
+    with open(logfile, encoding='utf-8') as f:
+        expected = []
+        while buf := f.readlines(logvisualization.SIZE_HINT):
+            expected.append(buf)
+
+    chunks = list(logvisualization.get_chunks(logfile))
+    assert len(chunks) == len(expected) > 2
+    assert [(x[2], x[3]) for x in chunks] == [(x[0], x[-1]) for x in expected]
+    with open(logfile, 'rb') as f:
+        for (offset, length, _, _), buf in zip(chunks, expected):
+            f.seek(offset)
+            assert f.read(length).decode('utf-8') == ''.join(buf)
+
+
+def test_render_chunk(logfile, tmp_path):
+    offset, length, _, _ = next(logvisualization.get_chunks(logfile))
+    filename = str(tmp_path / 'vis.html')
+    logvisualization.render_chunk(logfile, offset, length, filename, '<table>%TABLE%</table>')
+
+    with open(filename, encoding='utf-8') as f:
+        html = f.read()
+    assert html.startswith('<table><thead><tr><th>timestamp</th><th>link</th><th>title</th></tr></thead>')
+    assert 'starting' not in html
+    assert not os.path.exists(filename + '.tmp')
+
+
+def test_action_skips_existing_chunks(logfile, monkeypatch):
+    logvisualization.action()
+    files = sorted(os.listdir(strings.LOG_FOLDER_NAME))
+    assert len(files) == len(list(logvisualization.get_chunks(logfile))) + 1
+
+    rendered = []
+    monkeypatch.setattr(logvisualization, 'render_chunk', lambda *args: rendered.append(args))
+    logvisualization.action()
+    assert rendered == []
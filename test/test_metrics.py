@@ -0,0 +1,50 @@
+from ao3downloader import metrics
+
+
+def test_timer_and_counters():
+    metrics.reset()
+    with metrics.timer(metrics.PARSE_HTML):
+        pass
+    with metrics.timer(metrics.PARSE_HTML):
+        pass
+    metrics.count('requests', 2, status=200)
+    metrics.count('bytes_downloaded', 1024)
+
+    snapshot = metrics.snapshot()
+    assert snapshot['calls'] == {metrics.PARSE_HTML: 2}
+    assert snapshot['counters'] == {'requests{status=200}': 2, 'bytes_downloaded': 1024}
+    assert metrics.histograms[metrics.PARSE_HTML][0] == 2
+    assert 'parse_html' in metrics.summary()
+
+    metrics.reset()
+    assert metrics.summary() == ''
+
+
+def test_my_get_times_headers_and_body_apart(tmp_path, monkeypatch):
+    import io
+
+    import requests
+
+    from ao3downloader.fileio import FileOps
+    from ao3downloader.repo import Repository
+
+    class Adapter(requests.adapters.BaseAdapter):
+        def send(self, request, stream=False, **kwargs):
+            assert stream # otherwise the body would be read inside the request timer
+            response = requests.Response()
+            response.status_code = 200
+            response.raw = io.BytesIO(b'x' * 100)
+            response.request = request
+            return response
+        def close(self):
+            pass
+
+    monkeypatch.chdir(tmp_path)
+    metrics.reset()
+    repo = Repository(FileOps())
+    repo.session.mount('https://', Adapter())
+    assert repo.my_get('https://archiveofourown.org/works/1').content == b'x' * 100
+
+    snapshot = metrics.snapshot()
+    assert snapshot['calls'] == {metrics.REQUEST: 1, metrics.READ_BODY: 1}
+    assert snapshot['counters'] == {'requests{status=200}': 1, 'bytes_downloaded': 100}
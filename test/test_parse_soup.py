@@ -23,6 +23,19 @@ def test_get_series_urls_all(snapshot):
     assert series_urls == snapshot
 
 
+def test_get_listing_info(snapshot):
+    soup = get_soup_from_fixture('bookmarks')
+    listing = parse_soup.get_listing_info(soup, False, True)
+    assert listing == snapshot
+
+
+def test_get_listing_info_matches_work_metadata_from_list():
+    soup = get_soup_from_fixture('bookmarks')
+    listing = parse_soup.get_listing_info(soup, False, True)
+    for link, metadata in listing['metadata'].items():
+        assert metadata == parse_soup.get_work_metadata_from_list(soup, link)
+
+
 def test_is_locked_true():
     soup = get_soup_from_fixture('lockedWorkLoggedOut')
     assert parse_soup.is_locked(soup) == True
@@ -83,6 +96,21 @@ def test_get_title_multiple_series(snapshot):
     assert parse_soup.get_title(soup, link, pattern) == snapshot
 
 
+def test_series_read_once(monkeypatch):
+    soup = get_soup_from_fixture('multipleSeries')
+    link = 'https://archiveofourown.org/works/12345678'
+    calls = []
+    get_series_list = parse_soup.get_series_list
+    monkeypatch.setattr(parse_soup, 'get_series_list', lambda soup: calls.append(1) or get_series_list(soup))
+
+    metadata = parse_soup.get_work_metadata_from_work(soup, link)
+    assert len(calls) == 1
+    assert parse_soup.get_title(soup, link, '{series_title} {series_index}') == f'{metadata.series_title} {metadata.series_index}'
+    assert len(calls) == 2
+    parse_soup.get_title(soup, link, '{title}')
+    assert len(calls) == 2
+
+
 def get_soup_from_fixture(filename: str) -> BeautifulSoup:
     fixture_path = os.path.join(os.path.dirname(__file__), 'fixtures', filename + '.html')
     with open(fixture_path) as f:
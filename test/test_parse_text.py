@@ -0,0 +1,49 @@
+import ao3downloader.parse_text as parse_text
+import ao3downloader.strings as strings
+
+
+def test_get_work_number():
+    assert parse_text.get_work_number('https://archiveofourown.org/works/34816549#comments') == '34816549'
+    assert parse_text.get_work_number('https://archiveofourown.org/works') is None
+
+
+def test_get_page_number():
+    assert parse_text.get_page_number('https://archiveofourown.org/tags/x/works?page=12&view=1') == 12
+    assert parse_text.get_next_page('https://archiveofourown.org/tags/x/works?page=12') == 'https://archiveofourown.org/tags/x/works?page=13'
+
+
+def test_get_unsuccessful_downloads_deduplicates_links():
+    logs = [
+        {'link': 'http://archiveofourown.org/works/1', 'success': False},
+        {'link': 'https://archiveofourown.org/works/1/chapters/2', 'success': False},
+        {'link': 'https://archiveofourown.org/works/2', 'success': True},
+    ]
+    assert parse_text.get_unsuccessful_downloads(logs) == ['https://archiveofourown.org/works/1']
+
+
+def test_compact_logs_preserves_lookups():
+    logs = [
+        {'starting': 'https://archiveofourown.org/tags/x/works', 'timestamp': '01/01/2024, 00:00:00'},
+        {'link': 'https://archiveofourown.org/works/1', 'title': 'first title', 'success': True, 'timestamp': '01/01/2024, 00:00:01'},
+        {'link': 'http://archiveofourown.org/works/1', 'title': 'second title', 'success': True, 'timestamp': '01/01/2024, 00:00:02'},
+        {'link': 'https://archiveofourown.org/works/2', 'error': strings.ERROR_DELETED, 'success': False, 'stacktrace': '...', 'timestamp': '01/01/2024, 00:00:03'},
+        {'link': 'https://archiveofourown.org/works/2', 'error': strings.ERROR_DELETED, 'success': False, 'timestamp': '01/01/2024, 00:00:04'},
+        {'message': strings.MESSAGE_FIC_FILE, 'path': 'a.epub', 'link': 'https://archiveofourown.org/works/2', 'timestamp': '01/01/2024, 00:00:05'},
+        {'message': strings.ERROR_LINKS_LIST, 'error': 'oops', 'success': False, 'timestamp': '01/01/2024, 00:00:06'},
+        {'starting': 'https://archiveofourown.org/tags/x/works?page=2', 'timestamp': '01/01/2024, 00:00:07'},
+    ]
+    compacted = parse_text.compact_logs(logs)
+    assert len(compacted) == 4
+    assert parse_text.get_title_dict(compacted) == parse_text.get_title_dict(logs)
+    assert parse_text.get_unsuccessful_downloads(compacted) == parse_text.get_unsuccessful_downloads(logs)
+    assert compacted[-1]['starting'] == 'https://archiveofourown.org/tags/x/works?page=2'
+    assert all('stacktrace' not in x for x in compacted)
+
+
+def test_fill_pattern():
+    parts = parse_text.compile_pattern('{worknum} {title} {unknown} - {author}{title}', ('worknum', 'title', 'author'))
+    assert parse_text.compile_pattern('{worknum} {title} {unknown} - {author}{title}', ('worknum', 'title', 'author')) is parts
+    # values aren't searched for fields themselves
+    values = {'worknum': 1, 'title': 'a {author} b', 'author': 'c'}
+    assert parse_text.fill_pattern(parts, values) == '1 a {author} b {unknown} - ca {author} b'
+    assert parse_text.fill_pattern(parse_text.compile_pattern('plain', ('title',)), {}) == 'plain'
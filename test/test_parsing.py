@@ -0,0 +1,31 @@
+import os
+
+from bs4 import BeautifulSoup
+
+from ao3downloader import metrics, parse_soup, parsing
+
+
+def get_fixture(name: str) -> str:
+    with open(os.path.join(os.path.dirname(__file__), 'fixtures', f'{name}.html'), encoding='utf-8') as f:
+        return f.read()
+
+
+def test_parse_listing():
+    html = get_fixture('bookmarks')
+    expected = parse_soup.get_listing_info(BeautifulSoup(html, 'html.parser'), False, True)
+
+    metrics.reset()
+    for processes in [0, 2]:
+        listing = parsing.result(parsing.submit(processes, html, False, True))
+        assert listing == dict(expected, locked=False, deleted=False, explicit=False, proceed=None)
+    assert metrics.snapshot()['calls'] == {metrics.PARSE_LISTING: 2}
+
+    parsing.shutdown()
+    assert parsing.executor is None
+
+
+def test_parse_listing_flags():
+    listing = parsing.parse_listing(get_fixture('explicitWorkLoggedOut'), True, False)
+    assert listing['explicit'] and listing['proceed'].startswith('https://archiveofourown.org/works/')
+    assert parsing.parse_listing(get_fixture('deletedWork'), True, False)['deleted']
+    assert parsing.parse_listing(get_fixture('lockedWorkLoggedOut'), True, False)['locked']
@@ -0,0 +1,194 @@
+import zipfile
+
+import pytest
+from bs4 import BeautifulSoup
+
+from ao3downloader import patch, update
+from ao3downloader.ao3 import Ao3
+from ao3downloader.exceptions import PatchException
+from ao3downloader.fileio import FileOps
+
+LINK = 'https://archiveofourown.org/works/123'
+
+WORK_PAGE = '''<html><body><div id="main">
+<ul class="work navigation actions"><li class="chapter"><ul id="chapter_index"><li><form><select name="selected_id" id="selected_id">
+<option value="11">1. Chapter 1</option><option value="12">2. Second</option><option value="13">3. Third</option>
+</select></form></li></ul></li></ul>
+<dl class="stats"><dt class="published">Published:</dt><dd class="published">2020-01-01</dd><dt class="status">Updated:</dt><dd class="status">2020-03-01</dd>
+<dt class="words">Words:</dt><dd class="words">3,000</dd><dt class="chapters">Chapters:</dt><dd class="chapters">3/?</dd></dl>
+<div id="chapters"><div class="chapter" id="chapter-1"><div class="chapter preface group"><h3 class="title"><a href="/works/123/chapters/11">Chapter 1</a></h3></div>
+<div class="userstuff module"><h3 class="landmark heading">Chapter Text</h3><p>one</p></div></div></div>
+</div></body></html>'''
+
+CHAPTER_PAGE = '''<html><body><div id="main"><div id="chapters"><div class="chapter" id="chapter-3">
+<div class="chapter preface group"><h3 class="title">
+<a href="/works/123/chapters/13">Chapter 3</a>: Third
+</h3><div id="notes" class="notes module"><h3 class="heading">Notes:</h3><blockquote class="userstuff"><p>a note</p></blockquote></div></div>
+<div class="userstuff module" role="article"><h3 class="landmark heading" id="work">Chapter Text</h3><p>three &amp; more<br/>lines</p></div>
+<div class="chapter preface group"><div id="chapter_3_endnotes" class="end notes module"><h3 class="heading">Notes:</h3><blockquote class="userstuff"><p>end</p></blockquote></div></div>
+</div></div></div></body></html>'''
+
+HTML_DOWNLOAD = '''<!DOCTYPE html>
+<html>
+<head><meta charset="UTF-8"/><title>A Work</title></head>
+<body>
+<div id="preface">
+<p class="message"><b>A Work</b><br/>Posted originally on the <a href="http://archiveofourown.org/">Archive of Our Own</a> at <a href="http://archiveofourown.org/works/123">http://archiveofourown.org/works/123</a>.</p>
+<div class="meta"><dl class="tags">
+<dt>Stats:</dt><dd>Published: 2020-01-01 Updated: 2020-02-01 Words: 2,000 Chapters: 2/?</dd>
+</dl><h1>A Work</h1><p>Summary</p><blockquote class="userstuff"><p>summary</p></blockquote></div>
+</div>
+<div id="chapters" class="userstuff">
+<h2 class="toc-heading">Chapter 1</h2>
+<div class="meta group"><h2 class="heading">Chapter 1</h2></div>
+<div class="userstuff"><p>one</p></div>
+<h2 class="toc-heading">Chapter 2: Second</h2>
+<div class="meta group"><h2 class="heading">Chapter 2: Second</h2></div>
+<div class="userstuff"><p>two</p></div>
+</div>
+<div id="afterword"><p>Please drop by the Archive and comment</p></div>
+</body>
+</html>'''
+
+XHTML = '''<?xml version='1.0' encoding='utf-8'?>
+<html xmlns="http://www.w3.org/1999/xhtml"><head><title>A Work</title><link href="stylesheet.css" rel="stylesheet" type="text/css"/></head>
+<body class="calibre">
+{}
+</body></html>'''
+
+PREFACE = '''<div class="meta"><h1 class="calibre1">A Work</h1><p class="message">Posted originally on the <a href="http://archiveofourown.org/">Archive of Our Own</a> at <a href="http://archiveofourown.org/works/123">http://archiveofourown.org/works/123</a>.</p>
+<dl class="tags"><dt class="calibre3">Stats:</dt><dd class="calibre5">Published: 2020-01-01 Updated: 2020-02-01 Words: 2,000 Chapters: 2/?</dd></dl></div>'''
+
+CONTAINER = '''<?xml version="1.0"?><container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+<rootfiles><rootfile full-path="content.opf" media-type="application/oebps-package+xml"/></rootfiles></container>'''
+
+OPF = '''<?xml version='1.0' encoding='utf-8'?>
+<package xmlns="http://www.idpf.org/2007/opf" version="2.0" unique-identifier="uuid_id">
+<metadata xmlns:dc="http://purl.org/dc/elements/1.1/"><dc:title>A Work</dc:title><dc:identifier id="uuid_id">1</dc:identifier><dc:language>en</dc:language></metadata><manifest>
+<item href="stylesheet.css" id="css" media-type="text/css"/><item href="A_Work_split_000.xhtml" id="html" media-type="application/xhtml+xml"/>
+<item href="A_Work_split_001.xhtml" id="html1" media-type="application/xhtml+xml"/><item href="A_Work_split_002.xhtml" id="html2" media-type="application/xhtml+xml"/>
+<item href="toc.ncx" id="ncx" media-type="application/x-dtbncx+xml"/>
+</manifest><spine toc="ncx"><itemref idref="html"/><itemref idref="html1"/><itemref idref="html2"/></spine></package>'''
+
+NCX = '''<?xml version='1.0' encoding='utf-8'?>
+<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1"><head/><docTitle><text>A Work</text></docTitle><navMap>
+<navPoint id="num_1" playOrder="1"><navLabel><text>Preface</text></navLabel><content src="A_Work_split_000.xhtml"/></navPoint>
+<navPoint id="num_2" playOrder="2"><navLabel><text>Chapter 1</text></navLabel><content src="A_Work_split_001.xhtml"/></navPoint>
+<navPoint id="num_3" playOrder="3"><navLabel><text>Chapter 2: Second</text></navLabel><content src="A_Work_split_002.xhtml"/></navPoint>
+<navPoint id="num_4" playOrder="4"><navLabel><text>Afterword</text></navLabel><content src="A_Work_split_002.xhtml#afterword"/></navPoint>
+</navMap></ncx>'''
+
+
+def get_chapter_doc(number: int, title: str, afterword: str='') -> str:
+    return XHTML.format(f'''<h2 class="toc-heading">{title}</h2>
+<div class="meta1"><h2 class="heading1">{title}</h2></div>
+<div class="userstuff2"><p class="calibre6">chapter {number}</p></div>{afterword}''')
+
+
+def write_epub(path) -> None:
+    with zipfile.ZipFile(path, 'w') as book:
+        book.writestr('mimetype', 'application/epub+zip', zipfile.ZIP_STORED)
+        book.writestr('META-INF/container.xml', CONTAINER, zipfile.ZIP_DEFLATED)
+        book.writestr('content.opf', OPF, zipfile.ZIP_DEFLATED)
+        book.writestr('toc.ncx', NCX, zipfile.ZIP_DEFLATED)
+        book.writestr('stylesheet.css', '.calibre {}', zipfile.ZIP_DEFLATED)
+        book.writestr('A_Work_split_000.xhtml', XHTML.format(PREFACE), zipfile.ZIP_DEFLATED)
+        book.writestr('A_Work_split_001.xhtml', get_chapter_doc(1, 'Chapter 1'), zipfile.ZIP_DEFLATED)
+        book.writestr('A_Work_split_002.xhtml', get_chapter_doc(2, 'Chapter 2: Second', '\n<div id="afterword"><p>Please comment</p></div>'), zipfile.ZIP_DEFLATED)
+
+
+def get_new_chapters() -> list[dict]:
+    chapters = patch.get_chapters(BeautifulSoup(CHAPTER_PAGE, 'html.parser'))
+    patch.check_new_chapters(chapters, 2)
+    return chapters
+
+
+def test_read_work_pages():
+    soup = BeautifulSoup(WORK_PAGE, 'html.parser')
+    assert patch.get_stats(soup) == {'chapters': '3/?', 'words': '3,000', 'updated': 'Updated: 2020-03-01'}
+    assert patch.get_chapter_urls(soup, LINK)[2] == LINK + '/chapters/13?view_adult=true'
+
+    chapter = get_new_chapters()[0]
+    assert chapter['heading'] == 'Chapter 3: Third'
+    assert chapter['notes'] == '<p>a note</p>'
+    assert chapter['endnotes'] == '<p>end</p>'
+    assert chapter['text'] == '<p>three &amp; more<br/>lines</p>'
+    assert chapter['summary'] == ''
+
+    with pytest.raises(PatchException):
+        patch.check_new_chapters(get_new_chapters(), 3)
+
+
+def test_patch_html(tmp_path):
+    stats = patch.get_stats(BeautifulSoup(WORK_PAGE, 'html.parser'))
+    patched = patch.patch_html(HTML_DOWNLOAD.encode('utf-8'), 2, get_new_chapters(), stats).decode('utf-8')
+
+    (tmp_path / 'work.html').write_text(patched, encoding='utf-8')
+    assert update.parse_file(str(tmp_path / 'work.html'), 'HTML')['stats'] == 'Published: 2020-01-01 Updated: 2020-03-01 Words: 3,000 Chapters: 3/?'
+
+    soup = BeautifulSoup(patched, 'html.parser')
+    assert [x.get_text() for x in soup.select('#chapters h2.heading')] == ['Chapter 1', 'Chapter 2: Second', 'Chapter 3: Third']
+    assert [x.get_text() for x in soup.select('#chapters h2.toc-heading')] == ['Chapter 1', 'Chapter 2: Second', 'Chapter 3: Third']
+    assert soup.select('#chapters > div.userstuff')[-1].decode_contents() == '<p>three &amp; more<br/>lines</p>'
+    assert soup.find('div', id='chapters').find_next_sibling().get('id') == 'afterword'
+
+    with pytest.raises(PatchException):
+        patch.patch_html(HTML_DOWNLOAD.encode('utf-8'), 3, get_new_chapters(), stats)
+
+
+def test_patch_epub(tmp_path):
+    write_epub(tmp_path / 'old.epub')
+    stats = patch.get_stats(BeautifulSoup(WORK_PAGE, 'html.parser'))
+    patched = patch.patch_epub((tmp_path / 'old.epub').read_bytes(), 2, get_new_chapters(), stats)
+
+    (tmp_path / 'new.epub').write_bytes(patched)
+    assert update.parse_file(str(tmp_path / 'new.epub'), 'EPUB')['stats'] == 'Published: 2020-01-01 Updated: 2020-03-01 Words: 3,000 Chapters: 3/?'
+
+    with zipfile.ZipFile(tmp_path / 'new.epub') as book:
+        assert book.infolist()[0].filename == 'mimetype' and book.infolist()[0].compress_type == zipfile.ZIP_STORED
+        assert book.read('stylesheet.css') == b'.calibre {}'
+        assert 'afterword' not in book.read('A_Work_split_002.xhtml').decode('utf-8')
+        chapter = book.read('chapter_3.xhtml').decode('utf-8')
+        assert '<link href="stylesheet.css"' in chapter and '<body class="calibre">' in chapter
+        assert '<div class="meta1"><h2 class="heading1">Chapter 3: Third</h2>' in chapter
+        assert chapter.index('three &amp; more') < chapter.index('id="afterword"')
+        opf = book.read('content.opf').decode('utf-8')
+        assert '<itemref idref="html2"/><itemref idref="ao3downloader_chapter_3"/>' in opf
+        ncx = book.read('toc.ncx').decode('utf-8')
+        assert ncx.index('Chapter 2: Second') < ncx.index('Chapter 3: Third') < ncx.index('Afterword')
+        assert '<navPoint id="num_4" playOrder="5"><navLabel><text>Afterword</text></navLabel><content src="chapter_3.xhtml#afterword"/>' in ncx
+
+    with pytest.raises(PatchException):
+        patch.patch_epub((tmp_path / 'old.epub').read_bytes(), 1, get_new_chapters(), stats)
+
+
+class ChapterPages:
+    def __init__(self) -> None:
+        self.urls = []
+
+    def get_soup(self, url: str) -> BeautifulSoup:
+        self.urls.append(url)
+        return BeautifulSoup(CHAPTER_PAGE, 'html.parser')
+
+
+def test_get_patched(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'settings.ini').write_text('[settings]\nPatchChapters=1\n')
+    (tmp_path / 'old.html').write_text(HTML_DOWNLOAD, encoding='utf-8')
+    repo = ChapterPages()
+    ao3 = Ao3(repo, FileOps(), ['HTML', 'PDF'], None, False, False)
+    soup = BeautifulSoup(WORK_PAGE, 'html.parser')
+
+    log = {}
+    patched = ao3.get_patched(soup, LINK, log, '2', {'HTML': str(tmp_path / 'old.html')})
+    assert list(patched) == ['HTML'] and log['patched'] == ['HTML']
+    assert repo.urls == [LINK + '/chapters/13?view_adult=true']
+
+    # more chapters were added than the setting allows, so the whole work is downloaded
+    assert ao3.get_patched(soup, LINK, {}, '1', {'HTML': str(tmp_path / 'old.html')}) == {}
+
+    # the file doesn't match, so it is downloaded whole
+    (tmp_path / 'old.html').write_text(HTML_DOWNLOAD.replace('Chapter 2: Second', 'Interlude'), encoding='utf-8')
+    log = {}
+    assert ao3.get_patched(soup, LINK, log, '2', {'HTML': str(tmp_path / 'old.html')}) == {}
+    assert 'patched' not in log and log['patch_error']
@@ -0,0 +1,28 @@
+import os
+
+from ao3downloader import parse_text, profiling, strings
+
+
+def test_cprofile_trace_is_saved_and_summarized(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv(strings.PROFILE_ENV_VAR, 'cprofile')
+
+    with profiling.profiled('update'):
+        for _ in range(100):
+            parse_text.get_work_number('https://archiveofourown.org/works/123')
+
+    traces = os.listdir(tmp_path / strings.LOG_FOLDER_NAME)
+    assert len(traces) == 1 and traces[0].startswith('profile_update_') and traces[0].endswith('.prof')
+    output = capsys.readouterr().out
+    assert 'profile saved to' in output
+    assert 'get_work_number' in output
+
+
+def test_profiling_off(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv(strings.PROFILE_ENV_VAR, '')
+
+    with profiling.profiled('update'):
+        pass
+
+    assert os.listdir(tmp_path / strings.LOG_FOLDER_NAME) == []
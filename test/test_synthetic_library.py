@@ -0,0 +1,25 @@
+from ao3downloader import strings, update
+from ao3downloader.library import LibraryIndex
+from benchmarks import scan_library, synthetic_library
+
+
+def test_generated_files_parse_like_ao3_downloads(tmp_path):
+    # short enough that the pdf has fewer than 3 pages, with a series link annotation on the first one
+    written = synthetic_library.generate(str(tmp_path), 1, strings.UPDATE_ACCEPTABLE_FILE_TYPES, size=2000)
+    assert written == dict.fromkeys(strings.UPDATE_ACCEPTABLE_FILE_TYPES, 1)
+
+    for file in tmp_path.glob('*/*'):
+        info = update.parse_file(str(file), file.suffix[1:].upper())
+        assert info['link'] == 'https://archiveofourown.org/works/200000'
+        assert 'Chapters: 1/?' in info['stats']
+        assert info['series'] == ['https://archiveofourown.org/series/9000']
+
+
+def test_scan(tmp_path):
+    synthetic_library.generate(str(tmp_path / 'library'), 4, ['HTML', 'MOBI'], per_folder=2, size=2000)
+    library = LibraryIndex(str(tmp_path / 'index.json'))
+
+    cold = scan_library.scan(str(tmp_path / 'library'), ['HTML', 'MOBI'], library)
+    warm = scan_library.scan(str(tmp_path / 'library'), ['HTML', 'MOBI'], library)
+    assert cold['files'] == warm['files'] == 8
+    assert cold['incomplete'] == warm['incomplete'] == 8